@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Сравнение задержки одной задачи для двух движков: отдельный процесс yt-dlp
+и встроенный пул тёплых процессов (EnginePool).
+
+Задачи скачивают небольшой файл с локального HTTP-сервера, поэтому сеть
+не нужна и в замер попадают только старт yt-dlp, извлечение и загрузка.
+
+    python benchmarks/engine_latency.py [--jobs 10] [--yt-dlp путь]
+"""
+
+import argparse
+import functools
+import http.server
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ytdld.engine import EnginePool, EngineProcess, engine_available  # noqa: E402
+from ytdld.progress import PROGRESS_TEMPLATE  # noqa: E402
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # yt-dlp обрывает первый запрос, проверив заголовки, — это не ошибка
+        pass
+
+
+def serve(directory):
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = QuietServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def job_args(url, output_dir, index):
+    return ["--newline", "--progress-template", PROGRESS_TEMPLATE,
+            "-o", os.path.join(output_dir, f"{index}.%(ext)s"), url]
+
+
+def run_subprocess(yt_dlp_cmd, args):
+    start = time.perf_counter()
+    subprocess.run(yt_dlp_cmd + args, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def run_engine(pool, args):
+    start = time.perf_counter()
+    process = EngineProcess(pool, args)
+    if process.wait() != 0:
+        raise RuntimeError("задача встроенного движка завершилась с ошибкой")
+    return time.perf_counter() - start
+
+
+def report(name, timings):
+    print(f"{name:<10} среднее {statistics.mean(timings) * 1000:8.1f} мс   "
+          f"медиана {statistics.median(timings) * 1000:8.1f} мс   "
+          f"макс {max(timings) * 1000:8.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--yt-dlp", dest="yt_dlp",
+                        help="исполняемый файл yt-dlp (по умолчанию из PATH "
+                             "или python -m yt_dlp)")
+    args = parser.parse_args()
+
+    if not engine_available():
+        sys.exit("Модуль yt_dlp не установлен — встроенный движок недоступен")
+    if args.yt_dlp:
+        yt_dlp_cmd = [args.yt_dlp]
+    elif shutil.which("yt-dlp"):
+        yt_dlp_cmd = [shutil.which("yt-dlp")]
+    else:
+        yt_dlp_cmd = [sys.executable, "-m", "yt_dlp"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        os.makedirs(media_dir)
+        with open(os.path.join(media_dir, "clip.mp4"), "wb") as f:
+            f.write(os.urandom(256 * 1024))
+        server = serve(media_dir)
+        url = f"http://127.0.0.1:{server.server_port}/clip.mp4"
+
+        sub_times = [run_subprocess(yt_dlp_cmd, job_args(url, tmp, f"s{i}"))
+                     for i in range(args.jobs)]
+
+        pool = EnginePool(1)
+        pool.release(pool.acquire())  # прогрев вне замера, как при старте программы
+        engine_times = [run_engine(pool, job_args(url, tmp, f"e{i}"))
+                        for i in range(args.jobs)]
+        pool.shutdown()
+        server.shutdown()
+
+    print(f"Задач: {args.jobs}, yt-dlp: {' '.join(yt_dlp_cmd)}")
+    report("Процесс", sub_times)
+    report("Встроенный", engine_times)
+    print(f"Ускорение: {statistics.median(sub_times) / statistics.median(engine_times):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Заглушка yt-dlp для замеров: принимает те же ключи, что передаёт программа,
+печатает правдоподобный вывод с заданной частотой и создаёт файл-пустышку.
+Сеть не нужна.
+
+Поведение задаётся переменными окружения:
+    FAKE_YTDLP_LINES       строк прогресса на загрузку (200)
+    FAKE_YTDLP_RATE        строк в секунду, 0 — без ограничения (0)
+    FAKE_YTDLP_LOG_EVERY   строка лога после каждых N строк прогресса (1; 0 — без лога)
+    FAKE_YTDLP_SIZE        размер файла-пустышки, байт (1048576)
+    FAKE_YTDLP_ENTRIES     элементов в плейлисте (5)
+    FAKE_YTDLP_DELAY       задержка перед ответом на -J, с (0)
+
+Ссылки со словом «unavailable» имитируют ошибку «Requested format is not
+available»: загрузка с подобранным форматом падает, повторная без
+--load-info-json (fallback) проходит. На --flat-playlist печатается список
+из FAKE_YTDLP_ENTRIES элементов.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ytdld.playlist import PLAYLIST_ENTRY_PREFIX  # noqa: E402
+from ytdld.progress import PROGRESS_PREFIX  # noqa: E402
+
+
+def env_number(name, default, kind=int):
+    try:
+        return kind(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def option(args, name, default=None):
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+
+def video_id(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:11]
+
+
+def make_info(url):
+    vid = video_id(url)
+    formats = []
+    for height, vbr in ((360, 500), (720, 1500), (1080, 3000)):
+        formats.append({"format_id": f"v{height}", "ext": "mp4", "height": height,
+                        "vcodec": "avc1.64001f", "acodec": "none", "tbr": vbr,
+                        "url": f"{url}/v{height}"})
+    formats.append({"format_id": "a128", "ext": "m4a", "vcodec": "none",
+                    "acodec": "mp4a.40.2", "abr": 128, "tbr": 128, "url": f"{url}/a128"})
+    return {"id": vid, "title": f"fake-{vid}", "ext": "mp4", "_type": "video",
+            "extractor": "generic", "extractor_key": "Generic",
+            "webpage_url": url, "original_url": url, "formats": formats}
+
+
+def emit_progress(lines, rate, log_every, size):
+    interval = 1 / rate if rate > 0 else 0
+    start = time.perf_counter()
+    out = sys.stdout
+    for i in range(1, lines + 1):
+        done = size * i // lines
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        speed = done / elapsed
+        eta = (size - done) / speed if speed else 0
+        out.write(f"{PROGRESS_PREFIX}downloading|{done}|{size}|NA|{speed:.1f}|{eta:.0f}|{i}|{lines}\n")
+        if log_every and i % log_every == 0:
+            out.write(f"[download] Got fragment {i} of {lines}\n")
+        if interval:
+            out.flush()
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    out.write(f"{PROGRESS_PREFIX}finished|{size}|{size}|NA|NA|NA|NA|NA\n")
+    out.flush()
+
+
+def output_path(template, info, ext):
+    path = template.replace("%(title)s", info["title"]).replace("%(ext)s", ext)
+    return path.replace("%(id)s", info["id"])
+
+
+def main():
+    args = sys.argv[1:]
+    if "--version" in args:
+        print("2099.01.01.fake")
+        return 0
+
+    info_path = option(args, "--load-info-json")
+    if info_path:
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+        url = info.get("webpage_url", "")
+    else:
+        url = args[-1] if args else ""
+        info = make_info(url)
+
+    if "--flat-playlist" in args:
+        entries = env_number("FAKE_YTDLP_ENTRIES", 5)
+        for i in range(entries):
+            entry_url = f"{url.split('?')[0]}/entry{i}"
+            print(f"{PLAYLIST_ENTRY_PREFIX}{entries}|Generic|{video_id(entry_url)}|{entry_url}|Элемент {i}",
+                  flush=True)
+        return 0
+
+    if "-J" in args:
+        time.sleep(env_number("FAKE_YTDLP_DELAY", 0, float))
+        print(json.dumps(info))
+        return 0
+
+    print(f"[info] {info['id']}: Downloading 1 format(s): {option(args, '-f', 'best')}", flush=True)
+    if "unavailable" in url and info_path:
+        print(f"ERROR: [generic] {info['id']}: Requested format is not available. "
+              "Use --list-formats for a list of available formats", file=sys.stderr, flush=True)
+        return 1
+
+    size = env_number("FAKE_YTDLP_SIZE", 1024 * 1024)
+    template = option(args, "-o", "%(title)s.%(ext)s")
+    after_move = option(args, "--print", "")
+    formats = {f["format_id"]: f for f in info["formats"]}
+    # «-f 137,140» — потоки отдельными файлами (для постобработки очередью)
+    for format_id in option(args, "-f", "best").split(","):
+        ext = formats[format_id]["ext"] if format_id in formats else "mp4"
+        path = output_path(template.replace("%(format_id)s", format_id), info, ext)
+        print(f"[download] Destination: {path}", flush=True)
+        emit_progress(env_number("FAKE_YTDLP_LINES", 200), env_number("FAKE_YTDLP_RATE", 0, float),
+                      env_number("FAKE_YTDLP_LOG_EVERY", 1), size)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate(size)
+        print(f"[download] 100% of {size} bytes", flush=True)
+        if after_move.startswith("after_move:"):
+            print(after_move[len("after_move:"):].replace("%(filepath)s", path), flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
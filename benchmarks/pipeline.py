@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Замеры рабочего потока, очереди и интерфейса на заглушке yt-dlp
+(benchmarks/fake_yt_dlp.py), без сети.
+
+Сценарии (каждый — в отдельном процессе, чтобы пиковая память не смешивалась):
+    parse   стоимость parse_progress_line на строку прогресса и строку лога
+    worker  пропускная способность одной задачи: строк вывода в секунду
+    queue   очередь из нескольких задач, часть с ошибкой «формат недоступен»:
+            задержка задачи от постановки до завершения, общее время
+    gui     то же в окне (offscreen): задержка цикла событий Qt
+
+    python benchmarks/pipeline.py [--quick] [--save result.json] [--compare old.json]
+
+Результаты с одинаковыми параметрами сравнимы между коммитами: --save
+сохраняет их вместе с хешем коммита, --compare печатает разницу и отмечает
+ухудшения больше порога.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB = os.path.join(ROOT, "benchmarks", "fake_yt_dlp.py")
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("parse", "worker", "queue", "gui")
+
+# Параметры по умолчанию и для --quick; менять их — значит терять сравнимость
+PARAMS = {
+    "parse_lines": 200000,
+    "worker_lines": 50000,
+    "queue_jobs": 24,
+    "queue_workers": 4,
+    "queue_lines": 2000,
+    "queue_unavailable_every": 6,
+    "gui_jobs": 12,
+    "gui_lines": 5000,
+    "gui_rate": 5000,
+}
+QUICK_PARAMS = dict(PARAMS, parse_lines=20000, worker_lines=5000, queue_jobs=8,
+                    queue_lines=500, gui_jobs=4, gui_lines=1000)
+
+# Направление «лучше» для каждой метрики: +1 — больше лучше, -1 — меньше лучше
+METRICS = {
+    "parse_progress_ns": -1,
+    "parse_other_ns": -1,
+    "worker_lines_per_s": 1,
+    "queue_wall_s": -1,
+    "queue_job_p50_ms": -1,
+    "queue_job_p95_ms": -1,
+    "gui_wall_s": -1,
+    "gui_loop_lag_p50_ms": -1,
+    "gui_loop_lag_p99_ms": -1,
+    "gui_loop_lag_max_ms": -1,
+    "peak_rss_mb": -1,
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса (без дочерних), МБ."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def stub_env(lines, rate=0, log_every=1):
+    os.environ["FAKE_YTDLP_LINES"] = str(lines)
+    os.environ["FAKE_YTDLP_RATE"] = str(rate)
+    os.environ["FAKE_YTDLP_LOG_EVERY"] = str(log_every)
+    os.environ["FAKE_YTDLP_SIZE"] = str(64 * 1024)
+
+
+def fake_tools(workdir):
+    """
+    Пути к заглушке yt-dlp и к «ffmpeg», который мгновенно создаёт пустой
+    выходной файл: замеряется обвязка постобработки, а не кодирование.
+    """
+    ffmpeg = os.path.join(workdir, "ffmpeg")
+    with open(ffmpeg, "w") as f:
+        # На проверку версии при старте окна отвечает как ffmpeg
+        f.write('#!/bin/sh\nfor last; do :; done\n'
+                'case "$last" in -version|-encoders) echo "ffmpeg version bench"; exit 0;; esac\n'
+                ': > "$last"\necho progress=end\n')
+    os.chmod(ffmpeg, 0o755)
+    return STUB, ffmpeg
+
+
+def job_urls(count, unavailable_every=0):
+    urls = []
+    for i in range(count):
+        if unavailable_every and i % unavailable_every == unavailable_every - 1:
+            urls.append(f"http://bench.invalid/unavailable/{i}")
+        else:
+            urls.append(f"http://bench.invalid/video/{i}")
+    return urls
+
+
+def run_parse(params, workdir):
+    from ytdld.progress import parse_progress_line
+
+    progress = "__YTDLD__downloading|123456|1048576|NA|524288.5|2|10|200"
+    other = "[download] Got fragment 10 of 200"
+    count = params["parse_lines"]
+    result = {}
+    for name, line in (("parse_progress_ns", progress), ("parse_other_ns", other)):
+        best = None
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(count):
+                parse_progress_line(line)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        result[name] = best / count * 1e9
+    return result
+
+
+def run_worker(params, workdir):
+    from ytdld.tasks import DownloadTask
+
+    lines = params["worker_lines"]
+    stub_env(lines)
+    yt_dlp, ffmpeg = fake_tools(workdir)
+    finished = threading.Event()
+    task = DownloadTask("http://bench.invalid/video/0", workdir, "video+audio", "best",
+                        "mp3", "any", yt_dlp, ffmpeg, job_id=1,
+                        on_finished=lambda *args: finished.set())
+    received = 0
+    start = time.perf_counter()
+    task.start()
+    # Как очередь: вывод забирается пачкой раз в 200 мс
+    while not finished.wait(0.2):
+        received += len(task.take_output()[0])
+    task.wait()
+    elapsed = time.perf_counter() - start
+    received += len(task.take_output()[0])
+    # Строк прогресса столько же, сколько строк лога; обе проходят через разбор
+    return {"worker_lines_per_s": (lines * 2) / elapsed, "worker_log_lines": received}
+
+
+def run_queue(params, workdir):
+    from ytdld.scheduler import DownloadQueue, JOB_DONE
+
+    stub_env(params["queue_lines"])
+    yt_dlp, ffmpeg = fake_tools(workdir)
+    queue = DownloadQueue(yt_dlp, ffmpeg, max_workers=params["queue_workers"])
+    queue.skip_archived = False
+    urls = job_urls(params["queue_jobs"], params["queue_unavailable_every"])
+    added, finished = {}, {}
+    idle = threading.Event()
+
+    def on_event(event, *args):
+        now = time.perf_counter()
+        if event == "job_added":
+            added[args[0]] = now
+        elif event == "job_finished":
+            finished[args[0]] = now
+        elif event == "queue_idle" and len(finished) >= len(urls):
+            idle.set()
+
+    queue.add_listener(on_event)
+    start = time.perf_counter()
+    for url in urls:
+        queue.add(url, os.path.join(workdir, "out"), "video+audio", "720p", "mp3", "any")
+    idle.wait()
+    wall = time.perf_counter() - start
+    done = sum(1 for j in queue.snapshot() if j.status == JOB_DONE)
+    queue.stop_all()
+    latencies = [(finished[i] - added[i]) * 1000 for i in finished]
+    return {
+        "queue_wall_s": wall,
+        "queue_job_p50_ms": percentile(latencies, 50),
+        "queue_job_p95_ms": percentile(latencies, 95),
+        "queue_done": done,
+    }
+
+
+def run_gui(params, workdir):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PySide6.QtCore import QTimer
+        from PySide6.QtWidgets import QApplication, QMessageBox
+    except ImportError:
+        return {}
+    from ytdld.gui import YTDLP_GUI
+
+    stub_env(params["gui_lines"], rate=params["gui_rate"])
+    yt_dlp, ffmpeg = fake_tools(workdir)
+    # Итоговые окна сообщений модальные — в замере они не нужны
+    for name in ("information", "warning", "critical"):
+        setattr(QMessageBox, name, staticmethod(lambda *args: None))
+
+    app = QApplication.instance() or QApplication([])
+    window = YTDLP_GUI()
+    # Проверка программ при старте разовая — в замер цикла событий не входит
+    window.tools.wait()
+    window.tools.overrides.update({"yt-dlp": yt_dlp, "ffmpeg": ffmpeg})
+    window.check_executables()
+    window.tools.wait()
+    window.queue.skip_archived = False
+    window.folder_input.setText(os.path.join(workdir, "out"))
+    window.workers_combo.setCurrentIndex(4)
+    window.show()
+
+    interval_ms = 10
+    lags = []
+    last = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        lags.append(max(0.0, (now - last[0]) * 1000 - interval_ms))
+        last[0] = now
+
+    timer = QTimer()
+    timer.setInterval(interval_ms)
+    timer.timeout.connect(tick)
+    window.bridge.queue_idle.connect(lambda: QTimer.singleShot(0, app.quit))
+
+    window.url_input.setText(" ".join(job_urls(params["gui_jobs"])))
+    start = time.perf_counter()
+    timer.start()
+    window.start_download()
+    app.exec()
+    wall = time.perf_counter() - start
+    timer.stop()
+    window.queue.stop_all()
+    return {
+        "gui_wall_s": wall,
+        "gui_loop_lag_p50_ms": percentile(lags, 50),
+        "gui_loop_lag_p99_ms": percentile(lags, 99),
+        "gui_loop_lag_max_ms": max(lags) if lags else None,
+    }
+
+
+RUNNERS = {"parse": run_parse, "worker": run_worker, "queue": run_queue, "gui": run_gui}
+
+
+def run_scenario(name, params):
+    """Выполняется в дочернем процессе: печатает результат одной строкой JSON."""
+    with tempfile.TemporaryDirectory(prefix="ytdld-bench-") as workdir:
+        # Кеш форматов и архив — во временном каталоге, а не у пользователя
+        os.environ["XDG_DATA_HOME"] = workdir
+        os.environ["APPDATA"] = workdir
+        result = RUNNERS[name](params, workdir)
+    if result:
+        result[f"{name}_peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def spawn_scenario(name, quick):
+    cmd = [sys.executable, os.path.abspath(__file__), "--scenario", name]
+    if quick:
+        cmd.append("--quick")
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        raise SystemExit(f"Сценарий {name} завершился с ошибкой")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def metric_direction(name):
+    if name.endswith("_peak_rss_mb"):
+        return METRICS["peak_rss_mb"]
+    return METRICS.get(name)
+
+
+def print_results(results, baseline=None, threshold=0.1):
+    regressions = []
+    for name, value in results.items():
+        if not isinstance(value, (int, float)):
+            continue
+        line = f"{name:28} {value:14.2f}"
+        direction = metric_direction(name)
+        old = (baseline or {}).get(name)
+        if direction and isinstance(old, (int, float)) and old:
+            change = (value - old) / old
+            line += f"   было {old:12.2f}  {change:+7.1%}"
+            if change * direction < -threshold:
+                line += "  ← хуже"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="уменьшенные объёмы")
+    parser.add_argument("--only", action="append", choices=SCENARIOS,
+                        help="выполнить только указанные сценарии")
+    parser.add_argument("--save", metavar="FILE", help="сохранить результат в JSON")
+    parser.add_argument("--compare", metavar="FILE", help="сравнить с сохранённым")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="порог ухудшения для --compare (доля, 0.1 — 10%%)")
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    params = QUICK_PARAMS if args.quick else PARAMS
+
+    if args.scenario:
+        run_scenario(args.scenario, params)
+        return 0
+
+    results = {}
+    for name in args.only or SCENARIOS:
+        results.update(spawn_scenario(name, args.quick))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("params") != params:
+            print("Внимание: параметры сохранённого замера отличаются", file=sys.stderr)
+        baseline = saved.get("results")
+        print(f"Сравнение с {saved.get('commit')} ({args.compare})")
+    regressions = print_results(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "python": platform.python_version(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "params": params, "results": results},
+                      f, ensure_ascii=False, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Время холодного старта двух точек входа: консольного режима
+(source.py --cli --help) и импорта графического интерфейса (ytdld.gui,
+вместе с PySide6). Каждый замер — отдельный процесс Python.
+
+    python benchmarks/startup_time.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("cli", [os.path.join(ROOT, "source.py"), "--cli", "--help"]),
+    ("gui (импорт)", ["-c", "import ytdld.gui"]),
+]
+
+
+def measure(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=ROOT, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, case_args in CASES:
+        measure(case_args)  # прогрев файлового кеша и __pycache__
+        times = [measure(case_args) * 1000 for _ in range(args.runs)]
+        print(f"{name:14} медиана {statistics.median(times):7.1f} мс, "
+              f"мин {min(times):7.1f} мс, макс {max(times):7.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Распознавание ссылок на плейлисты и разбор строк --flat-playlist."""
+
+import unittest
+
+from ytdld.playlist import PLAYLIST_ENTRY_PREFIX, looks_like_playlist, parse_playlist_entry
+
+
+class LooksLikePlaylistTest(unittest.TestCase):
+    def test_playlist_and_channel_pages(self):
+        for url in ("https://www.youtube.com/playlist?list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf",
+                    "https://www.youtube.com/@channel",
+                    "https://www.youtube.com/@channel/videos",
+                    "https://www.youtube.com/channel/UC_x5XG1OV2P6uZZ5FSM9Ttw",
+                    "https://www.youtube.com/c/SomeName",
+                    "https://www.youtube.com/user/SomeName"):
+            self.assertTrue(looks_like_playlist(url), url)
+
+    def test_video_opened_from_playlist_is_single(self):
+        # Ссылка, скопированная из видео в плейлисте, миксе или радио
+        for url in ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=RDdQw4w9WgXcQ",
+                    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLrAXtmErZgOeiKm4s&index=3",
+                    "https://youtu.be/dQw4w9WgXcQ?list=PLrAXtmErZgOeiKm4s"):
+            self.assertFalse(looks_like_playlist(url), url)
+
+    def test_plain_videos(self):
+        for url in ("https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                    "https://vimeo.com/76979871",
+                    # Маркер в запросе, а не в пути, ничего не значит
+                    "https://example.com/watch?next=/playlist"):
+            self.assertFalse(looks_like_playlist(url), url)
+
+
+class ParsePlaylistEntryTest(unittest.TestCase):
+    def test_entry(self):
+        line = (PLAYLIST_ENTRY_PREFIX + "12|Youtube|dQw4w9WgXcQ|"
+                "https://www.youtube.com/watch?v=dQw4w9WgXcQ|Title | with bar")
+        url, title, count, key = parse_playlist_entry(line)
+        self.assertEqual(url, "https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        self.assertEqual(title, "Title | with bar")
+        self.assertEqual(count, 12)
+        self.assertIsNotNone(key)
+
+    def test_missing_fields(self):
+        line = PLAYLIST_ENTRY_PREFIX + "NA|NA|NA|https://example.com/v/1|NA"
+        self.assertEqual(parse_playlist_entry(line),
+                         ("https://example.com/v/1", None, None, None))
+        self.assertIsNone(parse_playlist_entry(PLAYLIST_ENTRY_PREFIX + "NA|NA|NA|NA|x"))
+        self.assertIsNone(parse_playlist_entry("[download] Downloading item 1 of 3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
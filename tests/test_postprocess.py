@@ -0,0 +1,53 @@
+"""
+Команды ffmpeg для постобработки: копирование потоков идёт первым,
+перекодирование — только если копирование заведомо не получится.
+"""
+
+import unittest
+
+from ytdld.postprocess import (CONTAINER_VIDEO_CODECS, POST_AUDIO, POST_COPY,
+                               POST_TRANSCODE, PostProcessJob)
+
+FFMPEG = "/usr/bin/ffmpeg"
+
+
+def merge_job(video, audio, container):
+    return PostProcessJob.for_files([video, audio], "video+audio", "mp3", container)
+
+
+class MergeCommandsTest(unittest.TestCase):
+    def test_vp9_opus_to_mp4_copies(self):
+        job = merge_job("Clip.f248.webm", "Clip.f251.webm", "mp4")
+        self.assertEqual(job.output, "Clip.mp4")
+        commands = job.commands(FFMPEG, vcodec="vp09.00.50.08", acodec="opus")
+        self.assertEqual([mode for mode, _ in commands], [POST_COPY])
+        mode, cmd = commands[0]
+        self.assertIn("-c", cmd)
+        self.assertEqual(cmd[cmd.index("-c") + 1], "copy")
+        self.assertNotIn("libx264", cmd)
+        self.assertEqual(cmd[-1], "Clip.mp4")
+
+    def test_vp9_short_name_from_ffprobe(self):
+        job = merge_job("Clip.f248.webm", "Clip.f251.webm", "mp4")
+        commands = job.commands(FFMPEG, vcodec="vp9", acodec="opus")
+        self.assertEqual([mode for mode, _ in commands], [POST_COPY])
+
+    def test_unknown_codecs_try_copy_first(self):
+        job = merge_job("Clip.f248.webm", "Clip.f251.webm", "mp4")
+        modes = [mode for mode, _ in job.commands(FFMPEG)]
+        self.assertEqual(modes, [POST_COPY, POST_AUDIO, POST_TRANSCODE])
+
+    def test_incompatible_audio_reencodes_audio_only(self):
+        job = merge_job("Clip.f137.mp4", "Clip.f171.webm", "mp4")
+        commands = job.commands(FFMPEG, vcodec="avc1.640028", acodec="vorbis")
+        self.assertEqual([mode for mode, _ in commands], [POST_AUDIO])
+        self.assertNotIn(CONTAINER_VIDEO_CODECS["mp4"][1], commands[0][1])
+
+    def test_incompatible_video_transcodes(self):
+        job = merge_job("Clip.f1.flv", "Clip.f2.m4a", "mp4")
+        commands = job.commands(FFMPEG, vcodec="flv1", acodec="mp4a.40.2")
+        self.assertEqual([mode for mode, _ in commands], [POST_TRANSCODE])
+
+
+if __name__ == "__main__":
+    unittest.main()
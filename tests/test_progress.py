@@ -0,0 +1,140 @@
+"""
+Разбор --progress-template на выводе, записанном с настоящего yt-dlp:
+обычная загрузка видео и звука со слиянием и HLS по фрагментам.
+"""
+
+import unittest
+
+from ytdld.progress import PROGRESS_TEMPLATE, JobProgress, parse_progress_line
+from ytdld.tasks import DESTINATION_PREFIX, YT_DLP_POSTPROCESS_PREFIXES
+
+# yt-dlp -f "bv+ba" без отдельной постобработки: два потока, затем слияние
+SPLIT_OUTPUT = """\
+[info] split1: Downloading 1 format(s): v1+a2
+[download] Destination: Split test.fv1.mp4
+__YTDLD__downloading|1024|373377|NA|NA|NA|NA|NA
+__YTDLD__downloading|3072|373377|NA|1359310.2529802723|0|NA|NA
+__YTDLD__downloading|130048|373377|NA|2060426.569481589|0|NA|NA
+__YTDLD__downloading|373377|373377|NA|2078431.6035037427|0|NA|NA
+__YTDLD__finished|373377|373377|NA|1773758.4362132647|NA|NA|NA
+[download] Destination: Split test.fa2.webm
+__YTDLD__downloading|1024|204926|NA|NA|NA|NA|NA
+__YTDLD__downloading|64512|204926|NA|2011634.4605045016|0|NA|NA
+__YTDLD__downloading|204926|204926|NA|2054945.2303631625|0|NA|NA
+__YTDLD__finished|204926|204926|NA|1974151.6566924215|NA|NA|NA
+[Merger] Merging formats into "Split test.mkv"
+Deleting original file Split test.fv1.mp4 (pass -k to keep)
+"""
+
+# HLS из 5 фрагментов: размера нет, только оценка, скорость поначалу 0
+HLS_OUTPUT = """\
+[hlsnative] Downloading m3u8 manifest
+[hlsnative] Total fragments: 5
+[download] Destination: out.ts
+__YTDLD__downloading|1024|NA|104340.0|0|NA|0|5
+__YTDLD__downloading|20868|NA|208680.0|0|NA|1|5
+__YTDLD__downloading|41548|NA|155570.0|0|NA|2|5
+__YTDLD__downloading|61852|NA|136926.66666666666|0|NA|3|5
+__YTDLD__downloading|77212|NA|111890.0|462144.7365579454|NA|3|5
+__YTDLD__downloading|103400|NA|124456.0|462144.7365579454|NA|5|5
+__YTDLD__finished|103400|103400|NA|1484140.325853732|NA|NA|NA
+"""
+
+
+def feed(progress, output):
+    """Как цикл чтения DownloadTask: события прогресса, новые потоки, слияние."""
+    events = []
+    for line in output.splitlines():
+        event = parse_progress_line(line)
+        if event is not None:
+            progress.add(event)
+            events.append(event)
+        elif line.startswith(DESTINATION_PREFIX):
+            progress.next_stream()
+        elif line.startswith(YT_DLP_POSTPROCESS_PREFIXES):
+            progress.post_begin()
+    return events
+
+
+class ParseProgressLineTest(unittest.TestCase):
+    def test_template_fields_match_parser(self):
+        self.assertTrue(PROGRESS_TEMPLATE.startswith("download:__YTDLD__"))
+        self.assertEqual(PROGRESS_TEMPLATE.count("|"), 7)
+
+    def test_first_line_without_speed(self):
+        event = parse_progress_line("__YTDLD__downloading|1024|373377|NA|NA|NA|NA|NA")
+        self.assertEqual(event.status, "downloading")
+        self.assertEqual(event.downloaded, 1024)
+        self.assertEqual(event.total, 373377)
+        self.assertIsNone(event.speed)
+        self.assertIsNone(event.eta)
+        self.assertIsNone(event.fragment_index)
+        self.assertEqual(event.percent, 0)
+
+    def test_speed_and_eta(self):
+        event = parse_progress_line(
+            "__YTDLD__downloading|130048|373377|NA|2060426.569481589|0|NA|NA")
+        self.assertAlmostEqual(event.speed, 2060426.569481589)
+        self.assertEqual(event.eta, 0)
+        self.assertEqual(event.percent, 34)
+
+    def test_finished(self):
+        event = parse_progress_line(
+            "__YTDLD__finished|204926|204926|NA|1974151.6566924215|NA|NA|NA")
+        self.assertEqual(event.status, "finished")
+        self.assertEqual(event.percent, 100)
+
+    def test_fragments_use_size_estimate(self):
+        event = parse_progress_line("__YTDLD__downloading|41548|NA|155570.0|0|NA|2|5")
+        self.assertEqual(event.total, 155570)
+        self.assertEqual(event.speed, 0)
+        self.assertEqual((event.fragment_index, event.fragment_count), (2, 5))
+        self.assertEqual(event.percent, 26)
+
+    def test_fragments_without_sizes(self):
+        event = parse_progress_line("__YTDLD__downloading|NA|NA|NA|NA|NA|3|5")
+        self.assertIsNone(event.downloaded)
+        self.assertEqual(event.percent, 60)
+
+    def test_other_lines_ignored(self):
+        for line in ('[Merger] Merging formats into "Split test.mkv"',
+                     "[download] Destination: out.ts",
+                     "[hlsnative] Total fragments: 5",
+                     "__YTDLD__downloading|1024|NA",
+                     ""):
+            self.assertIsNone(parse_progress_line(line), line)
+
+
+class JobProgressTest(unittest.TestCase):
+    def assert_monotonic(self, values):
+        self.assertEqual(values, sorted(values))
+
+    def test_split_download_with_merge(self):
+        progress = JobProgress(streams=2, post_kind="merge")
+        percents = []
+        for line in SPLIT_OUTPUT.splitlines():
+            feed(progress, line)
+            percents.append(progress.percent())
+        self.assert_monotonic(percents)
+        # Слияние ещё идёт — не 100, но оба потока уже учтены
+        self.assertLess(percents[-1], 100)
+        self.assertGreaterEqual(percents[-1], 90)
+        self.assertEqual(progress.remaining_bytes(), 0)
+
+    def test_planned_sizes_weigh_streams(self):
+        # Видео скачано целиком, звука ещё нет: доля видео по объёму, а не 50 или 100
+        progress = JobProgress()
+        progress.plan([373377, 204926])
+        feed(progress, SPLIT_OUTPUT.split("[download] Destination: Split test.fa2")[0])
+        self.assertEqual(progress.percent(), 64)
+
+    def test_hls_fragments(self):
+        progress = JobProgress()
+        events = feed(progress, HLS_OUTPUT)
+        self.assertEqual(len(events), 7)
+        self.assertEqual(progress.remaining_bytes(), 0)
+        self.assertEqual(progress.percent(), 99)
+
+
+if __name__ == "__main__":
+    unittest.main()
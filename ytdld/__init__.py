@@ -0,0 +1,7 @@
+"""
+YT-DLD: загрузчик видео на основе yt-dlp.
+
+Логика загрузок (очередь, команды yt-dlp, разбор прогресса) не зависит
+от Qt и используется как графическим интерфейсом (ytdld.gui), так и
+консольным режимом (ytdld.cli).
+"""
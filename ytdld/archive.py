@@ -0,0 +1,96 @@
+"""Архив уже загруженного медиа."""
+
+import os
+import threading
+import urllib.parse
+
+# Архив загруженного: ключ медиа + профиль формата
+YOUTUBE_HOSTS = ("youtube.com", "music.youtube.com")
+
+def media_key(extractor, video_id):
+    """Ключ медиа в архиве: «экстрактор:ID»."""
+    return f"{extractor.lower()}:{video_id}"
+
+
+def media_key_from_url(url):
+    """
+    Ключ медиа без извлечения метаданных. ID берётся из ссылки, где его
+    формат известен (YouTube), иначе ключом служит сама ссылка.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    video_id = None
+    if host == "youtu.be":
+        video_id = parts.path.strip("/").split("/")[0]
+    elif host in YOUTUBE_HOSTS:
+        segments = parts.path.strip("/").split("/")
+        if parts.path == "/watch":
+            video_id = urllib.parse.parse_qs(parts.query).get("v", [None])[0]
+        elif len(segments) >= 2 and segments[0] in ("shorts", "live", "embed"):
+            video_id = segments[1]
+    if video_id:
+        return media_key("youtube", video_id)
+    return "url:" + urllib.parse.urlunsplit(parts._replace(fragment=""))
+
+
+def format_profile(format_choice, quality, audio_format, video_format):
+    """Профиль формата: одно и то же видео в другом качестве — другая загрузка."""
+    if format_choice == "audio":
+        return f"audio/{audio_format}"
+    return f"{format_choice}/{quality}/{video_format}"
+
+
+class DownloadArchive:
+    """
+    Архив уже загруженного: пары «ключ медиа — профиль формата».
+    Записи только дописываются в конец файла (с fsync), а в памяти
+    хранятся множеством, поэтому проверка стоит O(1). Оборванная при
+    сбое последняя строка при загрузке отбрасывается.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._records = set()
+        self._lock = threading.Lock()
+        self._needs_newline = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        lines = data.split("\n")
+        if lines[-1]:
+            # Запись не дописана до конца — игнорируем её, а следующую
+            # начинаем с новой строки
+            self._needs_newline = True
+        self._records.update(line for line in lines[:-1] if line)
+
+    @staticmethod
+    def _record(key, profile):
+        return f"{key}\t{profile}"
+
+    def contains(self, key, profile):
+        return self._record(key, profile) in self._records
+
+    def add(self, keys, profile):
+        """Записывает загруженное медиа под всеми известными ключами."""
+        with self._lock:
+            records = [self._record(k, profile) for k in keys
+                       if k and self._record(k, profile) not in self._records]
+            if not records:
+                return
+            text = "\n".join(records) + "\n"
+            if self._needs_newline:
+                text = "\n" + text
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            self._needs_newline = False
+            self._records.update(records)
@@ -0,0 +1,162 @@
+"""
+Общий лимит скорости для всех загрузок: бюджет делится между активными
+задачами и передаётся каждой через yt-dlp --limit-rate.
+"""
+
+import datetime
+import re
+
+BANDWIDTH_MIN_JOB_RATE = 32 * 1024    # меньше задаче не даём, чтобы не «голодала»
+BANDWIDTH_REBALANCE_DELTA = 0.25      # перезапуск ради новой доли — при изменении больше чем на 25%
+BANDWIDTH_REBALANCE_INTERVAL = 15.0   # и не чаще раза в столько секунд на задачу
+BANDWIDTH_IDLE_RATIO = 0.8            # задача, качающая медленнее 80% доли, упёрлась не в лимит
+
+RATE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_RATE_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([KMG]?)(?:I?B)?(?:/S)?\s*$", re.IGNORECASE)
+_RULE_RE = re.compile(
+    r"^\s*(?:(\d)(?:-(\d))?\s+)?(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\S+)\s*$")
+
+
+def parse_rate(text):
+    """
+    Скорость в байтах/с из строки вида «500K», «2M», «1.5 MB/s».
+    Пустая строка или 0 — без ограничения (None). ValueError при ошибке.
+    """
+    text = (text or "").strip()
+    if not text:
+        return None
+    match = _RATE_RE.match(text)
+    if not match:
+        raise ValueError(f"Не понимаю скорость: {text}")
+    rate = int(float(match.group(1).replace(",", ".")) * RATE_UNITS[match.group(2).upper()])
+    return rate or None
+
+
+class RateSchedule:
+    """
+    Лимит по времени суток. Правила через «;» или с новой строки:
+        [дни ]ЧЧ:ММ-ЧЧ:ММ=скорость
+    дни — номер (1 — понедельник) или диапазон «1-5»; интервал может
+    переходить через полночь. Действует первое подходящее правило,
+    вне правил — общий лимит.
+    """
+
+    def __init__(self, text=""):
+        self.rules = []
+        for part in re.split(r"[;\n]", text or ""):
+            if not part.strip():
+                continue
+            match = _RULE_RE.match(part)
+            if not match:
+                raise ValueError(f"Не понимаю правило расписания: {part.strip()}")
+            day_from, day_to, h1, m1, h2, m2, rate = match.groups()
+            days = None
+            if day_from:
+                first, last = int(day_from), int(day_to or day_from)
+                if not (1 <= first <= 7 and 1 <= last <= 7):
+                    raise ValueError(f"Дни недели — от 1 до 7: {part.strip()}")
+                days = set(range(first, last + 1)) if first <= last else (
+                    set(range(first, 8)) | set(range(1, last + 1)))
+            start, end = int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+            if max(int(h1), int(h2)) > 24 or max(int(m1), int(m2)) > 59:
+                raise ValueError(f"Неверное время: {part.strip()}")
+            self.rules.append((days, start, end, parse_rate(rate)))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, now):
+        """(True, лимит) для действующего правила, (False, None), если его нет."""
+        minute = now.hour * 60 + now.minute
+        weekday = now.isoweekday()
+        for days, start, end, rate in self.rules:
+            if start <= end:
+                inside = start <= minute < end
+                day = weekday
+            else:  # через полночь: после полуночи действуют дни начала интервала
+                inside = minute >= start or minute < end
+                day = weekday if minute >= start else (weekday - 2) % 7 + 1
+            if inside and (days is None or day in days):
+                return True, rate
+        return False, None
+
+
+class BandwidthBudget:
+    """
+    Делит общий лимит между задачами: пропорционально весу (приоритету),
+    но задача, которая и так качает медленнее своей доли (упёрлась в сайт),
+    получает чуть больше своей скорости, а остаток достаётся другим.
+    """
+
+    def __init__(self, limit=None, schedule=None):
+        self.limit = limit                     # байт/с, None — без ограничения
+        self.schedule = schedule or RateSchedule()
+
+    def current_limit(self, now=None):
+        if self.schedule:
+            matched, rate = self.schedule.match(now or datetime.datetime.now())
+            if matched:
+                return rate
+        return self.limit
+
+    @staticmethod
+    def weight(priority):
+        return 1 + max(0, priority)
+
+    def allocate(self, jobs, now=None):
+        """
+        jobs — список (job_id, приоритет, текущая доля или None, скорость или None).
+        Возвращает {job_id: байт/с или None}.
+        """
+        total = self.current_limit(now)
+        if total is None or not jobs:
+            return {job_id: None for job_id, *_ in jobs}
+
+        # Спрос: задачи, недобирающие свою долю, просят чуть больше того,
+        # что качают; остальные — сколько дадут
+        demand = {}
+        for job_id, _, share, speed in jobs:
+            if share and speed is not None and speed < share * BANDWIDTH_IDLE_RATIO:
+                demand[job_id] = max(BANDWIDTH_MIN_JOB_RATE, speed * 1.25)
+            else:
+                demand[job_id] = None
+
+        # Заполнение «водой»: ограниченные спросом получают спрос,
+        # остаток делится по весам между остальными
+        result = {}
+        remaining = total
+        active = {job_id: self.weight(priority) for job_id, priority, *_ in jobs}
+        while active:
+            weights = sum(active.values())
+            satisfied = [job_id for job_id, w in active.items()
+                         if demand[job_id] is not None
+                         and demand[job_id] <= remaining * w / weights]
+            if not satisfied:
+                break
+            for job_id in satisfied:
+                result[job_id] = demand[job_id]
+                remaining -= demand[job_id]
+                del active[job_id]
+        weights = sum(active.values())
+        for job_id, w in active.items():
+            result[job_id] = remaining * w / weights
+
+        # Нижняя граница на задачу, но сумма не больше общего лимита: при
+        # множестве задач граница снижается, а добавку оплачивают задачи,
+        # получившие больше неё
+        floor = min(BANDWIDTH_MIN_JOB_RATE, total / len(result))
+        excess = sum(max(0.0, floor - rate) for rate in result.values())
+        spare = sum(max(0.0, rate - floor) for rate in result.values())
+        for job_id, rate in result.items():
+            if rate <= floor:
+                result[job_id] = floor
+            elif excess:
+                result[job_id] = rate - excess * (rate - floor) / spare
+        return {job_id: max(1, int(rate)) for job_id, rate in result.items()}
+
+
+def rate_changed(old, new):
+    """Стоит ли перезапускать задачу ради новой доли."""
+    if old is None or new is None:
+        return old != new
+    return abs(new - old) > old * BANDWIDTH_REBALANCE_DELTA
@@ -0,0 +1,313 @@
+"""
+Консольный режим: загрузка списка ссылок без графического интерфейса.
+
+Ссылки берутся из аргументов, из файла (--input) или со стандартного
+ввода (--input -), по одной или через пробел. Ход загрузки печатается
+в stdout построчно в JSON — удобно для cron и разбора другими программами.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from .bandwidth import RateSchedule, parse_rate
+from .control import ControlServer, EventFormatter, default_control_address
+from .engine import engine_available
+from .formats import (AUDIO_FORMAT_CHOICES, CONTAINER_CHOICES, FORMAT_CHOICES,
+                      QUALITY_CHOICES, FormatCache)
+from .fragments import FRAGMENTS_JOB_MAX
+from .metrics import set_metrics_file
+from .postprocess import required_encoders
+from .preview import MediaPreview, PreviewFetcher
+from .store import ContentStore
+from .scheduler import DownloadQueue, JOB_DONE, JOB_FAILED, JOB_SKIPPED
+from .tools import ToolRegistry
+from .util import app_data_dir, set_log_file
+
+def fragments_arg(value):
+    if value == "auto":
+        return 0
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("ожидается число или auto")
+    if not 1 <= count <= FRAGMENTS_JOB_MAX:
+        raise argparse.ArgumentTypeError(f"от 1 до {FRAGMENTS_JOB_MAX}")
+    return count
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="yt-dld --cli",
+        description="Загрузка видео и аудио через yt-dlp без графического интерфейса.")
+    parser.add_argument("urls", nargs="*", metavar="URL", help="ссылки для загрузки")
+    parser.add_argument("-i", "--input", metavar="FILE",
+                        help="файл со списком ссылок («-» — стандартный ввод)")
+    parser.add_argument("-o", "--output", default=os.path.expanduser("~/Downloads"),
+                        help="папка для загрузки (по умолчанию ~/Downloads)")
+    parser.add_argument("-f", "--format", choices=FORMAT_CHOICES, default="video+audio",
+                        help="что загружать")
+    parser.add_argument("-q", "--quality", choices=QUALITY_CHOICES, default="best",
+                        help="максимальное качество видео")
+    parser.add_argument("--audio-format", choices=AUDIO_FORMAT_CHOICES, default="mp3",
+                        help="формат аудио для режима audio")
+    parser.add_argument("--container", choices=CONTAINER_CHOICES, default="any",
+                        help="контейнер видео")
+    parser.add_argument("-w", "--workers", type=int, default=0,
+                        help="одновременных загрузок (0 — автоматически)")
+    parser.add_argument("-N", "--fragments", type=fragments_arg, default=0,
+                        metavar="N|auto",
+                        help="фрагментов DASH/HLS одновременно (auto — по скорости)")
+    parser.add_argument("-r", "--limit-rate", metavar="RATE",
+                        help="общий лимит скорости на все загрузки (500K, 5M)")
+    parser.add_argument("--rate-schedule", metavar="RULES",
+                        help="лимит по времени: «1-5 09:00-18:00=2M; 00:00-07:00=0»")
+    parser.add_argument("--staging-dir", metavar="DIR",
+                        help="локальный каталог для частей и слияния; готовый файл "
+                             "переносится в каталог загрузки одним шагом")
+    parser.add_argument("--preview", action="store_true",
+                        help="не загружать: напечатать название, длительность и "
+                             "оценку размера по качествам")
+    parser.add_argument("--control", nargs="?", const="", metavar="ADDR",
+                        help="сервер управления для других программ: путь к "
+                             "Unix-сокету или порт на localhost (без значения — "
+                             "сокет в служебном каталоге); работает до SIGTERM")
+    parser.add_argument("--engine", action="store_true",
+                        help="встроенный движок: yt-dlp в тёплых процессах")
+    parser.add_argument("--no-playlist-expand", action="store_true",
+                        help="загружать плейлист одним вызовом yt-dlp")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="не пропускать уже загруженное")
+    parser.add_argument("--log", action="store_true",
+                        help="печатать вывод yt-dlp (события log)")
+    parser.add_argument("--log-file", metavar="FILE",
+                        help="сохранять полный лог задач в файл")
+    parser.add_argument("--store", metavar="DIR",
+                        help="хранилище готовых файлов: повтор в другую папку — "
+                             "жёсткой ссылкой (по умолчанию в служебном каталоге; "
+                             "«-» — выключить)")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="журнал задач: прерванные загрузки из него продолжаются "
+                             "при следующем запуске")
+    parser.add_argument("--metrics-log", metavar="FILE",
+                        help="замеры по задачам в JSONL (по умолчанию в служебном "
+                             "каталоге; «-» — не записывать)")
+    parser.add_argument("--prometheus", metavar="FILE",
+                        help="текстовый файл метрик очереди для Prometheus")
+    parser.add_argument("--yt-dlp", metavar="PATH", help="путь к yt-dlp")
+    parser.add_argument("--ffmpeg", metavar="PATH", help="путь к ffmpeg")
+    return parser
+
+
+def read_urls(args):
+    urls = list(args.urls)
+    if args.input == "-":
+        urls.extend(sys.stdin.read().split())
+    elif args.input:
+        with open(args.input, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    urls.extend(line.split())
+    return urls
+
+
+class EventPrinter(EventFormatter):
+    """Печатает события очереди строками JSON и отслеживает её завершение."""
+
+    def __init__(self, queue, expected, show_log=False, stream=None):
+        super().__init__(queue)
+        self.expected = expected      # сколько ссылок поставлено в очередь
+        self.added = 0
+        self.show_log = show_log
+        self.stream = stream or sys.stdout
+        self.done = threading.Event()
+        queue.add_listener(self.on_event)
+
+    def print(self, event, **fields):
+        self.write({"event": event, **fields})
+
+    def write(self, fields):
+        self.stream.write(json.dumps(fields, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def on_event(self, event, *args):
+        if event == "job_added":
+            job = self.queue.jobs[args[0]]
+            # Восстановленные из журнала задачи — сверх ссылок этого запуска
+            if job.parent_id is None and not job.restored:
+                self.added += 1
+        if event == "job_log" and not self.show_log:
+            return
+        for fields in self.fields(event, *args):
+            self.write(fields)
+        if event == "queue_idle":
+            # Очередь могла опустеть до того, как добавлены все ссылки
+            # (например, первая уже в архиве) — тогда ждём дальше
+            if self.added >= self.expected:
+                self.done.set()
+
+
+def print_previews(urls, yt_dlp_path, args, stream=None):
+    """Событие preview по каждой ссылке; метаданные остаются в кеше для загрузки."""
+    stream = stream or sys.stdout
+    results = {}
+    done = threading.Event()
+
+    def on_result(url, info, error):
+        results[url] = (info, error)
+        done.set()
+
+    fetcher = PreviewFetcher(yt_dlp_path,
+                             FormatCache(os.path.join(app_data_dir(), "info_cache")),
+                             on_result)
+    failed = 0
+    for url in urls:
+        done.clear()
+        fetcher.request(url)
+        done.wait()
+        info, error = results[url]
+        fields = {"event": "preview", "url": url}
+        if error:
+            failed += 1
+            fields["error"] = error
+        else:
+            preview = MediaPreview.from_info(info, args.format, args.audio_format,
+                                             args.container)
+            fields.update(title=preview.title, playlist=preview.is_playlist,
+                          entries=preview.entries, duration=preview.duration,
+                          heights=preview.heights,
+                          sizes={quality: {"format": spec, "bytes": size}
+                                 for quality, (spec, size) in preview.sizes.items()})
+        stream.write(json.dumps(fields, ensure_ascii=False) + "\n")
+        stream.flush()
+    return 1 if failed else 0
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    urls = read_urls(args)
+    if not urls and not args.journal and args.control is None:
+        print("Не указано ни одной ссылки", file=sys.stderr)
+        return 2
+    bad = [url for url in urls if not url.startswith("http")]
+    if bad:
+        print("Некорректные ссылки: " + ", ".join(bad), file=sys.stderr)
+        return 2
+
+    try:
+        limit = parse_rate(args.limit_rate)
+        schedule = RateSchedule(args.rate_schedule)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    # Явно указанный путь, затем копия из комплекта программы, затем PATH;
+    # версии проверяются при первом запуске и после обновления программ
+    tools = ToolRegistry(os.path.join(app_data_dir(), "tools.json"),
+                         overrides={"yt-dlp": args.yt_dlp, "ffmpeg": args.ffmpeg},
+                         encoders=required_encoders())
+    if "yt-dlp" in tools.missing():
+        print(f"Не найден yt-dlp: {tools.path('yt-dlp')}", file=sys.stderr)
+        return 2
+    tools.probe()
+    yt_dlp_path = tools.path("yt-dlp")
+    ffmpeg_path = tools.path("ffmpeg")
+    for name, error in tools.broken():
+        print(f"{name} не запускается: {error}", file=sys.stderr)
+        if name == "yt-dlp":
+            return 2
+    for note in tools.warnings():
+        print(f"Внимание: {note}", file=sys.stderr)
+
+    if args.preview:
+        return print_previews(urls, yt_dlp_path, args)
+
+    if args.log_file:
+        set_log_file(os.path.abspath(args.log_file))
+    if args.metrics_log != "-":
+        set_metrics_file(os.path.abspath(args.metrics_log) if args.metrics_log
+                         else os.path.join(app_data_dir(), "logs", "metrics.jsonl"))
+
+    queue = DownloadQueue(yt_dlp_path, ffmpeg_path, max_workers=max(0, args.workers))
+    queue.playlist_mode = not args.no_playlist_expand
+    queue.skip_archived = not args.no_archive
+    if args.staging_dir:
+        queue.staging_root = os.path.abspath(args.staging_dir)
+    if args.store == "-":
+        queue.store = None
+    elif args.store:
+        queue.store = ContentStore(os.path.abspath(args.store))
+    if args.prometheus:
+        queue.metrics_textfile = os.path.abspath(args.prometheus)
+    if limit or schedule:
+        queue.set_bandwidth(limit, schedule)
+    if args.engine:
+        if engine_available():
+            queue.set_engine(True)
+        else:
+            print("Встроенный движок недоступен (нет модуля yt_dlp), "
+                  "используется внешний yt-dlp", file=sys.stderr)
+
+    printer = EventPrinter(queue, len(urls), show_log=args.log)
+    restored = queue.restore(os.path.abspath(args.journal)) if args.journal else 0
+    control = None
+    if args.control is not None:
+        # Задачи других программ идут в эту же очередь, с теми же лимитами
+        control = ControlServer(queue, args.control or default_control_address(),
+                                output_dir=os.path.abspath(args.output))
+        try:
+            control.start()
+        except (OSError, ValueError) as e:
+            print(f"Сервер управления не запущен: {e}", file=sys.stderr)
+            queue.stop_all()
+            return 2
+        if control.token is not None:
+            print(f"Ключ доступа к серверу управления: {control.token_path}",
+                  file=sys.stderr)
+    elif not urls and not restored:
+        queue.stop_all()
+        printer.print("summary", done=0, skipped=0, failed=0, total=0, shared=0,
+                      cpu_saved=0.0)
+        return 0
+    # systemd и cron останавливают через SIGTERM — выходим так же, как по Ctrl+C:
+    # yt-dlp завершается вместе с потомками, недокачанное остаётся в журнале
+    signal.signal(signal.SIGTERM, _interrupt)
+    for url in urls:
+        queue.add(url, args.output, args.format, args.quality,
+                  args.audio_format, args.container, fragments=args.fragments)
+    try:
+        if control is not None:
+            # С сервером управления работаем до SIGTERM или Ctrl+C:
+            # пустая очередь — не повод выходить
+            while True:
+                time.sleep(1)
+        while not printer.done.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        if control is None:
+            queue.stop_all()
+            return 130
+        control.stop()
+    queue.stop_all()
+
+    jobs = [j for j in queue.snapshot() if not j.is_playlist or not j.children]
+    done = sum(1 for j in jobs if j.status == JOB_DONE)
+    skipped = sum(1 for j in jobs if j.status == JOB_SKIPPED)
+    failed = sum(1 for j in jobs if j.status == JOB_FAILED)
+    shared = sum(1 for j in jobs if j.status == JOB_DONE and j.shared_from)
+    printer.print("summary", done=done, skipped=skipped, failed=failed, total=len(jobs),
+                  shared=shared, cpu_saved=round(queue.post_cpu_saved, 1))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
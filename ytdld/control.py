@@ -0,0 +1,628 @@
+"""
+Сервер управления: другие программы на этом компьютере ставят загрузки
+в ту же очередь, что и окно (или консольный режим), смотрят и отменяют
+задачи, меняют их порядок и получают ход загрузки потоком событий.
+Слушает Unix-сокет или порт на localhost; протокол — HTTP с JSON.
+
+    GET    /status             состояние очереди
+    GET    /jobs               все задачи; /jobs/<id> — одна
+    POST   /jobs               {"url" или "urls", "output", "format", "quality",
+                                "audio_format", "container", "fragments", "priority"}
+    PATCH  /jobs/<id>          {"priority": n} или {"move": ±n}
+    DELETE /jobs/<id>          отмена
+    GET    /events[?log=1]     события строками JSON, пока клиент не отключится
+
+Unix-сокет доступен только владельцу. На порту localhost подключиться
+может любой пользователь компьютера, поэтому там каждый запрос несёт
+заголовок «Authorization: Bearer <ключ>»; ключ создаётся при запуске
+сервера и лежит в файле, который читает только владелец.
+"""
+
+import hmac
+import http.server
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from .formats import (AUDIO_FORMAT_CHOICES, CONTAINER_CHOICES, FORMAT_CHOICES,
+                      QUALITY_CHOICES)
+from .fragments import FRAGMENTS_JOB_MAX
+from .scheduler import JOB_PENDING, JOB_STATUS_TEXT
+from .util import app_data_dir
+
+CONTROL_PORT = 8917                # по умолчанию там, где нет Unix-сокетов
+CONTROL_SOCKET_NAME = "control.sock"
+CONTROL_TOKEN_NAME = "control.token"
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+REQUEST_BODY_LIMIT = 1024 * 1024
+SUBMIT_TIMEOUT = 10.0              # ждать, пока очередь создаст задачи, с
+EVENT_BUFFER_LIMIT = 1000          # непрочитанных событий на клиента
+EVENT_KEEPALIVE = 15.0             # пустая строка клиенту, чтобы заметить отключение
+
+logger = logging.getLogger("yt-dld")
+
+
+def default_control_address():
+    """Unix-сокет в служебном каталоге, на Windows — порт на localhost."""
+    if hasattr(socket, "AF_UNIX") and not sys.platform.startswith("win"):
+        return os.path.join(app_data_dir(), CONTROL_SOCKET_NAME)
+    return f"127.0.0.1:{CONTROL_PORT}"
+
+
+def control_token_path():
+    """Файл ключа доступа к серверу на порту (Unix-сокету ключ не нужен)."""
+    return os.path.join(app_data_dir(), CONTROL_TOKEN_NAME)
+
+
+def _write_token(path, token):
+    """Пишет ключ в новый файл, который с самого начала доступен только владельцу."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token + "\n")
+
+
+def parse_address(text):
+    """
+    «8917», «127.0.0.1:8917», «[::1]:8917» -> ("tcp", (хост, порт)),
+    иначе путь к Unix-сокету -> ("unix", путь). ValueError — адрес не подходит.
+    """
+    host, sep, port = text.rpartition(":")
+    if text.isdigit():
+        host, port = "127.0.0.1", text
+    elif not sep or not port.isdigit():
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError(f"Unix-сокеты недоступны, укажите порт: {text}")
+        return "unix", os.path.abspath(os.path.expanduser(text))
+    host = host.strip("[]")
+    if host not in LOOPBACK_HOSTS:
+        raise ValueError(f"Сервер управления слушает только localhost, а не {host}")
+    if not 0 < int(port) < 65536:
+        raise ValueError(f"Некорректный порт: {port}")
+    return "tcp", (host, int(port))
+
+
+def job_fields(job, position=None):
+    """Задача для ответа API."""
+    return {
+        "id": job.job_id,
+        "url": job.url,
+        "title": job.title,
+        "parent": job.parent_id,
+        "playlist": job.is_playlist,
+        "status": job.status,
+        "status_text": JOB_STATUS_TEXT[job.status],
+        "message": job.message,
+        "position": position,         # место среди ожидающих, с нуля
+        "priority": job.priority,
+        "percent": job.progress,
+        "speed": job.speed,
+        "eta": job.eta,
+        "downloaded": job.downloaded_bytes,
+        "output": job.output_dir,
+        "format": job.format_choice,
+        "quality": job.quality,
+        "audio_format": job.audio_format,
+        "container": job.video_format,
+        "files": job.result_files,
+    }
+
+
+class EventFormatter:
+    """
+    Переводит события очереди в словари для JSON — общий формат строк
+    консольного режима и потока событий сервера. Прогресс с теми же
+    значениями, что в прошлый раз, пропускается.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._last_progress = {}
+
+    def fields(self, event, *args):
+        """Список словарей по событию очереди (пустой — печатать нечего)."""
+        if event == "job_added":
+            job = self.queue.jobs[args[0]]
+            return [{"event": "added", "id": job.job_id, "url": job.url,
+                     "parent": job.parent_id, "title": job.title,
+                     "playlist": job.is_playlist, "restored": job.restored}]
+        if event == "job_changed":
+            job = self.queue.jobs.get(args[0])
+            if job is None or not job.is_active:
+                return []
+            state = (job.status, job.progress, job.speed, job.eta, job.rate_limit,
+                     job.post_progress)
+            if self._last_progress.get(job.job_id) == state:
+                return []
+            self._last_progress[job.job_id] = state
+            return [{"event": "progress", "id": job.job_id, "status": job.status,
+                     "percent": job.progress, "speed": job.speed, "eta": job.eta,
+                     "downloaded": job.downloaded_bytes, "rate_limit": job.rate_limit,
+                     "postprocess": job.post_progress, "queue_eta": self.queue.eta}]
+        if event == "job_log":
+            job_id, lines = args
+            return [{"event": "log", "id": job_id, "line": line} for line in lines]
+        if event == "job_finished":
+            job = self.queue.jobs[args[0]]
+            self._last_progress.pop(job.job_id, None)
+            fields = {"event": "finished", "id": job.job_id, "url": job.url,
+                      "status": job.status, "status_text": JOB_STATUS_TEXT[job.status],
+                      "message": job.message}
+            if job.post_mode is not None:
+                fields.update(postprocess=job.post_mode, cpu_time=job.post_cpu_time,
+                              cpu_saved=job.post_cpu_saved)
+            return [fields]
+        return []
+
+
+class EventStream:
+    """
+    Непрочитанные события одного клиента. Служебный поток очереди только
+    кладёт в буфер и никогда не ждёт клиента: новый прогресс задачи
+    заменяет непрочитанный прогресс той же задачи, остальные события
+    копятся до EVENT_BUFFER_LIMIT. Клиент, который не успевает и за этим,
+    получает событие overflow и отключается — состояние он перечитывает
+    через GET /jobs.
+    """
+
+    def __init__(self, show_log=False):
+        self.show_log = show_log
+        self._items = deque()         # словари событий; число — прогресс этой задачи
+        self._progress = {}           # job_id -> последний непрочитанный прогресс
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, fields):
+        with self._cond:
+            if self._closed:
+                return
+            if fields["event"] == "progress":
+                job_id = fields["id"]
+                if job_id not in self._progress:
+                    self._items.append(job_id)
+                self._progress[job_id] = fields
+            elif fields["event"] == "log" and not self.show_log:
+                return
+            elif len(self._items) >= EVENT_BUFFER_LIMIT:
+                self._items.append({"event": "overflow",
+                                    "message": "Клиент не успевает читать события"})
+                self._closed = True
+            else:
+                self._items.append(fields)
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Следующее событие или None (таймаут или поток закрыт и прочитан)."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            if isinstance(item, int):
+                return self._progress.pop(item)
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class _RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _ServerMixin:
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        logger.debug("Сервер управления: ошибка запроса", exc_info=True)
+
+
+class _TCPServer(_ServerMixin, http.server.ThreadingHTTPServer):
+    pass
+
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixServer(_ServerMixin, socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+        pass
+
+
+def _remove_stale_socket(path):
+    """Сокет упавшего прошлого запуска мешает bind; на живой кто-то отвечает."""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"Не сокет: {path}")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"Сервер управления уже запущен: {path}")
+
+
+class ControlServer:
+    """
+    Сервер управления очередью. Запросы обслуживаются каждый в своём
+    потоке; очередь меняется только её публичными методами, поэтому
+    задачи из API и из окна планируются вместе — с общими лимитами
+    потоков, скорости и места на диске.
+    """
+
+    def __init__(self, queue, address, output_dir=None, token_path=None):
+        self.queue = queue
+        self.address = address        # путь к сокету или «хост:порт», как задан
+        # Папка для задач без "output"; окно меняет её вслед за своей
+        self.output_dir = output_dir or os.path.expanduser("~/Downloads")
+        self.token_path = token_path or control_token_path()
+        self.token = None             # ключ доступа, пока слушаем порт
+        self.formatter = EventFormatter(queue)
+        self._streams = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._socket_path = None
+        queue.add_listener(self._on_event)
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def start(self):
+        """Начинает слушать. ValueError — неверный адрес, OSError — занят."""
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            os.makedirs(os.path.dirname(target), mode=0o700, exist_ok=True)
+            _remove_stale_socket(target)
+            # Сокет сразу создаётся только для своего пользователя: chmod после
+            # bind оставлял бы окно, когда подключиться может любой
+            old_umask = os.umask(0o177)
+            try:
+                server = _UnixServer(target, _ControlHandler)
+            finally:
+                os.umask(old_umask)
+            self._socket_path = target
+        else:
+            self.token = secrets.token_urlsafe(32)
+            _write_token(self.token_path, self.token)
+            server_class = _TCP6Server if ":" in target[0] else _TCPServer
+            try:
+                server = server_class(target, _ControlHandler)
+            except OSError:
+                self._remove_token()
+                raise
+        server.control = self
+        server.is_unix = kind == "unix"
+        self._server = server
+        threading.Thread(target=server.serve_forever, daemon=True,
+                         name="control-server").start()
+        logger.info("Сервер управления: %s", self.address)
+        if self.token is not None:
+            logger.info("Ключ доступа к серверу управления: %s", self.token_path)
+
+    def stop(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        server.shutdown()
+        server.server_close()
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            stream.close()
+        if self._socket_path is not None:
+            try:
+                os.remove(self._socket_path)
+            except OSError:
+                pass
+            self._socket_path = None
+        self._remove_token()
+
+    def _remove_token(self):
+        if self.token is None:
+            return
+        self.token = None
+        try:
+            os.remove(self.token_path)
+        except OSError:
+            pass
+
+    def subscribe(self, show_log=False):
+        stream = EventStream(show_log)
+        with self._lock:
+            self._streams.add(stream)
+        return stream
+
+    def unsubscribe(self, stream):
+        with self._lock:
+            self._streams.discard(stream)
+
+    def _on_event(self, event, *args):
+        """Вызывается служебным потоком очереди — только раздаёт по буферам."""
+        with self._lock:
+            streams = list(self._streams)
+        if not streams:
+            return
+        if event == "queue_reordered":
+            events = [{"event": "reordered"}]
+        elif event == "queue_idle":
+            events = [{"event": "idle"}]
+        else:
+            events = self.formatter.fields(event, *args)
+        for fields in events:
+            for stream in streams:
+                stream.put(fields)
+
+    # Запросы
+
+    def status(self):
+        return {
+            "pending": len(self.queue.pending()),
+            "running": len(self.queue.running()),
+            "postprocessing": len(self.queue.postprocessing()),
+            "speed": self.queue.total_speed(),
+            "eta": self.queue.eta,
+            "workers": self.queue.worker_limit(),
+            "rate_limit": self.queue.bandwidth_limit(),
+        }
+
+    def jobs(self):
+        positions = {j.job_id: i for i, j in enumerate(self.queue.pending())}
+        return [job_fields(job, positions.get(job.job_id))
+                for job in sorted(self.queue.snapshot(), key=lambda j: j.job_id)]
+
+    def job(self, job_id):
+        job = self.queue.jobs.get(job_id)
+        if job is None:
+            raise _RequestError(404, f"Нет задачи {job_id}")
+        return job
+
+    def submit(self, body):
+        """Ставит ссылки в очередь; возвращает номера созданных задач."""
+        urls = body.get("urls")
+        if urls is None:
+            urls = [body["url"]] if body.get("url") else []
+        if (not urls or not isinstance(urls, list)
+                or not all(isinstance(url, str) and url.startswith("http") for url in urls)):
+            raise _RequestError(400, "Нужна ссылка (url) или список ссылок (urls)")
+        options = [
+            ("format", FORMAT_CHOICES, "video+audio"),
+            ("quality", QUALITY_CHOICES, "best"),
+            ("audio_format", AUDIO_FORMAT_CHOICES, "mp3"),
+            ("container", CONTAINER_CHOICES, "any"),
+        ]
+        values = []
+        for name, choices, default in options:
+            value = body.get(name, default)
+            if value not in choices:
+                raise _RequestError(400, f"{name}: одно из {', '.join(choices)}")
+            values.append(value)
+        output_dir = body.get("output") or self.output_dir
+        if isinstance(output_dir, str):
+            output_dir = os.path.expanduser(output_dir)
+        if not isinstance(output_dir, str) or not os.path.isabs(output_dir):
+            raise _RequestError(400, "output: нужен абсолютный путь")
+        fragments = body.get("fragments", 0)
+        priority = body.get("priority", 0)
+        if (not isinstance(fragments, int) or isinstance(fragments, bool)
+                or not 0 <= fragments <= FRAGMENTS_JOB_MAX):
+            raise _RequestError(400, f"fragments: от 0 (авто) до {FRAGMENTS_JOB_MAX}")
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise _RequestError(400, "priority: целое число")
+
+        ids = []
+        created = threading.Event()
+
+        def on_added(job_id):
+            ids.append(job_id)
+            if len(ids) == len(urls):
+                created.set()
+
+        for url in urls:
+            self.queue.add(url, output_dir, *values, priority=priority,
+                           fragments=fragments, on_added=on_added)
+        if not created.wait(SUBMIT_TIMEOUT):
+            raise _RequestError(503, "Очередь не ответила")
+        return ids
+
+    def update(self, job_id, body):
+        job = self.job(job_id)
+        if not job.is_active:
+            raise _RequestError(409, "Задача уже завершена")
+        if "priority" in body or "move" in body:
+            if job.status != JOB_PENDING:
+                raise _RequestError(409, "Порядок меняется только у ожидающих задач")
+        else:
+            raise _RequestError(400, "Нужно priority или move")
+        for name in ("priority", "move"):
+            value = body.get(name, 0)
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise _RequestError(400, f"{name}: целое число")
+        if "priority" in body:
+            self.queue.set_priority(job_id, body["priority"])
+        if body.get("move"):
+            self.queue.move(job_id, body["move"])
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        if not job.is_active:
+            raise _RequestError(409, "Задача уже завершена")
+        self.queue.cancel(job_id)
+
+
+class _ControlHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "yt-dld"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("Сервер управления: " + format, *args)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        control = self.server.control
+        self._body_read = False
+        path, _, query = self.path.partition("?")
+        parts = [part for part in path.split("/") if part]
+        try:
+            self._check_client()
+            if method == "GET" and parts == ["events"]:
+                show_log = parse_qs(query).get("log") == ["1"]
+                self._stream_events(control, show_log)
+                return
+            status, result = self._route(control, method, parts)
+        except _RequestError as e:
+            status, result = e.status, {"error": str(e)}
+            self.close_connection = True  # тело запроса могло остаться непрочитанным
+            self._discard_body()
+        self._send_json(status, result)
+
+    def _discard_body(self):
+        """
+        Дочитывает отвергнутое тело запроса: если закрыть соединение, не
+        прочитав его, клиент, ещё отправляющий тело, вместо ответа получит
+        обрыв.
+        """
+        if self._body_read:
+            return
+        self._body_read = True
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return
+        if 0 < length <= REQUEST_BODY_LIMIT:
+            self.rfile.read(length)
+
+    def _check_client(self):
+        # Страница в браузере может обратиться к localhost — такие запросы
+        # (с Origin или чужим Host после подмены DNS) не принимаются
+        if self.headers.get("Origin"):
+            raise _RequestError(403, "Запросы из браузера не принимаются")
+        if self.server.is_unix:
+            return
+        host = self.headers.get("Host", "")
+        if urlsplit("//" + host).hostname not in LOOPBACK_HOSTS:
+            raise _RequestError(403, f"Недопустимый Host: {host}")
+        # Порт открыт всем пользователям компьютера, а сокет — только владельцу
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        expected = self.server.control.token
+        if (scheme.lower() != "bearer" or expected is None
+                or not hmac.compare_digest(token.strip().encode(), expected.encode())):
+            raise _RequestError(401, "Нужен ключ доступа из "
+                                     f"{self.server.control.token_path} в заголовке "
+                                     "Authorization: Bearer")
+
+    def _route(self, control, method, parts):
+        if parts == ["status"] and method == "GET":
+            return 200, control.status()
+        if parts == ["jobs"]:
+            if method == "GET":
+                return 200, {"jobs": control.jobs()}
+            if method == "POST":
+                return 202, {"ids": control.submit(self._read_json())}
+        elif len(parts) == 2 and parts[0] == "jobs":
+            if not parts[1].isdigit():
+                raise _RequestError(404, f"Нет задачи {parts[1]}")
+            job_id = int(parts[1])
+            if method == "GET":
+                return 200, job_fields(control.job(job_id))
+            if method == "PATCH":
+                control.update(job_id, self._read_json())
+                return 202, {"id": job_id}
+            if method == "DELETE":
+                control.cancel(job_id)
+                return 202, {"id": job_id}
+        else:
+            raise _RequestError(404, "Нет такого адреса")
+        raise _RequestError(405, f"Метод {method} не поддерживается")
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if not 0 < length <= REQUEST_BODY_LIMIT:
+            raise _RequestError(400, "Нужно тело запроса в JSON")
+        self._body_read = True
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise _RequestError(400, "Тело запроса — не JSON")
+        if not isinstance(body, dict):
+            raise _RequestError(400, "Тело запроса — объект JSON")
+        return body
+
+    def _send_json(self, status, result):
+        data = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_events(self, control, show_log):
+        """
+        Строка JSON на событие, пока клиент не отключится. Медленный клиент
+        задерживает только свой поток: запись ждёт, пока он прочитает.
+        """
+        stream = control.subscribe(show_log)
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.flush()
+            while True:
+                fields = stream.get(EVENT_KEEPALIVE)
+                if fields is None:
+                    if stream.closed:
+                        return
+                    line = "\n"
+                else:
+                    line = json.dumps(fields, ensure_ascii=False) + "\n"
+                self.wfile.write(line.encode("utf-8"))
+                self.wfile.flush()
+        except OSError:
+            pass                      # клиент отключился
+        finally:
+            control.unsubscribe(stream)
@@ -0,0 +1,244 @@
+"""
+Встроенный движок: пул долгоживущих процессов с импортированным yt_dlp.
+Модуль не зависит от Qt — процессы движка импортируют только его.
+"""
+
+import importlib.util
+import multiprocessing
+import os
+import sys
+import threading
+
+from .util import terminate_process_group
+
+# Встроенный движок (пул процессов с заранее импортированным yt_dlp)
+ENGINE_MAX_JOBS_PER_WORKER = 50   # после стольких задач процесс перезапускается
+
+class EngineError(Exception):
+    """Встроенный движок не может выполнить задачу (нет yt_dlp, процесс упал)."""
+
+
+def engine_available():
+    """Установлен ли yt_dlp как библиотека (нужно для встроенного движка)."""
+    return importlib.util.find_spec("yt_dlp") is not None
+
+
+class _PipeWriter:
+    """Замена sys.stdout/sys.stderr в процессе движка: пересылает целые строки."""
+
+    def __init__(self, conn, kind):
+        self.conn = conn
+        self.kind = kind
+        self.encoding = "utf-8"
+        self._pending = ""
+
+    def write(self, text):
+        self._pending += text
+        if "\n" in self._pending:
+            head, sep, self._pending = self._pending.rpartition("\n")
+            self.conn.send((self.kind, head + sep))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._pending:
+            self.conn.send((self.kind, self._pending))
+            self._pending = ""
+
+    def isatty(self):
+        return False
+
+
+def _engine_worker_main(conn):
+    """
+    Точка входа процесса движка: один раз импортирует yt_dlp и выполняет
+    присылаемые задачи (аргументы командной строки yt-dlp) по очереди.
+    """
+    if hasattr(os, "setsid"):
+        # Своя группа процессов: при отмене снимаются и запущенные yt-dlp
+        # ffmpeg (HLS, слияние), а не только сам процесс движка
+        os.setsid()
+    try:
+        import yt_dlp
+    except ImportError as e:
+        conn.send(("error", str(e)))
+        return
+    conn.send(("ready", yt_dlp.version.__version__))
+
+    while True:
+        try:
+            argv = conn.recv()
+        except EOFError:
+            return
+        if argv is None:
+            return
+
+        out, err = _PipeWriter(conn, "out"), _PipeWriter(conn, "err")
+        sys.stdout, sys.stderr = out, err
+        try:
+            yt_dlp.main(argv)
+            code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                err.write(f"{e.code}\n")
+                code = 1
+        except Exception as e:
+            err.write(f"ERROR: {e}\n")
+            code = 1
+        finally:
+            out.close()
+            err.close()
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        conn.send(("exit", code))
+
+
+class EngineWorker:
+    """Один тёплый процесс движка."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_engine_worker_main,
+                                       args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        try:
+            kind, data = self.conn.recv()
+        except EOFError:
+            kind, data = "error", "процесс движка завершился при запуске"
+        if kind != "ready":
+            self.close()
+            raise EngineError(data)
+        self.version = data
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class EnginePool:
+    """
+    Пул долгоживущих процессов с импортированным yt_dlp. Задача получает
+    свободный процесс, а не запускает yt-dlp заново, поэтому не платит за
+    старт интерпретатора и загрузку экстракторов.
+    """
+
+    def __init__(self, size):
+        self.size = size                  # сколько процессов держать наготове
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def prewarm(self):
+        """Запускает процессы в фоне, не блокируя вызывающего."""
+        for _ in range(self.size):
+            self._spawn_async()
+
+    def _spawn_async(self):
+        threading.Thread(target=self._spawn_idle, daemon=True).start()
+
+    def _spawn_idle(self):
+        try:
+            worker = EngineWorker(self._context)
+        except EngineError:
+            return
+        self._release(worker)
+
+    def acquire(self):
+        with self._lock:
+            if self._closed:
+                raise EngineError("пул остановлен")
+            if self._idle:
+                return self._idle.pop()
+        return EngineWorker(self._context)
+
+    def release(self, worker, broken=False):
+        worker.jobs_done += 1
+        if broken or worker.jobs_done >= ENGINE_MAX_JOBS_PER_WORKER:
+            worker.close()
+            if not self._closed:
+                self._spawn_async()
+            return
+        self._release(worker)
+
+    def _release(self, worker):
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.close()
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+class EngineProcess:
+    """
+    Задача, выполняемая процессом из EnginePool. Повторяет ту часть
+    интерфейса subprocess.Popen, которой пользуется DownloadThread.
+    """
+
+    def __init__(self, pool, args, merge_stderr=True):
+        self._pool = pool
+        self._worker = pool.acquire()
+        self._merge_stderr = merge_stderr
+        self._stderr = []
+        self._killed = False
+        self.returncode = None
+        try:
+            self._worker.conn.send(list(args))
+        except OSError as e:
+            self._pool.release(self._worker, broken=True)
+            raise EngineError(str(e))
+        self.stdout = self._lines()
+
+    def _lines(self):
+        while True:
+            try:
+                kind, data = self._worker.conn.recv()
+            except (EOFError, OSError):
+                self._done(-15 if self._killed else 1, broken=True)
+                return
+            if kind == "exit":
+                self._done(data)
+                return
+            if kind == "err" and not self._merge_stderr:
+                self._stderr.append(data)
+                continue
+            yield from data.splitlines(keepends=True)
+
+    def _done(self, code, broken=False):
+        self.returncode = code
+        self._pool.release(self._worker, broken)
+
+    def communicate(self):
+        out = "".join(self.stdout)
+        return out, "".join(self._stderr)
+
+    def wait(self):
+        for _ in self.stdout:
+            pass
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        # Процесс с полувыполненной задачей не переиспользовать — пул заменит его
+        self._killed = True
+        terminate_process_group(self._worker.process.pid)
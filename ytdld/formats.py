@@ -0,0 +1,253 @@
+"""Подбор форматов по списку из info JSON и кеш этих списков."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Допустимые параметры загрузки (консольный режим, сервер управления)
+FORMAT_CHOICES = ["video+audio", "video", "audio"]
+QUALITY_CHOICES = ["best", "1080p", "720p", "480p", "360p"]
+AUDIO_FORMAT_CHOICES = ["mp3", "aac", "flac", "m4a", "opus", "wav", "vorbis"]
+CONTAINER_CHOICES = ["any", "mp4", "webm", "mkv"]
+
+# Кеш списка форматов (info JSON)
+FORMAT_CACHE_TTL = 20 * 60    # ссылки на потоки в info JSON со временем истекают
+FORMAT_CACHE_SIZE = 64        # записей в памяти
+
+# Предпочтительный аудиоконтейнер для видеоконтейнера
+AUDIO_EXT_FOR_VIDEO = {"mp4": "m4a", "webm": "webm"}
+
+# Кодеки, которые контейнер принимает без перекодирования (названия
+# из info JSON yt-dlp и из ffprobe). mkv принимает всё.
+COPY_VIDEO_CODECS = {
+    "mp4": {"avc1", "h264", "hev1", "hvc1", "hevc", "av01", "av1", "vp9", "vp09"},
+    "webm": {"vp8", "vp9", "vp09", "av01", "av1"},
+}
+COPY_AUDIO_CODECS = {
+    "mp4": {"mp4a", "aac", "opus"},
+    "webm": {"opus", "vorbis"},
+}
+# Формат аудио -> кодеки, которые достаточно переложить в файл нужного типа
+AUDIO_FORMAT_CODECS = {
+    "mp3": {"mp3"},
+    "aac": {"mp4a", "aac"},
+    "m4a": {"mp4a", "aac"},
+    "opus": {"opus"},
+    "vorbis": {"vorbis"},
+    "flac": {"flac"},
+    "wav": set(),
+}
+
+
+def codec_name(codec):
+    """«avc1.640028» -> «avc1»; None для неизвестного кодека."""
+    if not codec or codec == "none":
+        return None
+    return codec.split(".")[0].lower()
+
+
+def copy_compatible(container, vcodec=None, acodec=None):
+    """
+    Можно ли сложить потоки в контейнер копированием. Неизвестный кодек
+    (None) не мешает: решение тогда за проверкой файла после загрузки.
+    """
+    if container not in COPY_VIDEO_CODECS:
+        return True
+    vcodec, acodec = codec_name(vcodec), codec_name(acodec)
+    return ((vcodec is None or vcodec in COPY_VIDEO_CODECS[container])
+            and (acodec is None or acodec in COPY_AUDIO_CODECS[container]))
+
+
+def audio_copy_compatible(audio_format, acodec):
+    """Получится ли аудио нужного формата без перекодирования."""
+    return codec_name(acodec) in AUDIO_FORMAT_CODECS.get(audio_format, ())
+
+
+def _has_video(fmt):
+    # None означает «кодек неизвестен» — такой формат может содержать всё
+    return fmt.get("vcodec") != "none"
+
+
+def _has_audio(fmt):
+    return fmt.get("acodec") != "none"
+
+
+def _format_rate(fmt):
+    return fmt.get("tbr") or fmt.get("vbr") or fmt.get("abr") or 0
+
+
+def _pick_best(formats, max_height=None, prefer=None):
+    """
+    Лучший формат из списка: сначала подходящий по prefer (например,
+    кодек, который ляжет в контейнер без перекодирования), затем высота
+    (не больше max_height, если такие есть), затем fps и битрейт.
+    """
+    if not formats:
+        return None
+    if max_height is not None:
+        fitting = [f for f in formats if (f.get("height") or 0) <= max_height]
+        if fitting:
+            formats = fitting
+        else:
+            # Всё выше лимита — берём ближайшее к нему качество
+            lowest = min(f.get("height") or 0 for f in formats)
+            formats = [f for f in formats if (f.get("height") or 0) == lowest]
+    return max(formats, key=lambda f: (prefer is not None and prefer(f),
+                                       f.get("height") or 0,
+                                       f.get("fps") or 0,
+                                       _format_rate(f)))
+
+
+def _video_fits(container):
+    """Предпочтение для видео: кодек копируется в контейнер (или совпадает ext)."""
+    if container is None:
+        return None
+
+    def prefer(fmt):
+        if codec_name(fmt.get("vcodec")) is None:
+            return fmt.get("ext") == container
+        return copy_compatible(container, vcodec=fmt.get("vcodec"))
+    return prefer
+
+
+def _audio_fits(container):
+    def prefer(fmt):
+        if codec_name(fmt.get("acodec")) is None:
+            return fmt.get("ext") == AUDIO_EXT_FOR_VIDEO.get(container)
+        return copy_compatible(container, acodec=fmt.get("acodec"))
+    return prefer
+
+
+def _audio_format_fits(audio_format):
+    return lambda fmt: audio_copy_compatible(audio_format, fmt.get("acodec"))
+
+
+def resolve_format(info, format_choice, quality, video_format, audio_format=None):
+    """
+    Подбирает конкретные ID форматов по списку из info JSON.
+    Возвращает строку для -f (например "137+140") или None,
+    если подобрать ничего не удалось.
+
+    Из равноценных вариантов выбираются потоки, которые дадут нужный
+    контейнер или формат аудио простым копированием, без перекодирования.
+    """
+    formats = [f for f in info.get("formats") or () if f.get("format_id")]
+    if not formats:
+        return None
+
+    video_only = [f for f in formats if _has_video(f) and not _has_audio(f)]
+    audio_only = [f for f in formats if _has_audio(f) and not _has_video(f)]
+    combined = [f for f in formats if _has_video(f) and _has_audio(f)]
+
+    if format_choice == "audio":
+        prefer = _audio_format_fits(audio_format) if audio_format else None
+        best = (_pick_best(audio_only, prefer=prefer) if audio_only
+                else _pick_best(combined, prefer=prefer))
+        return best["format_id"] if best else None
+
+    max_height = None if quality == "best" else int(quality.replace("p", ""))
+    container = None if video_format in ("any", "mkv") else video_format
+
+    if format_choice == "video":
+        best = _pick_best(video_only or combined, max_height, _video_fits(container))
+        return best["format_id"] if best else None
+
+    # video+audio: раздельные потоки, иначе готовый комбинированный формат
+    if video_only and audio_only:
+        video = _pick_best(video_only, max_height, _video_fits(container))
+        # Без выбранного контейнера — звук под контейнер видео, чтобы
+        # слияние обошлось копированием в mp4/webm, а не в mkv
+        audio = _pick_best(audio_only, prefer=_audio_fits(container or video.get("ext")))
+        return f"{video['format_id']}+{audio['format_id']}"
+    best = _pick_best(combined or video_only, max_height, _video_fits(container))
+    return best["format_id"] if best else None
+
+
+class FormatCache:
+    """
+    Кеш info JSON по URL: в памяти (LRU) и на диске, с ограниченным
+    временем жизни. Файл на диске передаётся в yt-dlp через --load-info-json,
+    чтобы не извлекать метаданные повторно. Потокобезопасен.
+    """
+
+    def __init__(self, cache_dir, ttl=FORMAT_CACHE_TTL, max_entries=FORMAT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # url -> (время, info, путь)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + ".info.json")
+
+    def get(self, url):
+        """Возвращает (info, путь к JSON) или None, если записи нет или она устарела."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                stamp, info, path = entry
+                if now - stamp < self.ttl and os.path.exists(path):
+                    self._entries.move_to_end(url)
+                    return info, path
+                del self._entries[url]
+
+        # После перезапуска — читаем с диска
+        path = self._path(url)
+        try:
+            stamp = os.path.getmtime(path)
+            if now - stamp >= self.ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(url, stamp, info, path)
+        return info, path
+
+    def put(self, url, raw_json):
+        """Сохраняет вывод `yt-dlp -J` и возвращает (info, путь)."""
+        info = json.loads(raw_json)
+        path = self._path(url)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(raw_json)
+        os.replace(tmp_path, path)
+        self._remember(url, time.time(), info, path)
+        self._prune()
+        return info, path
+
+    def invalidate(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+        try:
+            os.remove(self._path(url))
+        except OSError:
+            pass
+
+    def _remember(self, url, stamp, info, path):
+        with self._lock:
+            self._entries[url] = (stamp, info, path)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _prune(self):
+        """Удаляет устаревшие файлы кеша."""
+        now = time.time()
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) >= self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,90 @@
+"""Число одновременно скачиваемых фрагментов (yt-dlp -N) для DASH/HLS."""
+
+import threading
+import urllib.parse
+
+FRAGMENTS_JOB_MAX = 16        # больше одной задаче не даём даже вручную
+FRAGMENTS_GLOBAL_MAX = 32     # сумма по всем активным задачам
+FRAGMENTS_AUTO_START = 2      # с чего начинает «Авто» для нового сайта
+FRAGMENTS_AUTO_MAX = 8        # выше «Авто» не поднимается
+FRAGMENTS_GAIN = 0.1          # прирост скорости, ради которого стоит идти выше
+FRAGMENTS_SMOOTHING = 0.5     # вес нового замера в средней скорости уровня
+
+
+class FragmentTuner:
+    """
+    Подбирает -N для задач. Вручную заданное число только ограничивается
+    общим лимитом; в режиме «Авто» число выбирается отдельно для каждого
+    сайта по скорости прошлых фрагментированных загрузок.
+
+    yt-dlp не умеет менять -N на ходу, поэтому подстройка идёт между
+    задачами: после каждой задачи средняя скорость записывается за её
+    уровнем (1, 2, 4, 8), и следующий уровень выбирается восхождением:
+    вверх, пока удвоение даёт прирост больше FRAGMENTS_GAIN, иначе вниз.
+    """
+
+    def __init__(self, global_max=FRAGMENTS_GLOBAL_MAX):
+        self.global_max = global_max
+        self._lock = threading.Lock()
+        self._levels = {}             # сайт -> текущий уровень «Авто»
+        self._speeds = {}             # (сайт, уровень) -> средняя скорость, байт/с
+        self._active = {}             # job_id -> (выдано, запрошено)
+
+    @staticmethod
+    def host(url):
+        return (urllib.parse.urlsplit(url).hostname or "").lower()
+
+    def level(self, url):
+        """Текущий уровень «Авто» для сайта ссылки."""
+        with self._lock:
+            return self._levels.get(self.host(url), FRAGMENTS_AUTO_START)
+
+    def available(self):
+        """Сколько фрагментов ещё не выдано: при нуле новые задачи ждут."""
+        with self._lock:
+            return self.global_max - sum(g for g, _ in self._active.values())
+
+    def acquire(self, job_id, url, requested=0, cap=None):
+        """
+        Выдаёт задаче число фрагментов: requested (0 — «Авто»), но не
+        больше cap (урезание на время повторов) и того, что осталось от
+        общего лимита. Очередь запускает задачу, только пока available()
+        больше нуля, поэтому сумма по активным задачам лимит не превышает.
+        """
+        with self._lock:
+            wanted = requested or self._levels.get(self.host(url), FRAGMENTS_AUTO_START)
+            free = self.global_max - sum(g for g, _ in self._active.values())
+            granted = max(1, min(wanted, cap or FRAGMENTS_JOB_MAX, FRAGMENTS_JOB_MAX, free))
+            self._active[job_id] = (granted, wanted)
+            return granted
+
+    def release(self, job_id, url, throughput=None, auto=True):
+        """
+        Освобождает фрагменты задачи. throughput — средняя скорость
+        фрагментированной загрузки (None, если загрузка была цельной или
+        не состоялась); учитывается только в режиме «Авто».
+        """
+        with self._lock:
+            granted, wanted = self._active.pop(job_id, (None, None))
+            # Урезанная общим лимитом задача не говорит ничего о своём уровне
+            if not auto or granted is None or granted != wanted or not throughput:
+                return
+            host = self.host(url)
+            key = (host, granted)
+            old = self._speeds.get(key)
+            self._speeds[key] = throughput if old is None else (
+                old + FRAGMENTS_SMOOTHING * (throughput - old))
+            self._levels[host] = self._next_level(host, granted)
+
+    def _next_level(self, host, level):
+        speed = self._speeds[(host, level)]
+        lower = self._speeds.get((host, level // 2)) if level > 1 else None
+        if lower is not None and speed < lower * (1 + FRAGMENTS_GAIN):
+            # Удвоение до этого уровня ничего не дало — возвращаемся
+            return level // 2
+        higher = self._speeds.get((host, level * 2))
+        if level * 2 > FRAGMENTS_AUTO_MAX:
+            return level
+        if higher is not None and higher < speed * (1 + FRAGMENTS_GAIN):
+            return level
+        return level * 2
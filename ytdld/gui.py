@@ -0,0 +1,957 @@
+"""
+GUI для yt-dlp в стиле macOS Dark Mode
+Добавлен реальный прогресс-бар (парсинг процентов из вывода yt-dlp)
+"""
+
+import os
+import sys
+from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
+                              QHBoxLayout, QLabel, QLineEdit, QPushButton,
+                              QComboBox, QPlainTextEdit, QProgressBar, QFileDialog,
+                              QMessageBox, QFrame, QTableWidget, QTableWidgetItem,
+                              QHeaderView, QAbstractItemView, QCheckBox)
+from PySide6.QtCore import Qt, Signal, QObject, QTimer
+from PySide6.QtGui import QFont
+
+from .bandwidth import RateSchedule, parse_rate
+from .control import ControlServer, default_control_address
+from .engine import engine_available
+from .metrics import set_metrics_file
+from .postprocess import POST_COPY, required_encoders
+from .preview import MediaPreview, PreviewFetcher
+from .scheduler import (DownloadQueue, JOB_DONE, JOB_PENDING, JOB_RUNNING,
+                        JOB_POST_PENDING, JOB_POSTPROCESSING, JOB_COALESCED,
+                        JOB_FAILED, JOB_SKIPPED, JOB_STATUS_TEXT)
+from .tools import ToolRegistry
+from .util import app_data_dir, format_eta, format_size, set_log_file
+
+LOG_VIEW_MAX_LINES = 2000     # строк в окне лога
+PREVIEW_DEBOUNCE_MS = 700     # предпросмотр — когда ссылку перестали менять
+
+# Цвета в стиле macOS Dark
+BG_COLOR = "#1e1e1e"
+SURFACE_COLOR = "#2d2d2d"
+ACCENT_COLOR = "#0a84ff"
+ACCENT_PRESSED = "#0066cc"
+TEXT_COLOR = "#ffffff"
+TEXT_SECONDARY = "#8e8e93"
+BORDER_COLOR = "#3d3d3d"
+SUCCESS_COLOR = "#30d158"
+ERROR_COLOR = "#ff453a"
+
+class QueueBridge(QObject):
+    """
+    Переводит события очереди загрузок в сигналы Qt. Очередь вызывает
+    подписчиков из своего служебного потока, а сигналы доставляются
+    в поток интерфейса.
+    """
+    job_added = Signal(int)
+    job_changed = Signal(int)          # статус или прогресс
+    job_log = Signal(int, list)        # пачка строк лога
+    job_finished = Signal(int, bool, str)
+    queue_reordered = Signal()         # порядок ожидающих задач изменился
+    queue_idle = Signal()              # все задачи завершены
+
+    def __init__(self, queue, parent=None):
+        super().__init__(parent)
+        queue.add_listener(self._on_event)
+
+    def _on_event(self, event, *args):
+        getattr(self, event).emit(*args)
+
+
+class YTDLP_GUI(QMainWindow):
+    preview_ready = Signal(str, object, object)   # ссылка, info JSON, ошибка
+    tools_ready = Signal(object)                  # реестр программ проверен
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("YouTube Downloader")
+        self.setGeometry(100, 100, 850, 780)
+
+        if sys.platform.startswith('win'):
+            self.exe_ext = '.exe'
+        else:
+            self.exe_ext = ''
+
+        # Программы ищутся сразу (это только stat), а запускаются для проверки
+        # версий в фоне, чтобы не задерживать появление окна
+        self.tools = ToolRegistry(os.path.join(app_data_dir(), "tools.json"),
+                                  on_ready=self.tools_ready.emit,
+                                  encoders=required_encoders())
+        self.tools_ready.connect(self.on_tools_ready)
+        self.tool_paths = (self.tools.path("yt-dlp"), self.tools.path("ffmpeg"))
+        self.yt_dlp_path, self.ffmpeg_path = self.tool_paths
+
+        self.download_folder = os.path.expanduser("~/Downloads")
+        self.log_job_id = None  # задача, чей лог показан (None — все)
+        self.log_file_path = os.path.join(app_data_dir(), "logs", "yt-dld.log")
+        # Замеры по задачам (время фаз, скорость) — для планирования мощностей
+        set_metrics_file(os.path.join(app_data_dir(), "logs", "metrics.jsonl"))
+
+        self.queue = DownloadQueue(self.yt_dlp_path, self.ffmpeg_path)
+        self.bridge = QueueBridge(self.queue, parent=self)
+        self.bridge.job_added.connect(self.on_job_added)
+        self.bridge.job_changed.connect(self.on_job_changed)
+        self.bridge.job_log.connect(self.on_job_log)
+        self.bridge.job_finished.connect(self.on_job_finished)
+        self.bridge.queue_reordered.connect(self._sort_queue_table)
+        self.bridge.queue_idle.connect(self.download_finished)
+
+        # Предпросмотр ссылки: сигнал доставляет ответ фонового потока в интерфейс
+        self.preview = PreviewFetcher(self.yt_dlp_path, self.queue.format_cache,
+                                      self.preview_ready.emit)
+        self.preview_ready.connect(self.on_preview_ready)
+        self.preview_url = None
+        self.preview_info = None
+
+        # Сервер управления ставит задачи в эту же очередь — лимиты общие
+        self.control = ControlServer(self.queue, default_control_address(),
+                                     output_dir=self.download_folder)
+
+        self.init_ui()
+        self.apply_dark_style()
+        self.check_executables()
+        self.tools.start()
+        self.restore_jobs()
+
+    def restore_jobs(self):
+        """Возвращает в очередь задачи, прерванные закрытием программы или сбоем."""
+        restored = self.queue.restore(os.path.join(app_data_dir(), "jobs.json"))
+        if restored:
+            self.progress_bar.setVisible(True)
+            self.progress_bar.setRange(0, 100)
+            self.status_label.setStyleSheet(f"color: {ACCENT_COLOR}; font-size: 12px;")
+            self.log(f"Продолжаем прерванные загрузки: {restored}")
+
+    def closeEvent(self, event):
+        """При закрытии окна, если идёт загрузка, спрашиваем подтверждение."""
+        if self.queue.has_active():
+            reply = QMessageBox.question(self, 'Подтверждение',
+                                         'Загрузка ещё выполняется. Закрыть окно?\n'
+                                         'Незавершённые загрузки продолжатся '
+                                         'при следующем запуске.',
+                                         QMessageBox.Yes | QMessageBox.No,
+                                         QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                self.bridge.queue_idle.disconnect(self.download_finished)
+                self.control.stop()
+                self.queue.stop_all()
+                event.accept()
+            else:
+                event.ignore()
+        else:
+            self.control.stop()
+            event.accept()
+
+    def apply_dark_style(self):
+        self.setStyleSheet(f"""
+            QMainWindow {{ background-color: {BG_COLOR}; }}
+            QLabel {{ color: {TEXT_COLOR}; background: transparent; }}
+            QLineEdit {{
+                background-color: {SURFACE_COLOR};
+                color: {TEXT_COLOR};
+                border: 1px solid {BORDER_COLOR};
+                border-radius: 8px;
+                padding: 10px 12px;
+                font-size: 13px;
+            }}
+            QLineEdit:focus {{ border: 1px solid {ACCENT_COLOR}; }}
+            QComboBox {{
+                background-color: {SURFACE_COLOR};
+                color: {TEXT_COLOR};
+                border: 1px solid {BORDER_COLOR};
+                border-radius: 8px;
+                padding: 8px 12px;
+                font-size: 13px;
+                min-width: 100px;
+            }}
+            QComboBox::drop-down {{ border: none; width: 25px; }}
+            QComboBox::down-arrow {{
+                image: none;
+                border-left: 5px solid transparent;
+                border-right: 5px solid transparent;
+                border-top: 5px solid {TEXT_SECONDARY};
+                margin-right: 8px;
+            }}
+            QPushButton {{
+                background-color: {ACCENT_COLOR};
+                color: {TEXT_COLOR};
+                border: none;
+                border-radius: 8px;
+                padding: 10px 20px;
+                font-size: 13px;
+                font-weight: 600;
+            }}
+            QPushButton:hover {{ background-color: {ACCENT_PRESSED}; }}
+            QPushButton:pressed {{ background-color: {ACCENT_PRESSED}; }}
+            QPushButton:disabled {{ background-color: {BORDER_COLOR}; color: {TEXT_SECONDARY}; }}
+            QPlainTextEdit {{
+                background-color: {SURFACE_COLOR};
+                color: {TEXT_COLOR};
+                border: 1px solid {BORDER_COLOR};
+                border-radius: 8px;
+                font-family: 'Consolas', 'Monaco', monospace;
+                font-size: 11px;
+            }}
+            QCheckBox {{ color: {TEXT_SECONDARY}; font-size: 11px; background: transparent; }}
+            QProgressBar {{
+                background-color: {SURFACE_COLOR};
+                border: none;
+                border-radius: 4px;
+                height: 6px;
+                text-align: center;
+            }}
+            QProgressBar::chunk {{ background-color: {ACCENT_COLOR}; border-radius: 4px; }}
+            QFrame {{
+                background-color: {SURFACE_COLOR};
+                border-radius: 12px;
+            }}
+            QMessageBox {{ background-color: {BG_COLOR}; }}
+            QMessageBox QLabel {{ color: {TEXT_COLOR}; font-size: 13px; }}
+            QDialogButtonBox QPushButton {{
+                background-color: {ACCENT_COLOR};
+                color: {TEXT_COLOR};
+                border: none;
+                border-radius: 8px;
+                padding: 8px 20px;
+            }}
+            QDialogButtonBox QPushButton:hover {{ background-color: {ACCENT_PRESSED}; }}
+        """)
+
+    def check_executables(self):
+        """Ищет программы заново; True, если всё нужное на месте."""
+        missing = []
+        for name in self.tools.discover():
+            if name == "yt-dlp":
+                missing.append(f"yt-dlp{self.exe_ext}")
+            else:
+                missing.append(f"ffmpeg{self.exe_ext} (в папке ffmpeg_tools)")
+        if self._apply_tool_paths():
+            self.tools.start()
+
+        if missing:
+            msg = ("Не найдены необходимые компоненты:\n" + "\n".join(missing) +
+                   "\n\nПоместите их в папку программы или установите в систему.")
+            QMessageBox.warning(self, "Отсутствуют файлы", msg)
+        return not missing
+
+    def _apply_tool_paths(self):
+        """Передаёт очереди и предпросмотру пути, если реестр нашёл другие; True — передал."""
+        paths = (self.tools.path("yt-dlp"), self.tools.path("ffmpeg"))
+        if paths == self.tool_paths:
+            return False
+        self.tool_paths = paths
+        yt_dlp_path, ffmpeg_path = paths
+        self.yt_dlp_path, self.ffmpeg_path = yt_dlp_path, ffmpeg_path
+        self.queue.yt_dlp_path = self.preview.yt_dlp_path = yt_dlp_path
+        self.queue.ffmpeg_path = ffmpeg_path
+        return True
+
+    def on_tools_ready(self, tools):
+        """Итог фоновой проверки программ: версии в лог, неисправные — сразу видно."""
+        self._apply_tool_paths()      # вместо неисправной копии могла найтись другая
+        if tools.versions():
+            self.log(f"Программы: {tools.versions()}")
+        for note in tools.warnings():
+            self.log(f"Внимание: {note}")
+        broken = tools.broken()
+        if broken:
+            QMessageBox.warning(self, "Программы не запускаются",
+                                "\n".join(f"{name}: {error}" for name, error in broken) +
+                                "\n\nЗагрузки с ними завершатся ошибкой.")
+
+    def init_ui(self):
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+        layout.setContentsMargins(24, 24, 24, 24)
+        layout.setSpacing(16)
+
+        title = QLabel("YouTube Downloader")
+        title.setFont(QFont("-apple-system, BlinkMacSystemFont, 'SF Pro Display'", 26, QFont.Bold))
+        title.setAlignment(Qt.AlignCenter)
+        layout.addWidget(title)
+
+        # URL
+        url_frame = QFrame()
+        url_layout = QVBoxLayout(url_frame)
+        url_layout.setContentsMargins(16, 14, 16, 14)
+
+        url_label = QLabel("Ссылки на видео (через пробел)")
+        url_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        url_layout.addWidget(url_label)
+
+        self.url_input = QLineEdit()
+        self.url_input.setPlaceholderText("https://youtube.com/watch?v=...")
+        url_layout.addWidget(self.url_input)
+
+        self.preview_label = QLabel("")
+        self.preview_label.setWordWrap(True)
+        self.preview_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        self.preview_label.setVisible(False)
+        url_layout.addWidget(self.preview_label)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.request_preview)
+        self.url_input.textChanged.connect(lambda _: self.preview_timer.start())
+
+        self.playlist_check = QCheckBox("Плейлисты и каналы: загружать элементы параллельно")
+        self.playlist_check.setChecked(True)
+        self.playlist_check.toggled.connect(self.toggle_playlist_mode)
+        url_layout.addWidget(self.playlist_check)
+
+        self.archive_check = QCheckBox("Пропускать уже загруженное (в том же формате)")
+        self.archive_check.setChecked(True)
+        self.archive_check.toggled.connect(self.toggle_skip_archived)
+        url_layout.addWidget(self.archive_check)
+
+        self.staging_check = QCheckBox(
+            "Части и слияние — на локальном диске (для сетевых папок)")
+        self.staging_check.setToolTip(os.path.join(app_data_dir(), "staging"))
+        self.staging_check.toggled.connect(self.toggle_staging)
+        url_layout.addWidget(self.staging_check)
+
+        self.control_check = QCheckBox("Принимать загрузки от других программ (локальный API)")
+        self.control_check.setToolTip(self.control.address)
+        self.control_check.toggled.connect(self.toggle_control)
+        url_layout.addWidget(self.control_check)
+
+        layout.addWidget(url_frame)
+
+        # Строка настроек
+        settings_frame = QFrame()
+        settings_layout = QHBoxLayout(settings_frame)
+        settings_layout.setContentsMargins(16, 14, 16, 14)
+
+        # Формат
+        format_layout = QVBoxLayout()
+        format_label = QLabel("Формат")
+        format_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        format_layout.addWidget(format_label)
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["Видео + Аудио", "Только Видео", "Аудио"])
+        self.format_combo.setFixedHeight(40)
+        format_layout.addWidget(self.format_combo)
+
+        # Качество
+        quality_layout = QVBoxLayout()
+        quality_label = QLabel("Качество")
+        quality_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        quality_layout.addWidget(quality_label)
+        self.quality_combo = QComboBox()
+        self.quality_combo.setFixedHeight(40)
+        self.quality_combo.addItems(["Лучшее", "1080p", "720p", "480p", "360p"])
+        quality_layout.addWidget(self.quality_combo)
+
+        # Аудио формат
+        audio_format_layout = QVBoxLayout()
+        audio_format_label = QLabel("Аудио формат")
+        audio_format_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        audio_format_layout.addWidget(audio_format_label)
+        self.audio_format_combo = QComboBox()
+        self.audio_format_combo.setFixedHeight(40)
+        self.audio_format_combo.addItems(["mp3", "aac", "flac", "m4a", "opus", "wav", "vorbis"])
+        audio_format_layout.addWidget(self.audio_format_combo)
+
+        # Видео контейнер
+        video_format_layout = QVBoxLayout()
+        video_format_label = QLabel("Видео контейнер")
+        video_format_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        video_format_layout.addWidget(video_format_label)
+        self.video_format_combo = QComboBox()
+        self.video_format_combo.setFixedHeight(40)
+        self.video_format_combo.addItems(["Любой", "mp4", "webm", "mkv"])
+        video_format_layout.addWidget(self.video_format_combo)
+        for combo in (self.format_combo, self.quality_combo, self.audio_format_combo,
+                      self.video_format_combo):
+            combo.currentIndexChanged.connect(self.show_preview)
+
+        # Одновременные загрузки
+        workers_layout = QVBoxLayout()
+        workers_label = QLabel("Потоки")
+        workers_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        workers_layout.addWidget(workers_label)
+        self.workers_combo = QComboBox()
+        self.workers_combo.setFixedHeight(40)
+        self.workers_combo.addItems(["Авто", "1", "2", "3", "4", "6", "8"])
+        self.workers_combo.currentIndexChanged.connect(self.change_workers)
+        workers_layout.addWidget(self.workers_combo)
+
+        # Фрагменты DASH/HLS
+        fragments_layout = QVBoxLayout()
+        fragments_label = QLabel("Фрагменты")
+        fragments_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        fragments_layout.addWidget(fragments_label)
+        self.fragments_combo = QComboBox()
+        self.fragments_combo.setFixedHeight(40)
+        self.fragments_combo.addItems(["Авто", "1", "2", "4", "8", "16"])
+        self.fragments_combo.setToolTip("Сколько фрагментов DASH/HLS качать одновременно. "
+                                        "Авто — подбирается по скорости прошлых загрузок")
+        fragments_layout.addWidget(self.fragments_combo)
+
+        # Движок
+        engine_layout = QVBoxLayout()
+        engine_label = QLabel("Движок")
+        engine_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        engine_layout.addWidget(engine_label)
+        self.engine_combo = QComboBox()
+        self.engine_combo.setFixedHeight(40)
+        self.engine_combo.addItems(["Процесс", "Встроенный"])
+        if engine_available():
+            self.engine_combo.setToolTip("Встроенный: задачи выполняются заранее "
+                                         "запущенными процессами с yt_dlp")
+        else:
+            self.engine_combo.setEnabled(False)
+            self.engine_combo.setToolTip("Для встроенного движка нужен модуль yt_dlp")
+        self.engine_combo.currentIndexChanged.connect(self.change_engine)
+        engine_layout.addWidget(self.engine_combo)
+
+        settings_layout.addLayout(format_layout, stretch=1)
+        settings_layout.addLayout(quality_layout, stretch=1)
+        settings_layout.addLayout(audio_format_layout, stretch=1)
+        settings_layout.addLayout(video_format_layout, stretch=1)
+        settings_layout.addLayout(workers_layout, stretch=1)
+        settings_layout.addLayout(fragments_layout, stretch=1)
+        settings_layout.addLayout(engine_layout, stretch=1)
+
+        layout.addWidget(settings_frame)
+
+        # Папка
+        folder_frame = QFrame()
+        folder_layout = QVBoxLayout(folder_frame)
+        folder_layout.setContentsMargins(16, 14, 16, 14)
+
+        folder_label = QLabel("Папка сохранения")
+        folder_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        folder_layout.addWidget(folder_label)
+
+        folder_input_layout = QHBoxLayout()
+        self.folder_input = QLineEdit()
+        self.folder_input.setText(self.download_folder)
+        self.folder_input.textChanged.connect(self.change_folder)
+        folder_input_layout.addWidget(self.folder_input)
+
+        browse_btn = QPushButton("📂")
+        browse_btn.setFixedSize(55, 40)
+        browse_btn.setStyleSheet(f"QPushButton {{ background-color: {ACCENT_COLOR}; font-size: 16px; }} QPushButton:hover {{ background-color: {ACCENT_PRESSED}; }}")
+        browse_btn.clicked.connect(self.browse_folder)
+        folder_input_layout.addWidget(browse_btn)
+
+        folder_layout.addLayout(folder_input_layout)
+
+        # Ограничение скорости: общее и по расписанию
+        speed_layout = QHBoxLayout()
+        rate_layout = QVBoxLayout()
+        rate_label = QLabel("Ограничение скорости (на все загрузки)")
+        rate_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        rate_layout.addWidget(rate_label)
+        self.rate_input = QLineEdit()
+        self.rate_input.setPlaceholderText("без ограничения, например 5M")
+        self.rate_input.editingFinished.connect(self.change_bandwidth)
+        rate_layout.addWidget(self.rate_input)
+        schedule_layout = QVBoxLayout()
+        schedule_label = QLabel("Расписание")
+        schedule_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        schedule_layout.addWidget(schedule_label)
+        self.schedule_input = QLineEdit()
+        self.schedule_input.setPlaceholderText("1-5 09:00-18:00=2M; 00:00-07:00=0")
+        self.schedule_input.setToolTip("Правила через «;»: [дни] ЧЧ:ММ-ЧЧ:ММ=скорость.\n"
+                                       "Дни: 1 — понедельник, 1-5 — будни; 0 — без ограничения.\n"
+                                       "Вне правил действует общее ограничение.")
+        self.schedule_input.editingFinished.connect(self.change_bandwidth)
+        schedule_layout.addWidget(self.schedule_input)
+        speed_layout.addLayout(rate_layout, stretch=1)
+        speed_layout.addLayout(schedule_layout, stretch=2)
+        folder_layout.addLayout(speed_layout)
+        layout.addWidget(folder_frame)
+
+        # Кнопка
+        self.download_btn = QPushButton("⬇ Скачать видео")
+        self.download_btn.setFixedHeight(48)
+        self.download_btn.setStyleSheet("font-size: 15px; font-weight: bold;")
+        self.download_btn.clicked.connect(self.start_download)
+        layout.addWidget(self.download_btn)
+
+        # Прогресс
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFixedHeight(6)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        # Статус
+        self.status_label = QLabel("")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.status_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 12px;")
+        layout.addWidget(self.status_label)
+
+        # Очередь
+        queue_frame = QFrame()
+        queue_layout = QVBoxLayout(queue_frame)
+        queue_layout.setContentsMargins(14, 14, 14, 14)
+
+        queue_header_layout = QHBoxLayout()
+        queue_label = QLabel("Очередь загрузок")
+        queue_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        queue_header_layout.addWidget(queue_label)
+        queue_header_layout.addStretch()
+        for text, handler in (("▲", self.move_job_up), ("▼", self.move_job_down),
+                              ("✕", self.cancel_job)):
+            btn = QPushButton(text)
+            btn.setFixedSize(36, 28)
+            btn.setStyleSheet("padding: 0px;")
+            btn.clicked.connect(handler)
+            queue_header_layout.addWidget(btn)
+        queue_layout.addLayout(queue_header_layout)
+
+        self.queue_table = QTableWidget(0, 4)
+        self.queue_table.setHorizontalHeaderLabels(["Ссылка", "Статус", "Скорость / ETA", "Прогресс"])
+        self.queue_table.verticalHeader().setVisible(False)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.queue_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        header = self.queue_table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(3, QHeaderView.Fixed)
+        header.resizeSection(3, 120)
+        self.queue_table.setFixedHeight(150)
+        self.queue_table.itemSelectionChanged.connect(self.on_job_selected)
+        queue_layout.addWidget(self.queue_table)
+
+        layout.addWidget(queue_frame)
+
+        # Лог
+        log_frame = QFrame()
+        log_layout = QVBoxLayout(log_frame)
+        log_layout.setContentsMargins(14, 14, 14, 14)
+
+        log_header_layout = QHBoxLayout()
+        log_label = QLabel("Лог загрузки")
+        log_label.setStyleSheet(f"color: {TEXT_SECONDARY}; font-size: 11px;")
+        log_header_layout.addWidget(log_label)
+        log_header_layout.addStretch()
+        self.log_file_check = QCheckBox("Сохранять полный лог в файл")
+        self.log_file_check.setToolTip(self.log_file_path)
+        self.log_file_check.toggled.connect(self.toggle_log_file)
+        log_header_layout.addWidget(self.log_file_check)
+        log_layout.addLayout(log_header_layout)
+
+        self.log_text = QPlainTextEdit()
+        self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
+        self.log_text.setFixedHeight(140)
+        log_layout.addWidget(self.log_text)
+
+        layout.addWidget(log_frame)
+        layout.addStretch()
+
+    def browse_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку", self.download_folder)
+        if folder:
+            self.folder_input.setText(folder)
+
+    def change_folder(self, text):
+        """Задачи от других программ без "output" идут в выбранную здесь папку."""
+        folder = text.strip()
+        self.control.output_dir = (os.path.abspath(os.path.expanduser(folder)) if folder
+                                   else self.download_folder)
+
+    def log(self, message):
+        self.log_text.appendPlainText(message)
+
+    def toggle_log_file(self, enabled):
+        set_log_file(self.log_file_path if enabled else None)
+
+    def change_workers(self, index):
+        workers_map = {0: 0, 1: 1, 2: 2, 3: 3, 4: 4, 5: 6, 6: 8}
+        self.queue.set_max_workers(workers_map[index])
+
+    def toggle_playlist_mode(self, enabled):
+        self.queue.playlist_mode = enabled
+
+    def toggle_skip_archived(self, enabled):
+        self.queue.skip_archived = enabled
+
+    def toggle_staging(self, enabled):
+        """Новые загрузки пишутся в локальный каталог и переносятся в папку в конце."""
+        self.queue.staging_root = os.path.join(app_data_dir(), "staging") if enabled else None
+
+    def toggle_control(self, enabled):
+        if not enabled:
+            self.control.stop()
+            return
+        try:
+            self.control.start()
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Ошибка", f"Сервер управления не запущен: {e}")
+            self.control_check.setChecked(False)
+            return
+        self.log(f"Сервер управления: {self.control.address}")
+        if self.control.token is not None:
+            self.log(f"Ключ доступа к нему: {self.control.token_path}")
+
+    def change_bandwidth(self):
+        try:
+            limit = parse_rate(self.rate_input.text())
+            schedule = RateSchedule(self.schedule_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Ошибка", str(e))
+            return
+        self.queue.set_bandwidth(limit, schedule)
+
+    def change_engine(self, index):
+        self.queue.set_engine(index == 1)
+
+    def _download_options(self):
+        """(формат, качество, аудио формат, контейнер) по выбору в интерфейсе."""
+        format_map = {0: "video+audio", 1: "video", 2: "audio"}
+        format_choice = format_map[self.format_combo.currentIndex()]
+
+        quality_map = {0: "best", 1: "1080p", 2: "720p", 3: "480p", 4: "360p"}
+        quality = quality_map[self.quality_combo.currentIndex()]
+
+        audio_formats = ["mp3", "aac", "flac", "m4a", "opus", "wav", "vorbis"]
+        audio_format = audio_formats[self.audio_format_combo.currentIndex()]
+
+        video_format_map = {0: "any", 1: "mp4", 2: "webm", 3: "mkv"}
+        video_format = video_format_map[self.video_format_combo.currentIndex()]
+        return format_choice, quality, audio_format, video_format
+
+    def request_preview(self):
+        """Запрашивает сведения о последней введённой ссылке (в фоне)."""
+        urls = self.url_input.text().split()
+        url = urls[-1] if urls else None
+        if not url or not url.startswith("http") or "yt-dlp" in self.tools.missing():
+            self.preview.cancel()
+            self.preview_url = self.preview_info = None
+            self.preview_label.setVisible(False)
+            return
+        if url == self.preview_url:
+            return
+        self.preview_url = url
+        self.preview_info = None
+        self.preview_label.setText("Получение сведений о ссылке...")
+        self.preview_label.setToolTip("")
+        self.preview_label.setVisible(True)
+        self.preview.request(url)
+
+    def on_preview_ready(self, url, info, error):
+        if url != self.preview_url:
+            return
+        if error:
+            self.preview_label.setText(f"Не удалось получить сведения: {error}")
+            return
+        self.preview_info = info
+        self.show_preview()
+
+    def show_preview(self):
+        """Сводка по ссылке для текущего выбора формата и контейнера."""
+        if not self.preview_info:
+            return
+        format_choice, quality, audio_format, video_format = self._download_options()
+        if format_choice == "audio":
+            quality = "best"          # для аудио качество видео не влияет
+        preview = MediaPreview.from_info(self.preview_info, format_choice,
+                                         audio_format, video_format)
+        if preview.is_playlist:
+            count = f" — элементов: {preview.entries}" if preview.entries else ""
+            self.preview_label.setText(f"📃 {preview.title or 'Плейлист'}{count}")
+            self.preview_label.setToolTip("")
+            return
+
+        parts = [f"🎬 {preview.title or self.preview_url}"]
+        if preview.duration:
+            parts.append(format_eta(preview.duration))
+        if preview.heights and format_choice != "audio":
+            parts.append(f"до {preview.heights[0]}p")
+        text = " · ".join(parts)
+
+        # Размер для выбранного качества и для остальных — «влезет ли 1080p»
+        quality_names = {"best": "лучшее"}
+        sizes = []
+        for name, (spec, size) in preview.sizes.items():
+            label = quality_names.get(name, name)
+            value = f"≈ {format_size(size)}" if size else "размер неизвестен"
+            sizes.append(f"[{label}: {value}]" if name == quality else f"{label}: {value}")
+        if any(size for _, size in preview.sizes.values()):
+            text += "\nРазмер: " + ", ".join(sizes)
+        self.preview_label.setText(text)
+        self.preview_label.setToolTip("\n".join(
+            f"{name}: формат {spec}" for name, (spec, _) in preview.sizes.items()))
+
+    def start_download(self):
+        urls = self.url_input.text().split()
+
+        if not urls:
+            QMessageBox.warning(self, "Ошибка", "Введите URL видео!")
+            return
+
+        if not all(url.startswith("http") for url in urls):
+            QMessageBox.warning(self, "Ошибка", "Введите корректный URL!")
+            return
+
+        if self.tools.missing() and not self.check_executables():
+            return
+
+        format_choice, quality, audio_format, video_format = self._download_options()
+
+        fragments_map = {0: 0, 1: 1, 2: 2, 3: 4, 4: 8, 5: 16}
+        fragments = fragments_map[self.fragments_combo.currentIndex()]
+
+        output_dir = self.folder_input.text() or self.download_folder
+
+        if not self.queue.has_active():
+            # Новая партия: старые завершённые задачи убираем из таблицы
+            self.queue_table.setRowCount(0)
+            self.queue.clear_finished()
+            self.log_text.clear()
+            self.log_job_id = None
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 100)   # детерминированный режим
+        self.status_label.setStyleSheet(f"color: {ACCENT_COLOR}; font-size: 12px;")
+
+        self.log(f"Формат: {format_choice}")
+        self.log(f"Качество: {quality}")
+        self.log(f"Аудио формат: {audio_format}")
+        self.log(f"Видео контейнер: {video_format}")
+        self.log(f"Папка: {output_dir}")
+
+        for url in urls:
+            self.queue.add(url, output_dir, format_choice, quality,
+                           audio_format, video_format, fragments=fragments)
+        self.url_input.clear()
+
+    def _job_row(self, job_id):
+        for row in range(self.queue_table.rowCount()):
+            if self.queue_table.item(row, 0).data(Qt.UserRole) == job_id:
+                return row
+        return None
+
+    def _selected_job_id(self):
+        rows = self.queue_table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self.queue_table.item(rows[0].row(), 0).data(Qt.UserRole)
+
+    def _sort_queue_table(self):
+        """Упорядочивает строки: активные и ожидающие — в порядке запуска."""
+        selected = self._selected_job_id()
+        pending_rank = {j.job_id: i for i, j in enumerate(self.queue.pending())}
+        jobs = sorted(self.queue.snapshot(),
+                      key=lambda j: (j.status == JOB_PENDING,
+                                     pending_rank.get(j.job_id, 0), j.job_id))
+        self.queue_table.blockSignals(True)
+        self.queue_table.setRowCount(0)
+        for job in jobs:
+            self._insert_job_row(job)
+        if selected is not None:
+            row = self._job_row(selected)
+            if row is not None:
+                self.queue_table.selectRow(row)
+        self.queue_table.blockSignals(False)
+
+    def _insert_job_row(self, job):
+        row = self.queue_table.rowCount()
+        self.queue_table.insertRow(row)
+        url_item = QTableWidgetItem(self._job_title(job))
+        url_item.setData(Qt.UserRole, job.job_id)
+        self.queue_table.setItem(row, 0, url_item)
+        self.queue_table.setItem(row, 1, QTableWidgetItem(JOB_STATUS_TEXT[job.status]))
+        self.queue_table.setItem(row, 2, QTableWidgetItem(self._job_speed_text(job)))
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        bar.setValue(self._job_bar_value(job))
+        bar.setTextVisible(False)
+        bar.setFixedHeight(6)
+        self.queue_table.setCellWidget(row, 3, bar)
+
+    @staticmethod
+    def _job_title(job):
+        if job.is_playlist:
+            return f"📃 {job.title or job.url}"
+        if job.parent_id is not None:
+            return f"    └ {job.title or job.url}"
+        return job.title or job.url
+
+    @staticmethod
+    def _job_bar_value(job):
+        return job.progress
+
+    @staticmethod
+    def _job_speed_text(job):
+        if job.is_playlist:
+            total = max(job.entries_total or 0, len(job.children))
+            text = f"{job.entries_done}/{total}"
+            if not job.expanded:
+                text += "…"
+            if job.downloaded_bytes:
+                text += f" · {format_size(job.downloaded_bytes)}"
+            if job.speed:
+                text += f" · {format_size(job.speed)}/с"
+            return text
+        if job.status == JOB_POSTPROCESSING:
+            text = f"ffmpeg {job.post_progress}%"
+            if job.eta is not None:
+                text += f"  {format_eta(job.eta)}"
+            return text
+        if job.status == JOB_PENDING and job.attempts:
+            # Вернулась в очередь после ошибки, подробности — в сообщении задачи
+            return f"повтор {sum(job.attempts.values())}"
+        limit = f"≤ {format_size(job.rate_limit)}/с" if job.rate_limit else ""
+        if not job.speed:
+            return limit
+        text = f"{format_size(job.speed)}/с"
+        if limit:
+            text += f" ({limit})"
+        if job.eta is not None:
+            text += f"  {format_eta(job.eta)}"
+        return text
+
+    def on_job_added(self, job_id):
+        job = self.queue.jobs.get(job_id)
+        if job is None:
+            return
+        if self.progress_bar.isHidden():
+            # Задача пришла не из окна, а через сервер управления
+            self.progress_bar.setVisible(True)
+            self.progress_bar.setRange(0, 100)
+            self.status_label.setStyleSheet(f"color: {ACCENT_COLOR}; font-size: 12px;")
+        self._insert_job_row(job)
+        self.update_progress()
+
+    def on_job_changed(self, job_id):
+        job = self.queue.jobs.get(job_id)
+        row = self._job_row(job_id)
+        if job is None or row is None:
+            return
+        self.queue_table.item(row, 1).setText(JOB_STATUS_TEXT[job.status])
+        self.queue_table.item(row, 2).setText(self._job_speed_text(job))
+        self.queue_table.cellWidget(row, 3).setValue(self._job_bar_value(job))
+        self.update_progress()
+
+    def on_job_log(self, job_id, lines):
+        if self.log_job_id is None:
+            self.log("\n".join(f"[#{job_id}] {line}" for line in lines))
+        elif self.log_job_id == job_id:
+            self.log("\n".join(lines))
+
+    def on_job_selected(self):
+        """Показывает в логе полный вывод выбранной задачи."""
+        self.log_job_id = self._selected_job_id()
+        if self.log_job_id is None:
+            return
+        job = self.queue.jobs.get(self.log_job_id)
+        if job is None:
+            return
+        self.log_text.clear()
+        self.log(f"URL: {job.url}")
+        if job.log_lines:
+            self.log("\n".join(job.log_lines))
+        if job.message:
+            self.log(("✅ " if job.status in (JOB_DONE, JOB_SKIPPED) else "❌ ") + job.message)
+
+    def on_job_finished(self, job_id, success, message):
+        if self.log_job_id in (None, job_id):
+            prefix = "" if self.log_job_id else f"[#{job_id}] "
+            self.log(prefix + ("✅ " if success else "❌ ") + message)
+
+    def move_job_up(self):
+        self._move_selected(-1)
+
+    def move_job_down(self):
+        self._move_selected(1)
+
+    def _move_selected(self, delta):
+        job_id = self._selected_job_id()
+        if job_id is not None:
+            self.queue.move(job_id, delta)
+
+    def cancel_job(self):
+        job_id = self._selected_job_id()
+        if job_id is not None:
+            self.queue.cancel(job_id)
+
+    def update_progress(self):
+        """Общий прогресс партии и сводка по очереди."""
+        top_level = [j for j in self.queue.snapshot() if j.parent_id is None]
+        if not top_level:
+            return
+        self.progress_bar.setValue(sum(j.progress for j in top_level) // len(top_level))
+        jobs = self._download_jobs()
+        running = sum(1 for j in jobs if j.status == JOB_RUNNING)
+        pending = sum(1 for j in jobs if j.status in (JOB_PENDING, JOB_COALESCED))
+        post = sum(1 for j in jobs if j.status in (JOB_POST_PENDING, JOB_POSTPROCESSING))
+        finished = len(jobs) - running - pending - post
+        if running or pending or post:
+            speed = self.queue.total_speed()
+            limit = self.queue.bandwidth_limit()
+            text = (f"Загрузка: активных {running}, в очереди {pending}, "
+                    + (f"обработка {post}, " if post else "")
+                    + f"завершено {finished} из {len(jobs)}")
+            if speed:
+                text += f" — {format_size(speed)}/с"
+            if limit:
+                text += f" (лимит {format_size(limit)}/с)"
+            if self.queue.eta:
+                text += f", осталось ≈ {format_eta(self.queue.eta)}"
+            self.status_label.setText(text)
+
+    def _download_jobs(self):
+        """Задачи-загрузки: элементы плейлистов вместо самих плейлистов."""
+        return [j for j in self.queue.snapshot()
+                if not j.is_playlist or not j.children]
+
+    def download_finished(self):
+        """Вызывается, когда в очереди не осталось активных задач."""
+        self.progress_bar.setVisible(False)
+
+        jobs = self._download_jobs()
+        done = sum(1 for j in jobs if j.status == JOB_DONE)
+        skipped = sum(1 for j in jobs if j.status == JOB_SKIPPED)
+        failed = [j for j in jobs if j.status == JOB_FAILED]
+
+        if not failed:
+            self.status_label.setText(f"✓ Загрузка завершена! ({done} из {len(jobs)})")
+            self.status_label.setStyleSheet(f"color: {SUCCESS_COLOR}; font-size: 12px;")
+            if done or skipped:
+                text = f"Успешно загружено: {done}"
+                if skipped:
+                    text += f"\nПропущено (уже загружено): {skipped}"
+                shared = sum(1 for j in jobs if j.status == JOB_DONE and j.shared_from)
+                if shared:
+                    text += f"\nБез повторной загрузки (готовый файл): {shared}"
+                processed = [j for j in jobs if j.post_mode is not None]
+                if processed:
+                    copied = sum(1 for j in processed if j.post_mode == POST_COPY)
+                    text += f"\nБез перекодирования: {copied} из {len(processed)}"
+                    saved = sum(j.post_cpu_saved or 0 for j in processed)
+                    if saved >= 1:
+                        text += f" (сэкономлено ≈{saved:.0f} с CPU)"
+                QMessageBox.information(self, "Готово!", text)
+        else:
+            self.status_label.setText(f"✗ Ошибок: {len(failed)} из {len(jobs)}")
+            self.status_label.setStyleSheet(f"color: {ERROR_COLOR}; font-size: 12px;")
+            details = "\n".join(f"{j.url}: {j.message}" for j in failed[:10])
+            QMessageBox.critical(self, "Ошибка",
+                                 f"Загружено: {done}, с ошибкой: {len(failed)}\n\n{details}")
+
+def main():
+    app = QApplication()
+    app.setStyle("Fusion")
+
+    app.setStyleSheet(f"""
+        QMessageBox {{ background-color: {BG_COLOR}; }}
+        QMessageBox QLabel {{ color: {TEXT_COLOR}; font-size: 13px; padding: 10px; }}
+        QMessageBox QPushButton {{ background-color: {ACCENT_COLOR}; color: {TEXT_COLOR}; border: none; border-radius: 8px; padding: 8px 20px; margin: 5px; }}
+        QMessageBox QPushButton:hover {{ background-color: {ACCENT_PRESSED}; }}
+        QFileDialog {{ background-color: {BG_COLOR}; }}
+    """)
+
+    window = YTDLP_GUI()
+    window.show()
+    app.exec()
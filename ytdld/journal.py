@@ -0,0 +1,91 @@
+"""
+Журнал задач на диске: очередь переживает закрытие программы и сбой,
+а прерванные загрузки продолжаются с недокачанных файлов.
+"""
+
+import json
+import logging
+import os
+from collections import OrderedDict
+
+JOURNAL_VERSION = 1
+JOURNAL_FINISHED_LIMIT = 200  # завершённых задач, хранимых для истории
+
+logger = logging.getLogger("yt-dld")
+
+
+class JobJournal:
+    """
+    Состояние задач в JSON-файле: параметры, статус, подобранный формат,
+    пути файлов и задание постобработки. Файл пишется атомарно (временный
+    файл, fsync, замена), поэтому после сбоя на диске остаётся последняя
+    целая версия. update() только помечает изменения, запись — save().
+    Меняется из одного потока (служебного потока очереди).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = OrderedDict()   # job_id -> запись
+        self._dirty = False
+        self._frozen = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def load(self):
+        """Читает файл; возвращает записи (пустой список, если файла нет или он испорчен)."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            entries = data["jobs"] if data.get("version") == JOURNAL_VERSION else []
+        except FileNotFoundError:
+            entries = []
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning("Журнал задач не прочитан (%s), начинаем с пустого", e)
+            entries = []
+        self._entries = OrderedDict((e["job_id"], e) for e in entries if "job_id" in e)
+        return list(self._entries.values())
+
+    def last_id(self):
+        return max(self._entries, default=0)
+
+    def update(self, entry):
+        if self._frozen:
+            return
+        self._entries[entry["job_id"]] = entry
+        self._dirty = True
+
+    def remove(self, job_id):
+        if self._frozen:
+            return
+        if self._entries.pop(job_id, None) is not None:
+            self._dirty = True
+
+    def freeze(self):
+        """
+        Сохраняет текущее состояние и больше его не меняет: при выходе
+        задачи останавливаются, но в журнале должны остаться незавершёнными.
+        """
+        self.save()
+        self._frozen = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self._prune()
+        data = {"version": JOURNAL_VERSION, "jobs": list(self._entries.values())}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Не удалось записать журнал задач: %s", e)
+            return
+        self._dirty = False
+
+    def _prune(self):
+        """Старые завершённые задачи вытесняются, чтобы журнал не рос без конца."""
+        finished = [job_id for job_id, e in self._entries.items() if e.get("finished")]
+        for job_id in finished[:max(0, len(finished) - JOURNAL_FINISHED_LIMIT)]:
+            del self._entries[job_id]
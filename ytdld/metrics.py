@@ -0,0 +1,246 @@
+"""
+Замеры по задачам: время фаз (ожидание, запуск процесса, получение
+метаданных, загрузка, fallback, постобработка), объём, скорость, повторы
+и коды выхода. Запись каждой завершённой задачи — строкой JSON в файл
+с ротацией; сводка по очереди — в текстовый файл для Prometheus.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+METRICS_FILE_MAX_BYTES = 10 * 1024 * 1024
+METRICS_FILE_BACKUPS = 3
+
+# Фазы задачи по порядку
+PHASE_QUEUED = "queued"            # ждёт слота загрузки (или такую же загрузку)
+PHASE_EXTRACT = "extract"          # yt-dlp -J: список форматов
+PHASE_SPAWN = "spawn"              # от запуска yt-dlp до первой строки вывода
+PHASE_DOWNLOAD = "download"
+PHASE_FALLBACK = "fallback"        # повторная загрузка по запасной команде
+PHASE_BACKOFF = "backoff"          # пауза перед повтором после ошибки
+PHASE_POST_WAIT = "post_wait"      # ждёт места в пуле постобработки
+PHASE_POSTPROCESS = "postprocess"
+PHASE_LINK = "link"                # готовый файл другой задачи или из хранилища
+TRANSFER_PHASES = (PHASE_DOWNLOAD, PHASE_FALLBACK)
+
+# Записи о задачах (JSONL), пишутся из служебного потока очереди
+metrics_logger = logging.getLogger("yt-dld.metrics")
+metrics_logger.propagate = False
+metrics_logger.setLevel(logging.INFO)
+
+
+def set_metrics_file(path):
+    """
+    Включает запись замеров по задачам в файл JSONL с ротацией
+    (path=None — выключает).
+    """
+    for handler in list(metrics_logger.handlers):
+        metrics_logger.removeHandler(handler)
+        handler.close()
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=METRICS_FILE_MAX_BYTES, backupCount=METRICS_FILE_BACKUPS,
+        encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    metrics_logger.addHandler(handler)
+
+
+def write_record(record):
+    """Дописывает запись о задаче в файл замеров, если он включён."""
+    if metrics_logger.handlers:
+        metrics_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def _rounded(value):
+    return None if value is None else round(value, 3)
+
+
+def _number(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(round(value, 3))
+    return str(int(value))
+
+
+class JobMetrics:
+    """
+    Замеры одной задачи. Фазу открывает start_phase(), закрывает следующая
+    фаза или end(). Фазы задачи пишет её рабочий поток, ожидание и
+    постобработку — служебный поток очереди; они не пересекаются по
+    времени, но замок всё равно берётся.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.bytes = 0
+        self.peak_speed = None        # байт/с, по событиям прогресса
+        self.retries = 0              # перезапуски yt-dlp (смена лимита, fallback)
+        self.exit_code = None         # последнего процесса yt-dlp
+        self.info_cached = False      # список форматов взят из кеша
+        self.post_exit_code = None
+        self._phases = []             # [имя, начало, конец] по time.monotonic()
+        self._origin = time.monotonic()
+        self._downloaded = 0
+        self._lock = threading.Lock()
+
+    def start_phase(self, name):
+        now = time.monotonic()
+        with self._lock:
+            self._close(now)
+            self._phases.append([name, now, None])
+
+    def end(self):
+        with self._lock:
+            self._close(time.monotonic())
+
+    def _close(self, now):
+        if self._phases and self._phases[-1][2] is None:
+            self._phases[-1][2] = now
+
+    def add_progress(self, event):
+        """
+        Учитывает событие прогресса. Счётчик байт yt-dlp начинается заново
+        у каждого файла и у fallback, поэтому складываются приращения.
+        """
+        with self._lock:
+            if event.speed is not None and (self.peak_speed is None
+                                            or event.speed > self.peak_speed):
+                self.peak_speed = event.speed
+            if event.downloaded is None:
+                return
+            if event.downloaded >= self._downloaded:
+                self.bytes += event.downloaded - self._downloaded
+            else:
+                self.bytes += event.downloaded
+            self._downloaded = event.downloaded
+
+    def phase_seconds(self):
+        """{фаза: секунд} — суммарно, если фаза повторялась."""
+        now = time.monotonic()
+        totals = {}
+        with self._lock:
+            for name, start, end in self._phases:
+                totals[name] = totals.get(name, 0.0) + ((end or now) - start)
+        return totals
+
+    def record(self, job):
+        """Запись для JSONL: всё о задаче одной строкой."""
+        phases = self.phase_seconds()
+        transfer = sum(phases.get(name, 0.0) for name in TRANSFER_PHASES)
+        with self._lock:
+            timeline = [{"phase": name, "at": round(start - self._origin, 3),
+                         "seconds": round((end or start) - start, 3)}
+                        for name, start, end in self._phases]
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z",
+                                     time.localtime(self.started_at)),
+            "job_id": job.job_id,
+            "parent_id": job.parent_id,
+            "playlist": job.is_playlist,
+            "url": job.url,
+            "title": job.title,
+            "format": job.format_choice,
+            "quality": job.quality,
+            "status": job.status,
+            "message": job.message,
+            "total_seconds": round(sum(phases.values()), 3),
+            "phases": {name: round(value, 3) for name, value in phases.items()},
+            "timeline": timeline,
+            "bytes": self.bytes,
+            "avg_speed": int(self.bytes / transfer) if transfer >= 0.5 else None,
+            "peak_speed": int(self.peak_speed) if self.peak_speed else None,
+            "retries": self.retries,
+            "exit_code": self.exit_code,
+            "info_cached": self.info_cached,
+        }
+        if job.post_mode is not None or self.post_exit_code is not None:
+            record["postprocess"] = {
+                "mode": job.post_mode,
+                "cpu_time": _rounded(job.post_cpu_time),
+                "cpu_saved": _rounded(job.post_cpu_saved),
+                "exit_code": self.post_exit_code,
+            }
+        return record
+
+
+class QueueMetrics:
+    """Накопленные итоги очереди для текстового файла Prometheus."""
+
+    def __init__(self):
+        self.finished = {}            # статус -> число задач
+        self.bytes = 0
+        self.retries = 0
+        self.phase_seconds = {}
+        self.post_cpu_seconds = 0.0
+        self.post_cpu_saved = 0.0
+
+    def add(self, job, record):
+        self.finished[job.status] = self.finished.get(job.status, 0) + 1
+        if job.is_playlist:
+            return                    # объём и время плейлиста — сумма элементов
+        self.bytes += record["bytes"]
+        self.retries += record["retries"]
+        for name, seconds in record["phases"].items():
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+        self.post_cpu_seconds += job.post_cpu_time or 0.0
+        self.post_cpu_saved += job.post_cpu_saved or 0.0
+
+    def render(self, gauges):
+        """
+        Текст в формате Prometheus: gauges — текущее состояние очереди
+        {имя: значение}, дальше — накопленные счётчики.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP ytdld_{name} {help_text}")
+            lines.append(f"# TYPE ytdld_{name} {kind}")
+            for labels, value in samples:
+                label = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"ytdld_{name}{{{label}}} {_number(value)}" if label
+                             else f"ytdld_{name} {_number(value)}")
+
+        metric("queue_pending", "gauge", "Jobs waiting for a download slot.",
+               [({}, gauges["pending"])])
+        metric("jobs_active", "gauge", "Downloads running now.",
+               [({}, gauges["active"])])
+        metric("postprocess_pending", "gauge", "Jobs waiting for post-processing.",
+               [({}, gauges["post_pending"])])
+        metric("postprocess_active", "gauge", "ffmpeg processes running now.",
+               [({}, gauges["post_active"])])
+        metric("download_speed_bytes", "gauge", "Current total download speed.",
+               [({}, gauges["speed"])])
+        metric("workers_limit", "gauge", "Current download slot limit.",
+               [({}, gauges["workers"])])
+        metric("sites_throttled", "gauge", "Sites paused after rate limiting.",
+               [({}, gauges["sites_throttled"])])
+        metric("jobs_finished_total", "counter", "Finished jobs by status.",
+               [({"status": status}, count)
+                for status, count in sorted(self.finished.items())])
+        metric("downloaded_bytes_total", "counter", "Bytes downloaded by finished jobs.",
+               [({}, self.bytes)])
+        metric("retries_total", "counter", "yt-dlp restarts and fallback runs.",
+               [({}, self.retries)])
+        metric("phase_seconds_total", "counter", "Time spent in each job phase.",
+               [({"phase": name}, seconds)
+                for name, seconds in sorted(self.phase_seconds.items())])
+        metric("postprocess_cpu_seconds_total", "counter", "CPU time used by ffmpeg.",
+               [({}, self.post_cpu_seconds)])
+        metric("postprocess_cpu_saved_seconds_total", "counter",
+               "Estimated CPU time saved by stream copy.",
+               [({}, self.post_cpu_saved)])
+        return "\n".join(lines) + "\n"
+
+
+def write_textfile(path, text):
+    """Атомарная запись (через временный файл), чтобы сборщик не читал половину."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,41 @@
+"""Распознавание плейлистов и разбор их элементов (--flat-playlist)."""
+
+import urllib.parse
+
+from .archive import media_key
+from .progress import parse_number
+
+# Плейлисты и каналы: список элементов получается потоково (--flat-playlist)
+PLAYLIST_EXPANDERS = 2        # одновременно разворачиваемых плейлистов
+PLAYLIST_ENTRY_PREFIX = "__YTDLD_ENTRY__"
+PLAYLIST_ENTRY_TEMPLATE = (PLAYLIST_ENTRY_PREFIX +
+                           "%(playlist_count)s|%(ie_key)s|%(id)s|"
+                           "%(webpage_url,url)s|%(title)s")
+# Только страницы самих списков: «watch?v=…&list=…» — это видео, открытое
+# из плейлиста или микса, и пользователь хочет именно его, а не весь список
+PLAYLIST_URL_MARKERS = ("/playlist", "/channel/", "/c/", "/user/", "/@")
+
+
+def looks_like_playlist(url):
+    """Похожа ли ссылка на плейлист или канал (по характерным частям URL)."""
+    path = urllib.parse.urlsplit(url).path
+    return any(marker in path for marker in PLAYLIST_URL_MARKERS)
+
+
+def parse_playlist_entry(line):
+    """
+    Разбирает строку, напечатанную по PLAYLIST_ENTRY_TEMPLATE.
+    Возвращает (url, название, всего элементов или None, ключ медиа или None)
+    либо None.
+    """
+    if not line.startswith(PLAYLIST_ENTRY_PREFIX):
+        return None
+    fields = line[len(PLAYLIST_ENTRY_PREFIX):].split("|", 4)
+    if len(fields) != 5 or fields[3] in ("", "NA"):
+        return None
+    count, ie_key, video_id, url, title = fields
+    key = None
+    if ie_key != "NA" and video_id != "NA":
+        key = media_key(ie_key, video_id)
+    return (url, (None if title == "NA" else title),
+            parse_number(count, int), key)
@@ -0,0 +1,476 @@
+"""
+Постобработка отдельно от загрузки: извлечение аудио и слияние видео
+с аудио выполняет ffmpeg в своём пуле, а слот загрузки освобождается сразу.
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+
+from .formats import (AUDIO_FORMAT_CODECS, COPY_AUDIO_CODECS, COPY_VIDEO_CODECS,
+                      codec_name, copy_compatible)
+from .staging import move_to_destination, remove_job_dir
+from .tools import tool_problem
+from .util import job_logger, process_group_kwargs, terminate_process_tree
+
+# yt-dlp печатает путь каждого скачанного файла строкой с этим префиксом
+POSTPROCESS_FILE_PREFIX = "__YTDLD_FILE__"
+POSTPROCESS_FILE_TEMPLATE = "after_move:" + POSTPROCESS_FILE_PREFIX + "%(filepath)s"
+# Сырые потоки до обработки: «Название.f137.mp4»
+POSTPROCESS_OUTPUT_TEMPLATE = "%(title)s.f%(format_id)s.%(ext)s"
+
+# Формат аудио -> (расширение, параметры кодека ffmpeg); качество как у yt-dlp -x
+AUDIO_CODECS = {
+    "mp3": ("mp3", ["-c:a", "libmp3lame", "-q:a", "5"]),
+    "aac": ("aac", ["-c:a", "aac", "-b:a", "160k", "-f", "adts"]),
+    "flac": ("flac", ["-c:a", "flac"]),
+    "m4a": ("m4a", ["-c:a", "aac", "-b:a", "160k"]),
+    "opus": ("opus", ["-c:a", "libopus", "-b:a", "128k"]),
+    "wav": ("wav", ["-c:a", "pcm_s16le"]),
+    "vorbis": ("ogg", ["-c:a", "libvorbis", "-q:a", "5"]),
+}
+
+# Если звук нельзя скопировать в контейнер как есть — перекодируем в этот
+CONTAINER_AUDIO_CODECS = {
+    "mp4": ["-c:a", "aac", "-b:a", "160k"],
+    "webm": ["-c:a", "libopus", "-b:a", "128k"],
+    "mkv": ["-c:a", "copy"],
+}
+
+# Последнее средство, если видео не ложится в контейнер копированием
+CONTAINER_VIDEO_CODECS = {
+    "mp4": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20"],
+    "webm": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "32", "-row-mt", "1",
+             "-deadline", "good", "-cpu-used", "4"],
+}
+
+# Как получен результат: копированием, перекодированием только звука или целиком
+POST_COPY = "copy"
+POST_AUDIO = "audio"
+POST_TRANSCODE = "transcode"
+POST_MODE_TEXT = {
+    POST_COPY: "без перекодирования",
+    POST_AUDIO: "перекодирован звук",
+    POST_TRANSCODE: "перекодирование",
+}
+
+# Секунд CPU на секунду записи при перекодировании — начальная оценка,
+# дальше уточняется по фактическим замерам
+TRANSCODE_CPU_RATE = {"audio": 0.05, "video": 1.5}
+TRANSCODE_SMOOTHING = 0.3
+
+_RAW_SUFFIX_RE = re.compile(r"\.f[^./\\]+$")
+_cpu_rates = dict(TRANSCODE_CPU_RATE)
+_cpu_rates_lock = threading.Lock()
+
+
+def post_worker_count():
+    """Размер пула постобработки: ffmpeg упирается в CPU, по процессу на ядро."""
+    return os.cpu_count() or 1
+
+
+def merge_container(video_ext, audio_ext, video_format="any"):
+    """Контейнер для слияния: выбранный пользователем или совместимый с потоками."""
+    if video_format != "any":
+        return video_format
+    if video_ext == "mp4" and audio_ext == "m4a":
+        return "mp4"
+    if video_ext == "webm" and audio_ext == "webm":
+        return "webm"
+    return "mkv"
+
+
+def required_encoders():
+    """Кодировщики ffmpeg, которые может понадобиться постобработке."""
+    encoders = set()
+    tables = ([args for _, args in AUDIO_CODECS.values()]
+              + list(CONTAINER_AUDIO_CODECS.values())
+              + list(CONTAINER_VIDEO_CODECS.values()))
+    for args in tables:
+        for option, value in zip(args, args[1:]):
+            if option in ("-c:a", "-c:v") and value != "copy":
+                encoders.add(value)
+    return encoders
+
+
+def ffprobe_path(ffmpeg_path):
+    """
+    ffprobe рядом с ffmpeg (в ffmpeg_tools или в том же каталоге PATH) или
+    None, в том числе если реестр программ нашёл его неисправным.
+    """
+    folder, name = os.path.split(ffmpeg_path)
+    path = os.path.join(folder, name.replace("ffmpeg", "ffprobe", 1))
+    return path if path != ffmpeg_path and not tool_problem(path, "ffprobe") else None
+
+
+def probe_streams(ffprobe, path):
+    """
+    Потоки файла по ffprobe: [(тип, кодек)]. Пустой список — файл не
+    читается; None — проверить нечем (ffprobe нет или он не запустился).
+    """
+    if not ffprobe:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe, "-v", "error", "-show_entries", "stream=codec_type,codec_name",
+             "-of", "json", path],
+            capture_output=True, text=True, encoding="utf-8", errors="replace",
+            timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return []
+    try:
+        streams = json.loads(result.stdout).get("streams") or []
+    except ValueError:
+        return None
+    return [(st.get("codec_type"), st.get("codec_name")) for st in streams]
+
+
+def transcode_cpu_estimate(kinds, duration):
+    """Оценка секунд CPU на перекодирование потоков kinds ("video", "audio")."""
+    if not duration:
+        return None
+    with _cpu_rates_lock:
+        return sum(_cpu_rates[kind] for kind in kinds) * duration
+
+
+def _learn_cpu_rate(kind, cpu_time, duration):
+    if not cpu_time or not duration:
+        return
+    with _cpu_rates_lock:
+        old = _cpu_rates[kind]
+        _cpu_rates[kind] = old + TRANSCODE_SMOOTHING * (cpu_time / duration - old)
+
+
+def final_path(raw_path, ext):
+    """«Название.f137.mp4» -> «Название.<ext>»."""
+    base = os.path.splitext(raw_path)[0]
+    return _RAW_SUFFIX_RE.sub("", base) + "." + ext
+
+
+class PostProcessJob:
+    """Что сделать с файлами после загрузки: kind — "audio" или "merge"."""
+
+    def __init__(self, kind, inputs, output, duration=None, audio_format=None,
+                 container=None, codecs=None, destination=None):
+        self.kind = kind
+        self.inputs = inputs          # для "merge": [видео, аудио]
+        self.output = output
+        self.duration = duration      # секунд, для прогресса
+        self.audio_format = audio_format
+        self.container = container
+        # (vcodec, acodec) каждого входа по info JSON — если нет ffprobe
+        self.codecs = codecs or [(None, None)] * len(inputs)
+        # Файлы в промежуточном каталоге: результат переносится в destination
+        self.destination = destination
+
+    def to_dict(self):
+        """Для журнала задач: обработка переживает перезапуск программы."""
+        return {"kind": self.kind, "inputs": self.inputs, "output": self.output,
+                "duration": self.duration, "audio_format": self.audio_format,
+                "container": self.container, "codecs": self.codecs,
+                "destination": self.destination}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["kind"], data["inputs"], data["output"], data.get("duration"),
+                   data.get("audio_format"), data.get("container"),
+                   [tuple(c) for c in data.get("codecs") or ()] or None,
+                   data.get("destination"))
+
+    @classmethod
+    def for_files(cls, files, format_choice, audio_format, video_format, duration=None,
+                  codecs=None, destination=None):
+        """
+        Задание по скачанным файлам или None, если обрабатывать нечего
+        (один файл видео, который уже в нужном контейнере).
+        """
+        if codecs is not None and len(codecs) != len(files):
+            codecs = None
+        if format_choice == "audio" and len(files) == 1:
+            ext = AUDIO_CODECS[audio_format][0]
+            return cls("audio", files, final_path(files[0], ext), duration,
+                       audio_format=audio_format, codecs=codecs, destination=destination)
+        if len(files) == 2:
+            video, audio = files
+            container = merge_container(os.path.splitext(video)[1][1:],
+                                        os.path.splitext(audio)[1][1:], video_format)
+            return cls("merge", files, final_path(video, container), duration,
+                       container=container, codecs=codecs, destination=destination)
+        return None
+
+    def commands(self, ffmpeg_path, vcodec=None, acodec=None):
+        """
+        Команды ffmpeg по порядку, [(способ, команда)]: следующая — если
+        предыдущая не удалась. Сначала копирование потоков; варианты,
+        которые по известным кодекам заведомо не сработают, пропускаются.
+        """
+        base = [ffmpeg_path, "-hide_banner", "-nostdin", "-y", "-v", "error",
+                "-progress", "pipe:1", "-nostats"]
+        if self.kind == "audio":
+            inputs = base + ["-i", self.inputs[0], "-vn"]
+            commands = []
+            if codec_name(acodec) in AUDIO_FORMAT_CODECS[self.audio_format]:
+                commands.append((POST_COPY, inputs + ["-c:a", "copy", self.output]))
+            codec = AUDIO_CODECS[self.audio_format][1]
+            commands.append((POST_TRANSCODE, inputs + codec + [self.output]))
+            return commands
+
+        container = self.container
+        inputs = base + ["-i", self.inputs[0], "-i", self.inputs[1],
+                         "-map", "0:v:0", "-map", "1:a:0"]
+        extra = ["-movflags", "+faststart"] if container == "mp4" else []
+        video_ok = copy_compatible(container, vcodec=vcodec)
+        audio_known_ok = (codec_name(acodec) is not None
+                          and copy_compatible(container, acodec=acodec))
+        audio_codec = (["-c:a", "copy"] if audio_known_ok
+                       else CONTAINER_AUDIO_CODECS.get(container, ["-c:a", "copy"]))
+
+        commands = []
+        if copy_compatible(container, vcodec, acodec):
+            commands.append((POST_COPY, inputs + ["-c", "copy"] + extra + [self.output]))
+        if video_ok and container in COPY_AUDIO_CODECS and not audio_known_ok:
+            commands.append((POST_AUDIO, inputs + ["-c:v", "copy"] + audio_codec
+                             + extra + [self.output]))
+        video_known_ok = codec_name(vcodec) is not None and video_ok
+        if container in COPY_VIDEO_CODECS and not video_known_ok:
+            commands.append((POST_TRANSCODE, inputs + CONTAINER_VIDEO_CODECS[container]
+                             + audio_codec + extra + [self.output]))
+        return commands
+
+    def transcoded_kinds(self, mode, acodec=None):
+        """Какие потоки перекодированы при этом способе ("video", "audio")."""
+        if mode == POST_COPY:
+            return []
+        if self.kind == "audio" or mode == POST_AUDIO:
+            return ["audio"]
+        audio_copied = (codec_name(acodec) is not None
+                        and copy_compatible(self.container, acodec=acodec))
+        return ["video"] if audio_copied else ["video", "audio"]
+
+    def stream_kinds(self):
+        return ["audio"] if self.kind == "audio" else ["video", "audio"]
+
+
+class PostProcessTask:
+    """
+    Выполняет задание постобработки в отдельном потоке. Прогресс (0-100)
+    очередь забирает через take_progress(); on_finished(job_id, success,
+    message) вызывается из рабочего потока.
+
+    После работы mode — способ (POST_COPY, POST_AUDIO, POST_TRANSCODE),
+    cpu_time — секунды CPU ffmpeg, cpu_saved — сколько CPU сэкономило
+    копирование по сравнению с перекодированием тех же потоков.
+    """
+
+    CANCELLED_MESSAGE = "Обработка отменена"
+
+    def __init__(self, job, ffmpeg_path, job_id=0, on_finished=None):
+        self.job = job
+        self.ffmpeg_path = ffmpeg_path
+        self.job_id = job_id
+        self.on_finished = on_finished
+        self.ffprobe_path = ffprobe_path(ffmpeg_path)
+        self.process = None
+        self.log_lines = []
+        self.mode = None
+        self.output_path = None       # готовый файл (после переноса), если успешно
+        self.returncode = None        # последнего запуска ffmpeg
+        self.cpu_time = None
+        self.cpu_saved = None
+        self._cancelled = False
+        self._discard = False
+        self._progress = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name=f"post-{self.job_id}")
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def cancel(self, discard=False):
+        """
+        Останавливает ffmpeg. discard — удалить и скачанные потоки (отмена
+        пользователем); при выходе из программы они нужны для продолжения.
+        """
+        self._discard = discard
+        self._cancelled = True
+        process = self.process
+        if process is not None and process.poll() is None:
+            terminate_process_tree(process)
+
+    def take_progress(self):
+        with self._lock:
+            return self._progress
+
+    def _log(self, message):
+        if job_logger.handlers:
+            job_logger.info("[#%d] %s", self.job_id, message)
+        self.log_lines.append(message)
+
+    def _finish(self, success, message):
+        if self.on_finished is not None:
+            self.on_finished(self.job_id, success, message)
+
+    def _run_ffmpeg(self, cmd):
+        self._log(f"Обработка: {' '.join(cmd)}")
+        self.process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            encoding="utf-8", errors="replace", **process_group_kwargs())
+        if self._cancelled:
+            terminate_process_tree(self.process)
+        # stderr читается одновременно с прогрессом: иначе при множестве
+        # предупреждений ffmpeg заполнит канал и встанет
+        err_lines = []
+        reader = threading.Thread(target=err_lines.extend, args=(self.process.stderr,),
+                                  daemon=True)
+        reader.start()
+        total = (self.job.duration or 0) * 1_000_000
+        for line in self.process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "out_time_us" and total and value.isdigit():
+                with self._lock:
+                    self._progress = min(99, int(int(value) * 100 / total))
+        reader.join()
+        cpu_time = self._wait_cpu(self.process)
+        self.returncode = self.process.returncode
+        for line in err_lines:
+            self._log(line.rstrip("\n"))
+        return self.process.returncode, cpu_time
+
+    @staticmethod
+    def _wait_cpu(process):
+        """Ждёт завершения ffmpeg; возвращает его время CPU или None (Windows)."""
+        if hasattr(os, "wait4"):
+            try:
+                _, status, usage = os.wait4(process.pid, 0)
+            except ChildProcessError:
+                pass
+            else:
+                process.returncode = os.waitstatus_to_exitcode(status)
+                return usage.ru_utime + usage.ru_stime
+        process.wait()
+        return None
+
+    def _input_codecs(self):
+        """(vcodec, acodec) входов: по ffprobe, а без него — по info JSON."""
+        found = []
+        for path, (hint_v, hint_a) in zip(self.job.inputs, self.job.codecs):
+            streams = probe_streams(self.ffprobe_path, path)
+            if streams:
+                found.append((next((c for t, c in streams if t == "video"), None),
+                              next((c for t, c in streams if t == "audio"), None)))
+            else:
+                found.append((codec_name(hint_v), codec_name(hint_a)))
+        if self.job.kind == "merge":
+            # Видео берётся из первого файла, звук — из второго
+            return found[0][0], found[1][1]
+        return found[0]
+
+    def _output_valid(self):
+        """Проверка результата ffprobe: на месте ли нужные потоки."""
+        streams = probe_streams(self.ffprobe_path, self.job.output)
+        if streams is None:
+            return True
+        kinds = {t for t, _ in streams}
+        return all(kind in kinds for kind in self.job.stream_kinds())
+
+    def _account(self, mode, cpu_time, acodec):
+        """Запоминает способ и время CPU; копирование сравнивается с оценкой."""
+        self.mode = mode
+        self.cpu_time = cpu_time
+        duration = self.job.duration
+        transcoded = self.job.transcoded_kinds(mode, acodec)
+        if len(transcoded) == 1 and cpu_time is not None:
+            _learn_cpu_rate(transcoded[0], cpu_time, duration)
+        copied = [k for k in self.job.stream_kinds() if k not in transcoded]
+        estimate = transcode_cpu_estimate(copied, duration) if copied else None
+        if estimate is not None:
+            self.cpu_saved = max(0.0, estimate - (cpu_time or 0.0))
+
+    def _result_message(self):
+        details = POST_MODE_TEXT[self.mode]
+        if self.cpu_saved:
+            details += f", сэкономлено ≈{self.cpu_saved:.0f} с CPU"
+        elif self.cpu_time is not None and self.mode != POST_COPY:
+            details += f", {self.cpu_time:.1f} с CPU"
+        return f"Загрузка и обработка завершены! ({details})"
+
+    def run(self):
+        try:
+            problem = tool_problem(self.ffmpeg_path, "ffmpeg")
+            if problem:
+                self._finish(False, problem)
+                return
+            vcodec, acodec = self._input_codecs()
+            if vcodec or acodec:
+                self._log(f"Кодеки: видео {vcodec or '-'}, звук {acodec or '-'}")
+            for mode, cmd in self.job.commands(self.ffmpeg_path, vcodec, acodec):
+                returncode, cpu_time = self._run_ffmpeg(cmd)
+                if self._cancelled:
+                    self._remove(self.job.output)
+                    if self._discard:
+                        self._discard_inputs()
+                    self._finish(False, self.CANCELLED_MESSAGE)
+                    return
+                if returncode == 0 and self._output_valid():
+                    self._account(mode, cpu_time, acodec)
+                    break
+                if returncode == 0:
+                    self._log("ffprobe: в результате нет нужных потоков")
+                self._remove(self.job.output)
+            else:
+                # Скачанные потоки остаются пользователю, как без обработки
+                self._deliver(self.job.inputs)
+                self._finish(False, "Ошибка обработки (ffmpeg)")
+                return
+
+            for path in self.job.inputs:
+                if path != self.job.output:
+                    self._remove(path)
+            try:
+                self.output_path = self._deliver([self.job.output])[0]
+            except OSError as e:
+                self._finish(False, f"Не удалось перенести файл в {self.job.destination}: {e}")
+                return
+            with self._lock:
+                self._progress = 100
+            self._finish(True, self._result_message())
+        except Exception as e:
+            self._finish(False, f"Исключение при обработке: {str(e)}")
+
+    def _deliver(self, paths):
+        """
+        Переносит файлы из промежуточного каталога в каталог назначения;
+        возвращает их итоговые пути.
+        """
+        destination = self.job.destination
+        if not destination:
+            return list(paths)
+        targets = []
+        for path in paths:
+            targets.append(move_to_destination(path, destination))
+            self._log(f"Перенесено в {destination}: {os.path.basename(targets[-1])}")
+        remove_job_dir(os.path.dirname(self.job.output))
+        return targets
+
+    def _discard_inputs(self):
+        for path in self.job.inputs:
+            self._remove(path)
+        if self.job.destination:
+            remove_job_dir(os.path.dirname(self.job.output))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,177 @@
+"""
+Предпросмотр ссылки до загрузки: название, длительность, доступные высоты
+и оценка размера для каждого качества. Метаданные берутся из FormatCache
+очереди (в памяти и на диске), поэтому повторный просмотр и следующая
+за ним загрузка обходятся без повторного извлечения.
+"""
+
+import subprocess
+import threading
+
+from .formats import audio_copy_compatible, resolve_format
+from .playlist import looks_like_playlist
+from .util import process_group_kwargs, terminate_process_tree
+
+PREVIEW_TIMEOUT = 60          # секунд на yt-dlp -J
+PREVIEW_QUALITIES = ("best", "1080p", "720p", "480p", "360p")
+
+# Примерный битрейт (бит/с) аудио после перекодирования в формат
+AUDIO_TARGET_BITRATE = {
+    "mp3": 130_000,           # libmp3lame -q:a 5
+    "aac": 160_000,
+    "m4a": 160_000,
+    "opus": 128_000,
+    "vorbis": 160_000,
+    "flac": 900_000,
+    "wav": 1_411_200,
+}
+
+
+def format_size_estimate(fmt, duration):
+    """Размер потока: из метаданных, иначе битрейт × длительность. None — неизвестен."""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    rate = fmt.get("tbr") or ((fmt.get("vbr") or 0) + (fmt.get("abr") or 0))
+    if rate and duration:
+        return int(rate * 1000 / 8 * duration)
+    return None
+
+
+def estimate_size(info, format_spec, format_choice, audio_format):
+    """
+    Оценка размера результата для подобранного формата «137+140», байт;
+    None — размер какого-то из потоков неизвестен.
+    """
+    duration = info.get("duration")
+    by_id = {f.get("format_id"): f for f in info.get("formats") or ()}
+    total = 0
+    for format_id in format_spec.split("+"):
+        fmt = by_id.get(format_id)
+        if fmt is None:
+            return None
+        size = format_size_estimate(fmt, duration)
+        if (format_choice == "audio" and duration
+                and not audio_copy_compatible(audio_format, fmt.get("acodec"))):
+            # Аудио будет перекодировано — размер по целевому битрейту
+            size = int(AUDIO_TARGET_BITRATE[audio_format] / 8 * duration)
+        if size is None:
+            return None
+        total += size
+    return total
+
+
+class MediaPreview:
+    """Сводка по ссылке для показа до загрузки."""
+
+    def __init__(self, title=None, duration=None, heights=(), sizes=None,
+                 is_playlist=False, entries=None):
+        self.title = title
+        self.duration = duration      # секунд
+        self.heights = list(heights)  # доступные высоты видео, по убыванию
+        self.sizes = sizes or {}      # качество -> (формат, байт или None)
+        self.is_playlist = is_playlist
+        self.entries = entries        # элементов в плейлисте, если известно
+
+    @classmethod
+    def from_info(cls, info, format_choice, audio_format, video_format):
+        """Сводка по info JSON для выбранных формата, аудио и контейнера."""
+        if info.get("_type", "video") != "video":
+            entries = info.get("entries")
+            count = len(entries) if isinstance(entries, list) else info.get("playlist_count")
+            return cls(info.get("title"), is_playlist=True, entries=count)
+
+        formats = [f for f in info.get("formats") or () if f.get("format_id")]
+        heights = sorted({f["height"] for f in formats
+                          if f.get("height") and f.get("vcodec") != "none"}, reverse=True)
+
+        qualities = ("best",) if format_choice == "audio" else PREVIEW_QUALITIES
+        sizes = {}
+        for quality in qualities:
+            spec = resolve_format(info, format_choice, quality, video_format, audio_format)
+            if spec is not None:
+                sizes[quality] = (spec, estimate_size(info, spec, format_choice,
+                                                      audio_format))
+        return cls(info.get("title"), info.get("duration"), heights, sizes)
+
+
+class PreviewFetcher:
+    """
+    Получает метаданные ссылки в фоновом потоке. Новый запрос отменяет
+    предыдущий (его процесс yt-dlp завершается), устаревшие ответы
+    отбрасываются. on_result(url, info, error) вызывается из фонового
+    потока: info — словарь или None, error — текст ошибки или None.
+    """
+
+    def __init__(self, yt_dlp_path, format_cache, on_result):
+        self.yt_dlp_path = yt_dlp_path
+        self.format_cache = format_cache
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._process = None
+
+    def request(self, url):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        self._stop_process()
+        threading.Thread(target=self._run, args=(generation, url), daemon=True,
+                         name="preview").start()
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+        self._stop_process()
+
+    def _stop_process(self):
+        process = self._process
+        if process is not None and process.poll() is None:
+            terminate_process_tree(process)
+
+    def _current(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def _run(self, generation, url):
+        entry = self.format_cache.get(url)
+        if entry is not None:
+            if self._current(generation):
+                self.on_result(url, entry[0], None)
+            return
+
+        cmd = [self.yt_dlp_path, "-J", "--no-warnings"]
+        if looks_like_playlist(url):
+            cmd.append("--flat-playlist")   # полный -J плейлиста извлекал бы каждый элемент
+        else:
+            cmd.append("--no-playlist")     # видео из плейлиста — только оно само
+        cmd.append(url)
+        try:
+            process = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                encoding="utf-8", errors="replace", **process_group_kwargs())
+        except OSError as e:
+            if self._current(generation):
+                self.on_result(url, None, str(e))
+            return
+        self._process = process
+        if not self._current(generation):
+            terminate_process_tree(process)
+        try:
+            out, err = process.communicate(timeout=PREVIEW_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            terminate_process_tree(process)
+            out, err = process.communicate()
+            err = "нет ответа от сайта"
+        if not self._current(generation):
+            return
+        if process.returncode != 0:
+            lines = [line for line in err.splitlines() if line.strip()]
+            self.on_result(url, None, lines[-1] if lines else "ошибка yt-dlp")
+            return
+        try:
+            info, _ = self.format_cache.put(url, out)
+        except (OSError, ValueError) as e:
+            self.on_result(url, None, str(e))
+            return
+        self.on_result(url, info, None)
@@ -0,0 +1,270 @@
+"""
+Машиночитаемый прогресс yt-dlp (--progress-template), его разбор и
+сводный прогресс задачи по потокам и постобработке.
+"""
+
+import threading
+import time
+
+# Машиночитаемый прогресс: yt-dlp печатает строку с полями через "|"
+PROGRESS_PREFIX = "__YTDLD__"
+PROGRESS_FIELDS = ("status", "downloaded_bytes", "total_bytes",
+                   "total_bytes_estimate", "speed", "eta",
+                   "fragment_index", "fragment_count")
+PROGRESS_TEMPLATE = "download:" + PROGRESS_PREFIX + "|".join(
+    f"%(progress.{field})s" for field in PROGRESS_FIELDS)
+
+class ProgressEvent:
+    """Событие прогресса загрузки одного потока (байты, скорость, ETA)."""
+    __slots__ = ("status", "downloaded", "total", "speed", "eta",
+                 "fragment_index", "fragment_count")
+
+    def __init__(self, status, downloaded=None, total=None, speed=None,
+                 eta=None, fragment_index=None, fragment_count=None):
+        self.status = status              # downloading / finished / error
+        self.downloaded = downloaded      # байт
+        self.total = total                # байт (точно или оценка)
+        self.speed = speed                # байт/с
+        self.eta = eta                    # секунд
+        self.fragment_index = fragment_index
+        self.fragment_count = fragment_count
+
+    @property
+    def percent(self):
+        """Процент 0-100 или None, если оценить нельзя."""
+        if self.status == "finished":
+            return 100
+        if self.total and self.downloaded is not None:
+            return min(100, int(self.downloaded * 100 / self.total))
+        if self.fragment_count and self.fragment_index is not None:
+            return min(100, int(self.fragment_index * 100 / self.fragment_count))
+        return None
+
+
+def parse_number(value, kind=float):
+    if value == "NA" or not value:
+        return None
+    try:
+        return kind(float(value))
+    except ValueError:
+        return None
+
+
+def parse_progress_line(line):
+    """
+    Разбирает строку, напечатанную по PROGRESS_TEMPLATE.
+    Для любых других строк возвращает None, не выполняя поиска по ним.
+    """
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    fields = line[len(PROGRESS_PREFIX):].split("|")
+    if len(fields) != len(PROGRESS_FIELDS):
+        return None
+    status, downloaded, total, estimate, speed, eta, frag_index, frag_count = fields
+    return ProgressEvent(
+        status,
+        downloaded=parse_number(downloaded, int),
+        total=parse_number(total, int) or parse_number(estimate, int),
+        speed=parse_number(speed),
+        eta=parse_number(eta, int),
+        fragment_index=parse_number(frag_index, int),
+        fragment_count=parse_number(frag_count, int),
+    )
+
+
+# Секунд постобработки на мегабайт скачанного — начальная оценка по виду
+# обработки, дальше уточняется по фактическому времени
+POST_SECONDS_PER_MB = {"merge": 0.02, "audio": 0.2}
+POST_RATE_SMOOTHING = 0.3
+POST_FRACTION_MAX = 0.95      # по времени обработка не «завершается» раньше ffmpeg
+NEXT_STREAM_SHARE = 0.1       # неизвестный размер следующего потока — доля первого
+
+_post_rates = dict(POST_SECONDS_PER_MB)
+_post_rates_lock = threading.Lock()
+
+
+def post_seconds_estimate(kind, input_bytes):
+    """Оценка секунд постобработки kind ("merge", "audio") для input_bytes байт."""
+    with _post_rates_lock:
+        return _post_rates[kind] * input_bytes / (1024 * 1024)
+
+
+def _learn_post_rate(kind, seconds, input_bytes):
+    if not input_bytes:
+        return
+    with _post_rates_lock:
+        old = _post_rates[kind]
+        _post_rates[kind] = old + POST_RATE_SMOOTHING * (
+            seconds * 1024 * 1024 / input_bytes - old)
+
+
+class JobProgress:
+    """
+    Сводный прогресс задачи из нескольких потоков и фаз. Потоки загрузки
+    (видео, звук) весят по ожидаемому объёму, постобработка — по ожидаемому
+    времени, пересчитанному в байты по средней скорости загрузки. Процент
+    только растёт: при уточнении оценок шкала не откатывается назад.
+
+    Загрузку сообщает рабочий поток задачи (add, next_stream), постобработку
+    и чтение — служебный поток очереди, поэтому всё под замком.
+    """
+
+    def __init__(self, streams=1, post_kind=None):
+        self.streams = streams        # сколько потоков скачивается
+        self.stream_sizes = []        # ожидаемые байты по потокам, если известны
+        self.post_kind = post_kind    # "merge" / "audio" или None — без обработки
+        self._index = -1              # текущий поток (-1 — загрузка не началась)
+        self._finished_bytes = 0      # байт завершённых потоков
+        self._downloaded = 0          # текущего потока
+        self._total = None            # размер текущего потока по yt-dlp
+        self._speed = None
+        self._transfer_started = None
+        self._post_started = None
+        self._post_reported = 0.0     # доля по ffmpeg
+        self._post_done = False
+        self._percent = 0
+        self._lock = threading.Lock()
+
+    def plan(self, stream_sizes, post_kind=None):
+        """Потоки и их размеры по подобранному формату (None — размер неизвестен)."""
+        with self._lock:
+            self.stream_sizes = list(stream_sizes)
+            self.streams = max(1, len(stream_sizes))
+            self.post_kind = post_kind
+
+    def restart(self, streams=1, post_kind=None):
+        """Загрузка начинается заново другой командой (fallback)."""
+        with self._lock:
+            self.streams = streams
+            self.stream_sizes = []
+            self.post_kind = post_kind
+            self._index = -1
+            self._finished_bytes = 0
+            self._downloaded = 0
+            self._total = None
+
+    def next_stream(self):
+        """yt-dlp начал писать следующий файл (строка Destination)."""
+        with self._lock:
+            if self._index >= 0:
+                self._finished_bytes += self._stream_size(self._index)
+            self._index += 1
+            self._downloaded = 0
+            self._total = None
+
+    def add(self, event):
+        with self._lock:
+            if self._index < 0:
+                self._index = 0
+            if self._transfer_started is None:
+                self._transfer_started = time.monotonic()
+            if event.total:
+                self._total = event.total
+            if event.downloaded is not None:
+                self._downloaded = event.downloaded
+            elif event.percent is not None:
+                self._downloaded = self._stream_size(self._index) * event.percent // 100
+            if event.status == "finished":
+                self._downloaded = self._total or self._downloaded
+            self._speed = event.speed
+
+    def post_begin(self):
+        with self._lock:
+            if self._post_started is None:
+                self._post_started = time.monotonic()
+            self._speed = None
+
+    def post_update(self, fraction):
+        """Доля постобработки по ffmpeg (0-1)."""
+        with self._lock:
+            self._post_reported = max(self._post_reported, fraction)
+
+    def post_finish(self, success):
+        """Обработка закончилась: при успехе время идёт в оценку для следующих задач."""
+        with self._lock:
+            if self._post_started is None or self._post_done:
+                return
+            self._post_done = True
+            if success and self.post_kind:
+                _learn_post_rate(self.post_kind, time.monotonic() - self._post_started,
+                                 self._downloaded_total())
+
+    def _stream_size(self, index):
+        """Размер потока: текущего — по yt-dlp, остальных — по плану или доле первого."""
+        if index == self._index and self._total:
+            return max(self._total, self._downloaded)
+        if index < len(self.stream_sizes) and self.stream_sizes[index]:
+            return self.stream_sizes[index]
+        if index == self._index:
+            return self._downloaded
+        first = self._total if self._index == 0 else None
+        if first is None and self.stream_sizes and self.stream_sizes[0]:
+            first = self.stream_sizes[0]
+        return int((first or 0) * NEXT_STREAM_SHARE)
+
+    def _downloaded_total(self):
+        return self._finished_bytes + (self._downloaded if self._index >= 0 else 0)
+
+    def _download_total(self):
+        return self._finished_bytes + sum(
+            self._stream_size(i) for i in range(max(0, self._index),
+                                                max(self.streams, self._index + 1)))
+
+    def _post_fraction(self, estimate):
+        if self._post_done:
+            return 1.0
+        if self._post_started is None:
+            return 0.0
+        by_time = 0.0
+        if estimate:
+            by_time = min(POST_FRACTION_MAX, (time.monotonic() - self._post_started) / estimate)
+        return max(self._post_reported, by_time)
+
+    def _average_speed(self):
+        if self._transfer_started is None:
+            return None
+        elapsed = time.monotonic() - self._transfer_started
+        if elapsed < 1:
+            return self._speed
+        return self._downloaded_total() / elapsed or None
+
+    def _state(self):
+        """(скачано, всего к загрузке, секунд обработки, доля обработки)."""
+        downloaded = self._downloaded_total()
+        total = max(self._download_total(), downloaded)
+        post = post_seconds_estimate(self.post_kind, total) if self.post_kind else 0.0
+        return downloaded, total, post, self._post_fraction(post)
+
+    def percent(self):
+        """Процент 0-99 (100 ставит очередь по завершении); не убывает."""
+        with self._lock:
+            downloaded, total, post, post_fraction = self._state()
+            speed = self._average_speed()
+            post_weight = post * speed if post and speed else 0.0
+            work = total + post_weight
+            if work > 0:
+                fraction = (downloaded + post_fraction * post_weight) / work
+            else:
+                fraction = post_fraction
+            self._percent = max(self._percent, min(99, int(fraction * 100)))
+            return self._percent
+
+    def remaining_bytes(self):
+        with self._lock:
+            downloaded, total, _, _ = self._state()
+            return max(0, total - downloaded)
+
+    def remaining_post_seconds(self):
+        with self._lock:
+            _, _, post, post_fraction = self._state()
+            return post * (1 - post_fraction)
+
+    def eta(self):
+        """Секунд до конца: загрузка по текущей скорости плюс обработка; None — неизвестно."""
+        with self._lock:
+            downloaded, total, post, post_fraction = self._state()
+            remaining = max(0, total - downloaded)
+            if remaining and not self._speed:
+                return None
+            seconds = remaining / self._speed if remaining else 0.0
+            return int(seconds + post * (1 - post_fraction))
@@ -0,0 +1,199 @@
+"""
+Повторы после ошибок загрузки. Вывод yt-dlp разбирается по мере
+поступления: ошибка относится к классу (формат недоступен, сайт
+ограничивает запросы, ссылки истекли, сбой фрагментов, сбой сети,
+неустранимая), и у каждого класса своя политика — сколько раз повторять,
+с какой паузой и что менять в следующей попытке. Сайт, ограничивший
+запросы, на время закрывается для новых задач, чтобы они не занимали
+все слоты загрузки.
+"""
+
+import random
+import time
+import urllib.parse
+
+ERROR_FATAL = "fatal"              # видео удалено, закрыто, ссылка не та — повторять незачем
+ERROR_FORMAT = "format"            # запрошенного формата нет
+ERROR_THROTTLED = "throttled"      # HTTP 429
+ERROR_EXPIRED = "expired"          # HTTP 403: истекли ссылки на потоки в info JSON
+ERROR_FRAGMENT = "fragment"        # фрагменты DASH/HLS не скачались
+ERROR_NETWORK = "network"          # обрыв соединения, таймаут, 5xx
+
+ERROR_TEXT = {
+    ERROR_FATAL: "видео недоступно",
+    ERROR_FORMAT: "формат недоступен",
+    ERROR_THROTTLED: "сайт ограничивает запросы",
+    ERROR_EXPIRED: "ссылки на потоки истекли",
+    ERROR_FRAGMENT: "не скачались фрагменты",
+    ERROR_NETWORK: "сбой сети",
+}
+
+# Подстроки (в нижнем регистре) по классам; порядок — от более тяжёлого
+ERROR_PATTERNS = (
+    (ERROR_FATAL, ("video unavailable", "private video", "has been removed",
+                   "unsupported url", "http error 404", "http error 410",
+                   "not available in your country", "members-only",
+                   "sign in to confirm your age", "is not a valid url")),
+    (ERROR_FORMAT, ("requested format is not available",)),
+    (ERROR_THROTTLED, ("http error 429", "too many requests", "not a bot")),
+    (ERROR_EXPIRED, ("http error 403",)),
+    (ERROR_FRAGMENT, ("fragment retries", "skipping fragment",
+                      "not found, unable to continue")),
+    (ERROR_NETWORK, ("connection reset", "connection refused", "connection aborted",
+                     "timed out", "name resolution", "network is unreachable",
+                     "incompleteread", "remote end closed", "http error 5",
+                     "eof occurred", "ssl:")),
+)
+ERROR_SEVERITY = [kind for kind, _ in ERROR_PATTERNS]
+
+
+class RetryPolicy:
+    """
+    Как повторять ошибку класса. Пауза перед n-й попыткой — delay·2ⁿ,
+    не больше max_delay, со случайным разбросом в верхнюю половину, чтобы
+    задачи одного сайта не возвращались разом.
+    """
+
+    def __init__(self, attempts=0, delay=0.0, max_delay=0.0, stop_after=0,
+                 refresh=False, fewer_fragments=False, lower_format=False):
+        self.attempts = attempts      # повторов сверх первой попытки
+        self.delay = delay            # с, пауза перед первым повтором
+        self.max_delay = max_delay
+        # Столько строк этого класса — и процесс останавливается досрочно:
+        # сам yt-dlp продолжил бы повторять впустую (0 — не останавливать)
+        self.stop_after = stop_after
+        self.refresh = refresh                  # заново получить список форматов
+        self.fewer_fragments = fewer_fragments  # вдвое меньше -N
+        self.lower_format = lower_format        # запасной селектор формата, сразу
+
+    def backoff(self, attempt):
+        """Пауза перед повтором attempt (с нуля), с."""
+        limit = min(self.max_delay, self.delay * 2 ** attempt)
+        return limit / 2 + random.uniform(0, limit / 2)
+
+
+# Незагружаемое продолжается с .part и готовых фрагментов: повтор не
+# начинает загрузку заново
+RETRY_POLICIES = {
+    ERROR_FATAL: RetryPolicy(),
+    ERROR_FORMAT: RetryPolicy(attempts=1, lower_format=True),
+    ERROR_THROTTLED: RetryPolicy(attempts=4, delay=30, max_delay=600, stop_after=3),
+    ERROR_EXPIRED: RetryPolicy(attempts=2, delay=1, max_delay=5, stop_after=3,
+                               refresh=True),
+    ERROR_FRAGMENT: RetryPolicy(attempts=3, delay=5, max_delay=60, fewer_fragments=True),
+    ERROR_NETWORK: RetryPolicy(attempts=5, delay=2, max_delay=60),
+}
+
+
+def classify_line(line):
+    """Класс ошибки по строке вывода yt-dlp или None."""
+    # Только сообщения об ошибках: в названии видео тоже может быть «private video»
+    if not (line.startswith(("ERROR:", "WARNING:")) or "Got error" in line):
+        return None
+    text = line.lower()
+    for kind, patterns in ERROR_PATTERNS:
+        if any(pattern in text for pattern in patterns):
+            return kind
+    return None
+
+
+class ErrorClassifier:
+    """Ошибки одного процесса yt-dlp, по строкам по мере поступления."""
+
+    def __init__(self):
+        self.counts = {}              # класс -> строк
+        self.stop_reason = None       # класс, из-за которого процесс стоит остановить
+
+    def feed(self, line):
+        """Учитывает строку; возвращает её класс или None."""
+        kind = classify_line(line)
+        if kind is None:
+            return None
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        stop_after = RETRY_POLICIES[kind].stop_after
+        if stop_after and self.counts[kind] >= stop_after and self.stop_reason is None:
+            self.stop_reason = kind
+        return kind
+
+    def verdict(self):
+        """Самый тяжёлый из встреченных классов или None."""
+        for kind in ERROR_SEVERITY:
+            if kind in self.counts:
+                return kind
+        return None
+
+
+def site_of(url):
+    """Сайт ссылки для размыкателя: youtube.com для www. и m. тоже."""
+    host = (urllib.parse.urlsplit(url).hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+class HostBreaker:
+    """
+    Размыкатель по сайтам. Ограничение запросов закрывает сайт на паузу,
+    которая удваивается с каждым таким отказом подряд; пока она не прошла,
+    новые задачи сайта не стартуют (идущие доделываются). Потом пропускается
+    одна пробная задача: успех открывает сайт, новый отказ снова закрывает.
+    Используется из служебного потока очереди.
+    """
+
+    def __init__(self, cooldown=60.0, max_cooldown=1800.0):
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._sites = {}              # сайт -> [закрыт до (monotonic), отказов подряд]
+        self._probes = {}             # сайт -> job_id пробной задачи
+
+    def allow(self, url):
+        """Можно ли стартовать задачу этого сайта сейчас."""
+        site = site_of(url)
+        state = self._sites.get(site)
+        if state is None:
+            return True
+        return time.monotonic() >= state[0] and site not in self._probes
+
+    def started(self, url, job_id):
+        """Задача сайта стартовала; после паузы первая из них — пробная."""
+        site = site_of(url)
+        if site in self._sites:
+            self._probes[site] = job_id
+
+    def reopens_in(self, url):
+        """Через сколько секунд сайт откроется (0 — открыт)."""
+        state = self._sites.get(site_of(url))
+        return max(0.0, state[0] - time.monotonic()) if state else 0.0
+
+    def throttled(self, url, job_id):
+        """Сайт отказал задаче — закрываем его на удвоенную паузу."""
+        site = site_of(url)
+        state = self._sites.setdefault(site, [0.0, 0])
+        now = time.monotonic()
+        # Отказы задач, шедших одновременно, — один отказ, а не серия
+        if state[0] <= now:
+            state[1] += 1
+            state[0] = now + min(self.max_cooldown, self.cooldown * 2 ** (state[1] - 1))
+        if self._probes.get(site) == job_id:
+            del self._probes[site]
+
+    def succeeded(self, url):
+        site = site_of(url)
+        self._sites.pop(site, None)
+        self._probes.pop(site, None)
+
+    def finished(self, url, job_id):
+        """Задача завершилась иначе (отмена, другая ошибка) — проба не состоялась."""
+        site = site_of(url)
+        if self._probes.get(site) == job_id:
+            del self._probes[site]
+
+    def closed_count(self):
+        """Сколько сайтов закрыто сейчас."""
+        now = time.monotonic()
+        return sum(1 for state in self._sites.values() if state[0] > now)
+
+    def waiting(self):
+        """Есть ли сайты, ждущие паузы или пробной задачи."""
+        return bool(self._sites)
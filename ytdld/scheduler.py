@@ -0,0 +1,1158 @@
+"""Очередь загрузок: задачи, приоритеты и ограниченный пул потоков."""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from .archive import DownloadArchive, format_profile, media_key_from_url
+from .bandwidth import BANDWIDTH_REBALANCE_INTERVAL, BandwidthBudget, rate_changed
+from .engine import EnginePool
+from .formats import FormatCache, resolve_format
+from .fragments import FragmentTuner
+from .journal import JobJournal
+from .metrics import (JobMetrics, PHASE_BACKOFF, PHASE_LINK, PHASE_POST_WAIT,
+                      PHASE_POSTPROCESS, PHASE_QUEUED, QueueMetrics, write_record,
+                      write_textfile)
+from .playlist import PLAYLIST_EXPANDERS, looks_like_playlist
+from .postprocess import PostProcessJob, PostProcessTask, post_worker_count
+from .preview import estimate_size
+from .progress import JobProgress, post_seconds_estimate
+from .retry import ERROR_THROTTLED, RETRY_POLICIES, HostBreaker
+from .staging import (DISK_RESERVE, create_job_dir, prune_staging, remove_job_dir,
+                      space_needs)
+from .store import LINK_TEXT, ContentStore, LinkTask
+from .tasks import DownloadTask, PlaylistTask, post_kind
+from .util import app_data_dir, format_size
+
+AUTO_MAX_WORKERS = 8          # верхняя граница числа потоков в режиме «Авто»
+SCHEDULER_INTERVAL = 3.0      # период пересчёта лимита в режиме «Авто», с
+LOG_FLUSH_INTERVAL = 0.2      # как часто вывод задач забирается пачкой, с
+JOB_LOG_LIMIT = 5000          # строк лога, хранимых для каждой задачи
+
+logger = logging.getLogger("yt-dld")
+
+_STOP = object()              # команда остановки служебного потока очереди
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_SKIPPED = "skipped"
+JOB_POST_PENDING = "post_pending"        # скачано, ждёт места в пуле постобработки
+JOB_POSTPROCESSING = "postprocessing"
+JOB_COALESCED = "coalesced"              # ждёт результата такой же задачи
+JOB_LINKING = "linking"                  # получает готовый файл без загрузки
+JOB_ACTIVE_STATUSES = (JOB_PENDING, JOB_RUNNING, JOB_POST_PENDING, JOB_POSTPROCESSING,
+                       JOB_COALESCED, JOB_LINKING)
+DISK_WAIT_MESSAGE = "Ждёт места на диске"
+
+JOB_STATUS_TEXT = {
+    JOB_PENDING: "В очереди",
+    JOB_RUNNING: "Загрузка",
+    JOB_DONE: "Готово",
+    JOB_FAILED: "Ошибка",
+    JOB_CANCELLED: "Отменено",
+    JOB_SKIPPED: "Уже загружено",
+    JOB_POST_PENDING: "Ждёт обработки",
+    JOB_POSTPROCESSING: "Обработка",
+    JOB_COALESCED: "Ждёт такую же загрузку",
+    JOB_LINKING: "Готовый файл",
+}
+
+
+def auto_worker_count():
+    """
+    Число одновременных загрузок для режима «Авто».
+    Берётся по числу ядер (загрузка в основном сетевая, но слияние через
+    ffmpeg нагружает CPU) и уменьшается, если система уже перегружена.
+    """
+    cpus = os.cpu_count() or 1
+    limit = min(AUTO_MAX_WORKERS, max(2, cpus))
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):  # Windows
+        return limit
+    if load >= cpus:
+        return max(1, limit // 2)
+    return limit
+
+
+class DownloadJob:
+    """Одна задача в очереди загрузок: параметры, состояние, лог и результат."""
+
+    def __init__(self, job_id, url, output_dir, format_choice, quality,
+                 audio_format, video_format, priority=0, is_playlist=False,
+                 parent_id=None, title=None, media_key=None, fragments=0):
+        self.job_id = job_id
+        self.url = url
+        self.title = title
+        # Ключи медиа для архива: из ссылки/списка, после загрузки — из метаданных
+        self.media_keys = [media_key or media_key_from_url(url)]
+        self.profile = format_profile(format_choice, quality, audio_format, video_format)
+        self.output_dir = output_dir
+        self.format_choice = format_choice
+        self.quality = quality
+        self.audio_format = audio_format
+        self.video_format = video_format
+        self.priority = priority
+        self.fragments = fragments    # -N для DASH/HLS: 0 — «Авто»
+        self.fragment_cap = None      # предел -N следующей попытки после сбоя фрагментов
+        self.order = job_id           # порядок внутри одного приоритета
+        self.status = JOB_PENDING
+        self.progress = 0             # сводный по потокам и обработке, не убывает
+        # Модель прогресса: потоки по объёму, обработка по ожидаемому времени
+        self.progress_model = JobProgress(2 if format_choice == "video+audio" else 1,
+                                          post_kind(format_choice))
+        self.speed = None             # байт/с, по последнему событию прогресса
+        self.eta = None               # секунд до конца загрузки и обработки
+        self.rate_limit = None        # доля общего лимита скорости, байт/с
+        self.rate_changed_at = 0.0
+        self.downloaded_bytes = 0
+        self.log_lines = deque(maxlen=JOB_LOG_LIMIT)
+        self.message = ""
+        self.task = None
+        self.restored = False         # из журнала прошлого запуска
+        self.format_spec = None       # подобранный формат, «137+140»
+        self.output_files = []        # куда пишет yt-dlp (недокачанное — с .part)
+        self.staging_dir = None       # подкаталог задачи в промежуточном каталоге
+        self.size_estimate = None     # (байт, нужна ли обработка) — для учёта места
+        self.space_needs = {}         # устройство -> байт, занятых задачей при старте
+        self.post_job = None          # PostProcessJob после загрузки, если нужна обработка
+        self.post_task = None
+        self.post_progress = 0
+        self.post_mode = None         # POST_COPY / POST_AUDIO / POST_TRANSCODE
+        self.post_cpu_time = None     # секунд CPU ffmpeg
+        self.post_cpu_saved = None    # сэкономлено копированием вместо перекодирования
+        # Дубликаты: одна задача качает, остальные (followers) получают её файлы
+        self.leader_id = None
+        self.followers = []
+        self.link_task = None
+        self.shared_from = None       # откуда взят готовый файл, если не загружен
+        self.result_files = []        # готовые файлы в output_dir
+        # Повторы после ошибок: не стартовать раньше retry_at (time.monotonic())
+        self.retry_at = 0.0
+        self.attempts = {}            # класс ошибки -> сделано повторов
+        self.metrics = JobMetrics()
+        self.metrics.start_phase(PHASE_QUEUED)
+
+        # Плейлист: сам ничего не скачивает, а порождает задачи-элементы
+        self.is_playlist = is_playlist
+        self.parent_id = parent_id
+        self.children = []
+        self.entries_total = None     # по данным сайта, если известно
+        self.entries_done = 0
+        self.expanded = False         # список элементов получен полностью
+
+    @property
+    def is_active(self):
+        return self.status in JOB_ACTIVE_STATUSES
+
+    def journal_entry(self):
+        """Запись для журнала задач: всё, что нужно, чтобы продолжить после перезапуска."""
+        return {
+            "job_id": self.job_id,
+            "url": self.url,
+            "title": self.title,
+            "output_dir": self.output_dir,
+            "format_choice": self.format_choice,
+            "quality": self.quality,
+            "audio_format": self.audio_format,
+            "video_format": self.video_format,
+            "priority": self.priority,
+            "order": self.order,
+            "fragments": self.fragments,
+            "parent_id": self.parent_id,
+            "is_playlist": self.is_playlist,
+            "expanded": self.expanded,
+            "media_keys": self.media_keys,
+            "status": self.status,
+            "message": self.message,
+            "finished": not self.is_active,
+            "format_spec": self.format_spec,
+            "output_files": self.output_files,
+            "staging_dir": self.staging_dir,
+            "post_job": self.post_job.to_dict() if self.post_job is not None else None,
+        }
+
+    def sort_key(self):
+        """Ключ сортировки ожидающих задач: выше приоритет — раньше старт."""
+        return (-self.priority, self.order)
+
+
+class DownloadQueue:
+    """
+    Очередь загрузок с ограниченным пулом потоков.
+    Одновременно выполняется не больше max_workers задач (0 — «Авто»),
+    остальные ждут в порядке приоритета.
+
+    Состояние очереди меняется только в её служебном потоке: публичные
+    методы ставят команду в очередь событий, туда же задачи сообщают о
+    выводе и завершении. Подписчики (add_listener) получают из этого
+    потока события listener(имя, *аргументы):
+        job_added(job_id), job_changed(job_id) — статус или прогресс,
+        job_log(job_id, lines) — пачка строк лога,
+        job_finished(job_id, success, message), queue_reordered() — изменился
+        порядок ожидающих задач, queue_idle() — всё завершено.
+    """
+
+    def __init__(self, yt_dlp_path, ffmpeg_path, max_workers=0):
+        self.yt_dlp_path = yt_dlp_path
+        self.ffmpeg_path = ffmpeg_path
+        self.max_workers = max_workers
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self.format_cache = FormatCache(os.path.join(app_data_dir(), "info_cache"))
+        self.engine_pool = None
+        self.playlist_mode = True     # разворачивать плейлисты в отдельные задачи
+        self.archive = DownloadArchive(os.path.join(app_data_dir(), "archive.txt"))
+        self.skip_archived = True     # не скачивать то, что уже есть в архиве
+        self.fragment_tuner = FragmentTuner()
+        self.bandwidth = BandwidthBudget()
+        # Постобработка (ffmpeg) — в своём пуле, не занимая слоты загрузки
+        self.separate_postprocess = True
+        self.post_workers = post_worker_count()
+        self._post_pending = deque()
+        self.post_cpu_saved = 0.0     # всего за сессию
+        self.eta = None               # секунд до конца всей очереди, если известно
+        # Итоги для Prometheus; файл обновляется раз в SCHEDULER_INTERVAL
+        self.metrics = QueueMetrics()
+        self.metrics_textfile = None
+        self.journal = None           # JobJournal — включается через restore()
+        # Готовые файлы по содержимому: повтор в другую папку — жёсткой ссылкой
+        self.store = ContentStore(os.path.join(app_data_dir(), "store"))
+        self._leaders = {}            # (ключ медиа, профиль) -> задача, которая качает
+        # Сайты, ограничившие запросы, на время не получают новых задач
+        self.breaker = HostBreaker()
+        # Локальный каталог для частей и слияния; None — писать сразу в каталог назначения
+        self.staging_root = None
+
+        self._listeners = []
+        self._events = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._loop, daemon=True,
+                                            name="download-queue")
+        self._dispatcher.start()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _emit(self, event, *args):
+        for listener in self._listeners:
+            listener(event, *args)
+
+    def _post(self, handler, *args):
+        self._events.put((handler, args))
+
+    def _loop(self):
+        """
+        Служебный поток очереди: обрабатывает команды и события задач,
+        раз в LOG_FLUSH_INTERVAL забирает вывод задач пачкой (а не по
+        событию на строку), в режиме «Авто» периодически пересчитывает лимит.
+        """
+        next_flush = next_check = 0
+        while True:
+            try:
+                handler, args = self._events.get(timeout=LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                handler = None
+            if handler is _STOP:
+                return
+            if handler is not None:
+                try:
+                    handler(*args)
+                except Exception:
+                    logger.exception("Ошибка обработки события очереди")
+
+            now = time.monotonic()
+            if now >= next_flush:
+                next_flush = now + LOG_FLUSH_INTERVAL
+                self._drain_all()
+                if self.journal is not None:
+                    self.journal.save()
+            if now >= next_check:
+                next_check = now + SCHEDULER_INTERVAL
+                self._write_metrics()
+                if (self.max_workers == 0 and self.has_active()) or self._retry_waiting():
+                    # Лимит «Авто» пересчитывается по загрузке CPU; задачи,
+                    # ждавшие паузы перед повтором, стартуют по её окончании
+                    self._schedule()
+                else:
+                    # Доли скорости: сменилось время суток или скорости задач
+                    self._rebalance()
+
+    def worker_limit(self):
+        if self.max_workers > 0:
+            return self.max_workers
+        return auto_worker_count()
+
+    def set_engine(self, enabled):
+        """Включает встроенный движок (пул тёплых процессов) или выключает его."""
+        self._post(self._set_engine, enabled)
+
+    def _set_engine(self, enabled):
+        if self.engine_pool is not None:
+            self.engine_pool.shutdown()
+            self.engine_pool = None
+        if enabled:
+            self.engine_pool = EnginePool(self.worker_limit())
+            self.engine_pool.prewarm()
+
+    def set_max_workers(self, count):
+        """Задаёт число потоков (0 — автоматически) и сразу применяет его."""
+        self._post(self._set_max_workers, max(0, int(count)))
+
+    def _set_max_workers(self, count):
+        self.max_workers = count
+        self._schedule()
+
+    def set_bandwidth(self, limit, schedule=None):
+        """
+        Задаёт общий лимит скорости (байт/с, None — без ограничения)
+        и расписание по времени суток (RateSchedule).
+        """
+        self._post(self._set_bandwidth, limit, schedule)
+
+    def _set_bandwidth(self, limit, schedule):
+        self.bandwidth = BandwidthBudget(limit, schedule)
+        self._rebalance(force=True)
+
+    def bandwidth_limit(self):
+        """Действующий сейчас общий лимит скорости, байт/с, или None."""
+        return self.bandwidth.current_limit()
+
+    def add(self, url, output_dir, format_choice, quality, audio_format,
+            video_format, priority=0, fragments=0, on_added=None):
+        """
+        Ставит ссылку в очередь. fragments — число фрагментов (-N), 0 — «Авто».
+        on_added(job_id) вызывается из служебного потока, когда задача создана.
+        """
+        self._post(self._add_requested, on_added, url, output_dir, format_choice,
+                   quality, audio_format, video_format, priority, fragments)
+
+    def _add_requested(self, on_added, *args):
+        job = self._add(*args)
+        if on_added is not None:
+            on_added(job.job_id)
+
+    def _add(self, url, output_dir, format_choice, quality, audio_format,
+             video_format, priority=0, fragments=0, parent_id=None, title=None,
+             media_key=None, restored=None):
+        is_playlist = self.playlist_mode and looks_like_playlist(url)
+        job = DownloadJob(next(self._ids), url, output_dir, format_choice,
+                          quality, audio_format, video_format, priority,
+                          is_playlist=is_playlist, parent_id=parent_id, title=title,
+                          media_key=media_key, fragments=fragments)
+        self.jobs[job.job_id] = job
+        if parent_id is not None:
+            self.jobs[parent_id].children.append(job.job_id)
+        if restored is not None:
+            self._apply_restored(job, restored)
+        if not is_playlist and job.status == JOB_PENDING:
+            self._coalesce(job)
+        self._journal(job)
+        self._emit("job_added", job.job_id)
+        if restored is None:
+            self._schedule()          # восстановленные запускаются все разом
+        return job
+
+    def _coalesce(self, job):
+        """
+        Такое же медиа в том же профиле уже в очереди — задача не качает
+        сама, а ждёт и получает готовые файлы (в другую папку — ссылкой).
+        """
+        for key in job.media_keys:
+            leader = self.jobs.get(self._leaders.get((key, job.profile)))
+            if (leader is not None and leader.is_active and leader.leader_id is None
+                    and leader.status != JOB_LINKING):
+                job.status = JOB_COALESCED
+                job.leader_id = leader.job_id
+                job.message = f"Такая же загрузка уже в очереди (#{leader.job_id})"
+                leader.followers.append(job.job_id)
+                return
+        self._register_leader(job)
+
+    def _register_leader(self, job):
+        for key in job.media_keys:
+            self._leaders[(key, job.profile)] = job.job_id
+
+    def _serve_followers(self, leader):
+        """
+        Задача завершилась: ждавшие её дубликаты получают готовые файлы, а
+        если загрузка не удалась — продолжают сами, первый качает за всех.
+        """
+        for key in leader.media_keys:
+            if self._leaders.get((key, leader.profile)) == leader.job_id:
+                del self._leaders[(key, leader.profile)]
+        followers = [self.jobs[i] for i in leader.followers
+                     if i in self.jobs and self.jobs[i].status == JOB_COALESCED]
+        leader.followers = []
+        if not followers:
+            return
+        sources = [(path, os.path.basename(path)) for path in leader.result_files
+                   if os.path.exists(path)]
+        if leader.status == JOB_DONE and sources:
+            for job in followers:
+                job.leader_id = None
+                self._start_link(job, sources, f"#{leader.job_id}")
+            return
+        head, rest = followers[0], followers[1:]
+        head.status = JOB_PENDING
+        head.leader_id = None
+        head.message = ""
+        head.followers = [job.job_id for job in rest]
+        for job in rest:
+            job.leader_id = head.job_id
+        self._register_leader(head)
+        for job in followers:
+            self._journal(job)
+            self._emit("job_changed", job.job_id)
+        self._post(self._schedule)
+
+    def _link_from_store(self, job):
+        """
+        Уже загруженное медиа есть в хранилище, а в папке задачи его нет —
+        кладёт его туда ссылкой. False — брать неоткуда или файл уже на месте.
+        """
+        if self.store is None:
+            return False
+        sources = self.store.lookup(job.media_keys, job.profile)
+        if not sources or all(os.path.exists(os.path.join(job.output_dir, name))
+                              for _, name in sources):
+            return False
+        self._start_link(job, sources, "хранилища")
+        return True
+
+    def _start_link(self, job, sources, origin):
+        job.status = JOB_LINKING
+        job.shared_from = origin
+        job.message = f"Готовый файл из {origin}"
+        job.metrics.start_phase(PHASE_LINK)
+        job.link_task = LinkTask(
+            sources, job.output_dir, job_id=job.job_id,
+            on_finished=lambda *args: self._post(self._on_link_finished, *args))
+        self._journal(job)
+        self._emit("job_changed", job.job_id)
+        job.link_task.start()
+
+    def _on_link_finished(self, job_id, success, message):
+        job = self.jobs.get(job_id)
+        if job is None or job.link_task is None:
+            return
+        task = job.link_task
+        task.wait()
+        job.link_task = None
+        job.result_files = task.files
+        if not success:
+            self._finish(job, JOB_FAILED, message)
+            return
+        methods = sorted({LINK_TEXT[method] for method in task.methods})
+        lines = [f"Готовый файл из {job.shared_from} ({', '.join(methods)}): {path}"
+                 for path in task.files]
+        job.log_lines.extend(lines)
+        self._emit("job_log", job.job_id, lines)
+        self._finish(job, JOB_DONE, f"{message} (из {job.shared_from}, {', '.join(methods)})")
+
+    def _journal(self, job):
+        if self.journal is not None:
+            self.journal.update(job.journal_entry())
+
+    def restore(self, path):
+        """
+        Включает журнал задач в файле path и возвращает в очередь задачи,
+        не завершённые в прошлый раз: загрузки продолжаются с недокачанных
+        файлов, а скачанное, но не обработанное сразу идёт в постобработку.
+        Возвращает число восстановленных задач.
+        """
+        journal = JobJournal(path)
+        entries = journal.load()
+        by_id = {e["job_id"]: e for e in entries}
+        unfinished = [e for e in entries if e.get("status") in JOB_ACTIVE_STATUSES]
+        plan = []
+        for entry in sorted(unfinished, key=lambda e: (-e.get("priority", 0),
+                                                       e.get("order", 0))):
+            parent = by_id.get(entry.get("parent_id"))
+            if (parent is not None and parent.get("status") in JOB_ACTIVE_STATUSES
+                    and not parent.get("expanded")):
+                continue              # элемент появится снова, когда плейлист развернётся
+            if entry.get("is_playlist") and entry.get("expanded"):
+                continue              # список получен — восстанавливаются сами элементы
+            plan.append(entry)
+        self._post(self._restore, journal, [e["job_id"] for e in unfinished], plan)
+        return len(plan)
+
+    def _restore(self, journal, stale_ids, plan):
+        self.journal = journal
+        self._ids = itertools.count(max(journal.last_id(), max(self.jobs, default=0)) + 1)
+        for job_id in stale_ids:
+            journal.remove(job_id)
+        if self.staging_root:
+            # Каталоги задач, которые не продолжатся, больше не нужны
+            prune_staging(self.staging_root, [e.get("staging_dir") for e in plan])
+        for entry in plan:
+            self._add(entry["url"], entry["output_dir"], entry["format_choice"],
+                      entry["quality"], entry["audio_format"], entry["video_format"],
+                      priority=entry.get("priority", 0), fragments=entry.get("fragments", 0),
+                      title=entry.get("title"),
+                      media_key=(entry.get("media_keys") or [None])[0], restored=entry)
+        journal.save()
+        self._schedule_post()
+        self._schedule()
+
+    def _apply_restored(self, job, entry):
+        job.restored = True
+        job.media_keys = entry.get("media_keys") or job.media_keys
+        job.format_spec = entry.get("format_spec")
+        job.output_files = entry.get("output_files") or []
+        if entry.get("staging_dir") and os.path.isdir(entry["staging_dir"]):
+            job.staging_dir = entry["staging_dir"]
+        job.log_lines.append("Задача восстановлена из журнала после перезапуска")
+        post = entry.get("post_job")
+        if post and entry["status"] in (JOB_POST_PENDING, JOB_POSTPROCESSING):
+            post_job = PostProcessJob.from_dict(post)
+            # Потоки скачаны целиком — повторять загрузку незачем
+            if all(os.path.exists(path) for path in post_job.inputs):
+                job.post_job = post_job
+                job.status = JOB_POST_PENDING
+                job.progress = 100
+                job.message = "Загружено, ожидает обработки"
+                job.metrics.start_phase(PHASE_POST_WAIT)
+                self._post_pending.append(job.job_id)
+
+    def snapshot(self):
+        """
+        Список задач. Читать состояние из других потоков нужно через него:
+        словарь jobs может меняться служебным потоком очереди.
+        """
+        return list(self.jobs.values())
+
+    def pending(self):
+        """Ожидающие задачи в порядке запуска."""
+        return sorted((j for j in self.snapshot() if j.status == JOB_PENDING),
+                      key=DownloadJob.sort_key)
+
+    def running(self):
+        return [j for j in self.snapshot() if j.status == JOB_RUNNING]
+
+    def postprocessing(self):
+        return [j for j in self.snapshot() if j.status == JOB_POSTPROCESSING]
+
+    def total_speed(self):
+        """Суммарная скорость активных загрузок, байт/с."""
+        return sum(j.speed or 0 for j in self.running() if not j.is_playlist)
+
+    def has_active(self):
+        return any(j.is_active for j in self.snapshot())
+
+    def clear_finished(self):
+        """Убирает из очереди завершённые задачи (перед новой партией)."""
+        self._post(self._clear_finished)
+
+    def _clear_finished(self):
+        for job in self.snapshot():
+            parent = self.jobs.get(job.parent_id)
+            if not job.is_active and (parent is None or not parent.is_active):
+                del self.jobs[job.job_id]
+                if self.journal is not None:
+                    self.journal.remove(job.job_id)
+
+    def set_priority(self, job_id, priority):
+        self._post(self._set_priority, job_id, priority)
+
+    def _set_priority(self, job_id, priority):
+        job = self.jobs.get(job_id)
+        if job is None or job.status != JOB_PENDING:
+            return
+        job.priority = priority
+        self._journal(job)
+        self._emit("job_changed", job_id)
+
+    def move(self, job_id, delta):
+        """
+        Сдвигает ожидающую задачу на delta позиций в очереди
+        (отрицательное значение — ближе к началу).
+        """
+        self._post(self._move, job_id, delta)
+
+    def _move(self, job_id, delta):
+        pending = self.pending()
+        ids = [j.job_id for j in pending]
+        if job_id not in ids:
+            return
+        index = ids.index(job_id)
+        target = max(0, min(len(pending) - 1, index + delta))
+        if target == index:
+            return
+        job = pending.pop(index)
+        pending.insert(target, job)
+        # Перенумеровываем порядок; приоритет соседа наследуется,
+        # чтобы задача действительно встала на новое место
+        neighbour = pending[target + 1] if target + 1 < len(pending) else pending[target - 1]
+        job.priority = neighbour.priority
+        for order, item in enumerate(pending):
+            item.order = order
+            self._journal(item)
+        self._emit("queue_reordered")
+
+    def cancel(self, job_id):
+        self._post(self._cancel, job_id)
+
+    def _cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job.is_playlist:
+            # Вместе с плейлистом отменяются и все его элементы
+            job.expanded = True
+            for child_id in list(job.children):
+                self._cancel(child_id)
+        if job.status == JOB_COALESCED:
+            leader = self.jobs.get(job.leader_id)
+            if leader is not None and job_id in leader.followers:
+                leader.followers.remove(job_id)
+            self._finish(job, JOB_CANCELLED, "Отменено")
+        elif job.status in (JOB_PENDING, JOB_POST_PENDING):
+            remove_job_dir(job.staging_dir)
+            self._finish(job, JOB_CANCELLED, "Отменено")
+        elif job.status == JOB_RUNNING and job.task is not None:
+            job.task.cancel(discard=True)
+        elif job.status == JOB_POSTPROCESSING and job.post_task is not None:
+            job.post_task.cancel(discard=True)
+        elif job.is_playlist and job.status == JOB_RUNNING:
+            self._update_playlist(job)
+
+    def stop_all(self):
+        """
+        Отменяет все задачи, дожидается остановки их потоков и завершает
+        служебный поток очереди.
+        """
+        if not self._dispatcher.is_alive():
+            return
+        done = threading.Event()
+        self._post(self._stop_all, done)
+        done.wait()
+        self._dispatcher.join()
+
+    def _stop_all(self, done):
+        # В журнале задачи остаются незавершёнными и продолжатся при запуске
+        if self.journal is not None:
+            self.journal.freeze()
+        for job in self.snapshot():
+            if job.status in (JOB_PENDING, JOB_POST_PENDING, JOB_COALESCED):
+                job.status = JOB_CANCELLED
+        tasks = [j.task for j in self.running() if j.task is not None]
+        tasks += [j.post_task for j in self.postprocessing() if j.post_task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            task.wait()
+        if self.engine_pool is not None:
+            self.engine_pool.shutdown()
+        self._write_metrics()
+        self._events.put((_STOP, ()))
+        done.set()
+
+    def _write_metrics(self):
+        """Обновляет текстовый файл метрик Prometheus, если он задан."""
+        if not self.metrics_textfile:
+            return
+        downloads = [j for j in self.running() if not j.is_playlist]
+        gauges = {
+            "pending": sum(1 for j in self.pending() if not j.is_playlist),
+            "active": len(downloads),
+            "post_pending": sum(1 for j in self.snapshot() if j.status == JOB_POST_PENDING),
+            "post_active": len(self.postprocessing()),
+            "speed": sum(j.speed or 0 for j in downloads),
+            "workers": self.worker_limit(),
+            "sites_throttled": self.breaker.closed_count(),
+        }
+        try:
+            write_textfile(self.metrics_textfile, self.metrics.render(gauges))
+        except OSError as e:
+            logger.warning("Не удалось записать метрики: %s", e)
+
+    def _schedule(self):
+        limit = self.worker_limit()
+        running = self.running()
+        downloads = sum(1 for j in running if not j.is_playlist)
+        expanders = sum(1 for j in running if j.is_playlist and j.task is not None)
+        committed = self._committed_space()
+        held = False                  # первая по очереди ждёт места — следующие тоже
+        now = time.monotonic()
+        for job in self.pending():
+            # Получение списка элементов не занимает слот загрузки,
+            # иначе элементы не могли бы стартовать до конца списка
+            if job.is_playlist:
+                if expanders < PLAYLIST_EXPANDERS:
+                    self._start(job)
+                    expanders += 1
+            elif self._is_archived(job):
+                # Уже скачано с тем же профилем — без запуска yt-dlp; в другую
+                # папку файл попадает из хранилища
+                if not self._link_from_store(job):
+                    self._finish(job, JOB_SKIPPED, "Уже загружено ранее (архив)")
+            elif job.retry_at > now or not self.breaker.allow(job.url):
+                # Пауза перед повтором или сайт ограничил запросы — слот
+                # достаётся следующим задачам
+                continue
+            elif downloads < limit and not held:
+                if self.fragment_tuner.available() <= 0:
+                    # Все фрагменты общего лимита розданы — ждём, пока освободятся
+                    held = True
+                elif self._admit(job, committed):
+                    self._start(job)
+                    self.breaker.started(job.url, job.job_id)
+                    downloads += 1
+                elif job.status == JOB_PENDING:
+                    held = True
+        self._rebalance()
+
+    def _retry_waiting(self):
+        """Есть ли задачи, которые ждут паузы перед повтором или открытия сайта."""
+        return self.breaker.waiting() or any(
+            j.retry_at and j.status == JOB_PENDING for j in self.snapshot())
+
+    def _committed_space(self):
+        """
+        Сколько ещё допишут идущие задачи: {устройство: байт}. Свободное
+        место уже учитывает записанное, поэтому вычитается объём загрузки.
+        """
+        committed = {}
+        for job in self.snapshot():
+            if not job.is_active or job.status == JOB_PENDING:
+                continue
+            for device, need in job.space_needs.items():
+                committed[device] = (committed.get(device, 0)
+                                     + max(0, need - job.metrics.bytes))
+        return committed
+
+    def _admit(self, job, committed):
+        """
+        Хватит ли задаче места на промежуточном диске и в каталоге назначения
+        с учётом того, что допишут идущие задачи. Если нет — задача ждёт в
+        очереди, а если на этом диске ничего не пишется и ждать нечего —
+        завершается ошибкой.
+        """
+        size, merge = self._size_estimate(job)
+        needs = space_needs(job.output_dir, self.staging_root, size, merge)
+        for device, (free, need) in needs.items():
+            if free - committed.get(device, 0) - need >= DISK_RESERVE:
+                continue
+            if device not in committed:
+                self._finish(job, JOB_FAILED,
+                             f"Недостаточно места на диске: нужно ≈{format_size(need)}"
+                             f" и {format_size(DISK_RESERVE)} в запасе,"
+                             f" свободно {format_size(free)}")
+            elif job.message != DISK_WAIT_MESSAGE:
+                job.message = DISK_WAIT_MESSAGE
+                job.log_lines.append(f"{DISK_WAIT_MESSAGE}: нужно ≈{format_size(need)},"
+                                     f" свободно {format_size(free)}")
+                self._emit("job_changed", job.job_id)
+            return False
+        if job.message == DISK_WAIT_MESSAGE:
+            job.message = ""
+        job.space_needs = {device: need for device, (_, need) in needs.items()}
+        for device, need in job.space_needs.items():
+            committed[device] = committed.get(device, 0) + need
+        return True
+
+    def _size_estimate(self, job):
+        """
+        (байт, будет ли обработка) по кешированному списку форматов.
+        Без него размер неизвестен (0) — проверяется только запас места.
+        """
+        if job.size_estimate is not None:
+            return job.size_estimate
+        merge = job.format_choice != "video"
+        entry = self.format_cache.get(job.url)
+        if entry is None:
+            return 0, merge
+        size = 0
+        info = entry[0]
+        if info.get("_type", "video") == "video":
+            spec = job.format_spec or resolve_format(
+                info, job.format_choice, job.quality, job.video_format, job.audio_format)
+            if spec is not None:
+                merge = job.format_choice == "audio" or "+" in spec
+                size = estimate_size(info, spec, job.format_choice, job.audio_format) or 0
+        job.size_estimate = (size, merge)
+        return job.size_estimate
+
+    def _bandwidth_shares(self):
+        jobs = [j for j in self.running() if not j.is_playlist]
+        return self.bandwidth.allocate(
+            [(j.job_id, j.priority, j.rate_limit, j.speed) for j in jobs])
+
+    def _rebalance(self, force=False):
+        """
+        Перераспределяет общий лимит скорости между идущими загрузками.
+        Снижение доли применяется сразу (иначе лимит превышается), рост —
+        не чаще раза в BANDWIDTH_REBALANCE_INTERVAL: каждое изменение
+        перезапускает yt-dlp задачи.
+        """
+        shares = self._bandwidth_shares()
+        now = time.monotonic()
+        for job in self.running():
+            if job.task is None or job.job_id not in shares:
+                continue
+            new = shares[job.job_id]
+            if not rate_changed(job.rate_limit, new):
+                continue
+            # Задача, качающая медленнее новой доли, её и так не превышает
+            urgent = (new is not None
+                      and (job.rate_limit is None or new < job.rate_limit)
+                      and not (job.speed is not None and job.speed <= new))
+            if not (force or urgent):
+                if now - job.rate_changed_at < BANDWIDTH_REBALANCE_INTERVAL:
+                    continue
+                if job.progress >= 90 or (job.eta is not None
+                                          and job.eta < BANDWIDTH_REBALANCE_INTERVAL):
+                    continue          # почти докачана — перезапуск дороже выигрыша
+            job.rate_limit = new
+            job.rate_changed_at = now
+            job.task.set_rate_limit(new)
+            self._emit("job_changed", job.job_id)
+
+    def _is_archived(self, job):
+        return self.skip_archived and any(
+            self.archive.contains(key, job.profile) for key in job.media_keys)
+
+    def _start(self, job):
+        job.status = JOB_RUNNING
+        task_class = PlaylistTask if job.is_playlist else DownloadTask
+        fragments = 1
+        if not job.is_playlist:
+            fragments = self.fragment_tuner.acquire(job.job_id, job.url, job.fragments,
+                                                    cap=job.fragment_cap)
+            job.fragment_cap = None
+            job.rate_limit = self._bandwidth_shares().get(job.job_id)
+            job.rate_changed_at = time.monotonic()
+            if self.staging_root and job.staging_dir is None:
+                try:
+                    job.staging_dir = create_job_dir(self.staging_root)
+                except OSError as e:
+                    logger.warning("Промежуточный каталог недоступен (%s), "
+                                   "загрузка — сразу в каталог назначения", e)
+        task = task_class(
+            job.url, job.output_dir, job.format_choice, job.quality,
+            job.audio_format, job.video_format, self.yt_dlp_path,
+            self.ffmpeg_path, job_id=job.job_id, format_cache=self.format_cache,
+            engine_pool=self.engine_pool,
+            on_output_ready=lambda job_id: self._post(self._on_output_ready, job_id),
+            on_finished=lambda *args: self._post(self._on_finished, *args),
+            concurrent_fragments=fragments, rate_limit=job.rate_limit,
+            postprocess=self.separate_postprocess, metrics=job.metrics,
+            format_spec=job.format_spec, staging_dir=job.staging_dir,
+            progress=job.progress_model
+        )
+        job.task = task
+        self._journal(job)
+        self._emit("job_changed", job.job_id)
+        task.start()
+
+    def _drain(self, job):
+        """Переносит накопленный вывод потока в задачу одной пачкой."""
+        if job.task is None:
+            return
+        lines, event = job.task.take_output()
+        if lines:
+            job.log_lines.extend(lines)
+            self._emit("job_log", job.job_id, lines)
+        if job.is_playlist:
+            self._add_entries(job, job.task.take_entries())
+            return
+        task = job.task
+        if (task.format_spec != job.format_spec
+                or len(task.partial_files) != len(job.output_files)):
+            # Формат и имена файлов нужны журналу, чтобы продолжить загрузку
+            job.format_spec = task.format_spec
+            job.output_files = list(task.partial_files)
+            self._journal(job)
+        if event is not None:
+            job.progress = job.progress_model.percent()
+            job.speed = event.speed
+            job.eta = job.progress_model.eta()
+            if event.downloaded is not None:
+                job.downloaded_bytes = event.downloaded
+            self._emit("job_changed", job.job_id)
+            if job.parent_id is not None:
+                self._update_playlist(self.jobs[job.parent_id])
+
+    def _drain_all(self):
+        for job in self.running():
+            self._drain(job)
+        for job in self.postprocessing():
+            if job.post_task is None:
+                continue
+            job.post_progress = job.post_task.take_progress()
+            job.progress_model.post_update(job.post_progress / 100)
+            progress = job.progress_model.percent()
+            eta = job.progress_model.eta()
+            if (progress, eta) != (job.progress, job.eta):
+                job.progress, job.eta = progress, eta
+                self._emit("job_changed", job.job_id)
+        self._update_eta()
+
+    def _update_eta(self):
+        """
+        ETA всей очереди: оставшиеся байты идущих и ждущих загрузок по общей
+        скорости плюс ожидаемое время обработки, поделённое на её пул.
+        Размер ждущей задачи без оценки считается средним по известным.
+        """
+        remaining = 0
+        post = 0.0
+        sizes = []
+        unknown = 0
+        for job in self.snapshot():
+            if job.is_playlist or job.leader_id is not None or not job.is_active:
+                continue
+            model = job.progress_model
+            if job.status == JOB_PENDING:
+                size = job.size_estimate[0] if job.size_estimate else 0
+                if not size:
+                    unknown += 1
+                    continue
+                sizes.append(size)
+                remaining += size
+                if model.post_kind:
+                    post += post_seconds_estimate(model.post_kind, size)
+            else:
+                remaining += model.remaining_bytes()
+                post += model.remaining_post_seconds()
+        if unknown and sizes:
+            remaining += unknown * sum(sizes) // len(sizes)
+        speed = self.total_speed()
+        if remaining and not speed:
+            self.eta = None
+        else:
+            self.eta = int((remaining / speed if remaining else 0)
+                           + post / max(1, self.post_workers))
+
+    def _add_entries(self, playlist, entries):
+        """Ставит в очередь элементы плейлиста, полученные с последнего сброса."""
+        for url, title, total, key in entries:
+            if total:
+                playlist.entries_total = total
+            self._add(url, playlist.output_dir, playlist.format_choice,
+                      playlist.quality, playlist.audio_format,
+                      playlist.video_format, priority=playlist.priority,
+                      fragments=playlist.fragments, parent_id=playlist.job_id,
+                      title=title, media_key=key)
+        if entries:
+            self._update_playlist(playlist)
+
+    def _update_playlist(self, playlist):
+        """
+        Пересчитывает сводный прогресс плейлиста по элементам и завершает
+        его, когда список получен и все элементы обработаны.
+        """
+        children = [self.jobs[i] for i in playlist.children]
+        total = max(playlist.entries_total or 0, len(children))
+        finished = sum(1 for c in children if not c.is_active)
+        playlist.entries_done = finished
+        if total:
+            partial = sum(c.progress for c in children if c.status == JOB_RUNNING) / 100
+            playlist.progress = int((finished + partial) * 100 / total)
+        playlist.downloaded_bytes = sum(c.downloaded_bytes for c in children)
+        playlist.speed = sum(c.speed or 0 for c in children if c.status == JOB_RUNNING)
+        self._emit("job_changed", playlist.job_id)
+
+        if playlist.status != JOB_RUNNING or not playlist.expanded:
+            return
+        if finished < len(children):
+            return
+        failed = sum(1 for c in children if c.status == JOB_FAILED)
+        if failed:
+            self._finish(playlist, JOB_FAILED,
+                         f"Элементов с ошибкой: {failed} из {len(children)}")
+        elif any(c.status == JOB_CANCELLED for c in children):
+            self._finish(playlist, JOB_CANCELLED, "Отменено")
+        else:
+            self._finish(playlist, JOB_DONE, f"Загружено элементов: {len(children)}")
+
+    def _on_output_ready(self, job_id):
+        """Буфер потока переполнен — забираем его, не дожидаясь таймера."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            self._drain(job)
+
+    def _on_finished(self, job_id, success, message):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        error = fragments = None
+        if job.task is not None:
+            job.task.wait()
+            self._drain(job)
+            error = job.task.error_class
+            fragments = job.task.concurrent_fragments
+            if job.task.media_key and job.task.media_key not in job.media_keys:
+                job.media_keys.append(job.task.media_key)
+                if job.leader_id is None and not job.is_playlist:
+                    self._register_leader(job)
+            job.result_files = [path for path in job.task.output_files
+                                if os.path.exists(path)]
+            if not job.is_playlist:
+                self.fragment_tuner.release(job.job_id, job.url,
+                                            job.task.fragment_throughput,
+                                            auto=job.fragments == 0)
+            job.post_job = job.task.postprocess_job
+            job.task = None
+        if not job.is_playlist:
+            if success:
+                self.breaker.succeeded(job.url)
+            elif error == ERROR_THROTTLED:
+                self.breaker.throttled(job.url, job.job_id)
+            else:
+                self.breaker.finished(job.url, job.job_id)
+        if (not success and not job.is_playlist
+                and message != DownloadTask.CANCELLED_MESSAGE
+                and self._retry(job, error, fragments, message)):
+            self._schedule()
+            return
+        if success and job.post_job is not None:
+            # Слот загрузки свободен сразу, обработка ждёт места в своём пуле
+            job.status = JOB_POST_PENDING
+            job.message = message
+            job.speed = job.eta = job.rate_limit = None
+            job.metrics.start_phase(PHASE_POST_WAIT)
+            self._post_pending.append(job.job_id)
+            self._journal(job)
+            self._emit("job_changed", job.job_id)
+            self._schedule_post()
+            self._schedule()
+            return
+        if success and not job.is_playlist:
+            self.archive.add(job.media_keys, job.profile)
+        if job.is_playlist:
+            # Список получен; плейлист завершится вместе с последним элементом
+            job.expanded = True
+            self._journal(job)
+            if success and job.children:
+                self._update_playlist(job)
+                self._schedule()
+                return
+        if success:
+            status = JOB_DONE
+        elif message == DownloadTask.CANCELLED_MESSAGE:
+            status = JOB_CANCELLED
+        else:
+            status = JOB_FAILED
+        self._finish(job, status, message)
+        self._schedule()
+
+    def _retry(self, job, error, fragments, message):
+        """
+        Возвращает задачу в очередь с паузой, если её ошибка повторяема и
+        повторы этого класса не исчерпаны. Недокачанное не удаляется —
+        yt-dlp продолжит с него. Возвращает True, если повтор назначен.
+        """
+        policy = RETRY_POLICIES.get(error)
+        # Недоступный формат задача уже обошла запасным селектором сама
+        if policy is None or policy.lower_format:
+            return False
+        attempt = job.attempts.get(error, 0)
+        if attempt >= policy.attempts:
+            return False
+        job.attempts[error] = attempt + 1
+        pause = max(policy.backoff(attempt), self.breaker.reopens_in(job.url))
+        if policy.fewer_fragments and fragments:
+            # Урезается только следующая попытка: «Авто» остаётся «Авто»
+            job.fragment_cap = max(1, fragments // 2)
+        if policy.refresh:
+            self.format_cache.invalidate(job.url)
+        job.status = JOB_PENDING
+        job.retry_at = time.monotonic() + pause
+        job.speed = job.eta = job.rate_limit = None
+        job.space_needs = {}
+        job.progress_model.restart(job.progress_model.streams,
+                                   job.progress_model.post_kind)
+        job.metrics.retries += 1
+        job.metrics.start_phase(PHASE_BACKOFF)
+        job.message = (f"{message}; повтор {attempt + 1} из {policy.attempts}"
+                       f" через {max(1, round(pause))} с")
+        job.log_lines.append(job.message)
+        self._emit("job_log", job.job_id, [job.message])
+        self._journal(job)
+        self._emit("job_changed", job.job_id)
+        return True
+
+    def _schedule_post(self):
+        """Запускает ожидающую постобработку, пока в её пуле есть места."""
+        busy = len(self.postprocessing())
+        while busy < self.post_workers and self._post_pending:
+            job = self.jobs.get(self._post_pending.popleft())
+            if job is None or job.status != JOB_POST_PENDING:
+                continue
+            job.status = JOB_POSTPROCESSING
+            job.post_progress = 0
+            job.progress_model.post_begin()
+            job.metrics.start_phase(PHASE_POSTPROCESS)
+            self._journal(job)
+            job.post_task = PostProcessTask(
+                job.post_job, self.ffmpeg_path, job_id=job.job_id,
+                on_finished=lambda *args: self._post(self._on_post_finished, *args))
+            self._emit("job_changed", job.job_id)
+            job.post_task.start()
+            busy += 1
+
+    def _on_post_finished(self, job_id, success, message):
+        job = self.jobs.get(job_id)
+        if job is None or job.post_task is None:
+            return
+        job.post_task.wait()
+        lines = job.post_task.log_lines
+        if lines:
+            job.log_lines.extend(lines)
+            self._emit("job_log", job.job_id, lines)
+        job.post_mode = job.post_task.mode
+        job.post_cpu_time = job.post_task.cpu_time
+        job.post_cpu_saved = job.post_task.cpu_saved
+        job.metrics.post_exit_code = job.post_task.returncode
+        job.progress_model.post_finish(success)
+        if job.post_task.output_path:
+            job.result_files = [job.post_task.output_path]
+        self.post_cpu_saved += job.post_cpu_saved or 0.0
+        job.post_task = None
+        if success:
+            self.archive.add(job.media_keys, job.profile)
+            status = JOB_DONE
+        elif message == PostProcessTask.CANCELLED_MESSAGE:
+            status = JOB_CANCELLED
+        else:
+            status = JOB_FAILED
+        self._finish(job, status, message)
+        self._schedule_post()
+        self._schedule()              # освободилось место на диске — ждущие могут стартовать
+
+    def _finish(self, job, status, message):
+        job.status = status
+        job.message = message
+        if status in (JOB_DONE, JOB_SKIPPED):
+            job.progress = 100
+        elif status == JOB_FAILED and job.staging_dir:
+            # Повторов не будет — недокачанное в промежуточном каталоге не нужно
+            remove_job_dir(job.staging_dir)
+        job.speed = job.eta = job.rate_limit = None
+        job.metrics.end()
+        record = job.metrics.record(job)
+        write_record(record)
+        self.metrics.add(job, record)
+        self._journal(job)
+        self._emit("job_changed", job.job_id)
+        self._emit("job_finished", job.job_id, status in (JOB_DONE, JOB_SKIPPED), message)
+        if job.parent_id is not None:
+            self._update_playlist(self.jobs[job.parent_id])
+        if (status == JOB_DONE and job.result_files and job.shared_from is None
+                and self.store is not None):
+            # Хеширование читает файлы целиком — не в служебном потоке
+            threading.Thread(target=self.store.add, daemon=True, name="store",
+                             args=(list(job.media_keys), job.profile,
+                                   list(job.result_files))).start()
+        if not self.has_active():
+            self._emit("queue_idle")
+        if not job.is_playlist:
+            self._serve_followers(job)
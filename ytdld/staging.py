@@ -0,0 +1,108 @@
+"""
+Промежуточный каталог загрузок и учёт свободного места. Части, фрагменты
+и слияние пишутся на локальный диск, а в каталог назначения (часто
+сетевой) готовый файл попадает одним атомарным переносом. Задача не
+стартует, пока ей не хватает места на промежуточном диске или в
+каталоге назначения.
+"""
+
+import os
+import shutil
+import tempfile
+
+DISK_RESERVE = 256 * 1024 * 1024  # оставлять свободным на каждом диске, байт
+MOVE_SUFFIX = ".ytdld-move"       # недоперенесённый файл в каталоге назначения
+
+
+def create_job_dir(staging_root):
+    """Свой подкаталог для задачи: имена частей не пересекаются между задачами."""
+    os.makedirs(staging_root, exist_ok=True)
+    return tempfile.mkdtemp(prefix="job-", dir=staging_root)
+
+
+def remove_job_dir(path):
+    """Удаляет подкаталог задачи со всем недокачанным."""
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def prune_staging(staging_root, keep):
+    """Удаляет подкаталоги задач прошлых запусков, кроме нужных для продолжения."""
+    keep = {os.path.normcase(os.path.abspath(path)) for path in keep if path}
+    try:
+        names = os.listdir(staging_root)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(staging_root, name)
+        if (name.startswith("job-") and os.path.isdir(path)
+                and os.path.normcase(os.path.abspath(path)) not in keep):
+            remove_job_dir(path)
+
+
+def move_to_destination(path, output_dir):
+    """
+    Переносит готовый файл в каталог назначения и возвращает новый путь.
+    В пределах одного диска — переименование. Между дисками — копия под
+    временным именем рядом с целью, fsync и переименование: в каталоге
+    назначения не бывает наполовину скопированного файла с настоящим именем.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    target = os.path.join(output_dir, os.path.basename(path))
+    try:
+        os.replace(path, target)
+        return target
+    except OSError:
+        pass                          # другой диск (EXDEV) — копируем
+    tmp_path = os.path.join(output_dir, "." + os.path.basename(path) + MOVE_SUFFIX)
+    try:
+        shutil.copy2(path, tmp_path)
+        with open(tmp_path, "r+b") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    os.remove(path)
+    return target
+
+
+def disk_of(path):
+    """
+    (устройство, свободно байт) для диска, на котором лежит или будет
+    лежать path; None — узнать не удалось.
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    try:
+        return os.stat(path).st_dev, shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+def space_needs(output_dir, staging_root, size, merge):
+    """
+    Сколько места нужно задаче: {устройство: [свободно, байт]}. Без
+    промежуточного каталога всё пишется в каталог назначения; при слиянии
+    или конвертации исходные потоки и результат лежат на диске одновременно.
+    """
+    factor = 2 if merge else 1
+    places = [(output_dir, size * factor)]
+    if staging_root:
+        places = [(staging_root, size * factor), (output_dir, size)]
+    needs = {}
+    for path, need in places:
+        disk = disk_of(path)
+        if disk is None:
+            continue
+        device, free = disk
+        # На том же диске перенос — переименование, лишнего места не нужно
+        needs.setdefault(device, [free, need])
+    return needs
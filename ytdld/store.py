@@ -0,0 +1,294 @@
+"""
+Хранилище готовых файлов по содержимому. Файл лежит в нём один раз под
+именем из SHA-256 и попадает в папки пользователя жёсткой ссылкой (или
+reflink-копией), поэтому повторный запрос того же медиа в другую папку
+не стоит ни сети, ни места на диске.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+
+STORE_INDEX_VERSION = 1
+STORE_ORPHAN_TTL = 30 * 24 * 3600  # файл, оставшийся только в хранилище, живёт месяц
+HASH_CHUNK_SIZE = 1024 * 1024
+LINK_SUFFIX = ".ytdld-link"
+FICLONE = 0x40049409               # ioctl reflink в Linux (btrfs, xfs)
+
+LINK_HARD = "hardlink"
+LINK_REFLINK = "reflink"
+LINK_COPY = "copy"
+LINK_SAME = "same"                 # в папке уже этот самый файл
+LINK_TEXT = {
+    LINK_HARD: "жёсткая ссылка",
+    LINK_REFLINK: "reflink",
+    LINK_COPY: "копия",
+    LINK_SAME: "уже на месте",
+}
+
+logger = logging.getLogger("yt-dld")
+
+
+def file_digest(path):
+    """SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(src, dst):
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink не поддерживается")
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def link_file(src, dst, allow_copy=True):
+    """
+    Помещает src по пути dst без повторной загрузки: жёсткая ссылка, иначе
+    reflink, иначе (allow_copy) обычная копия. Существующий dst заменяется
+    атомарно. Возвращает способ (LINK_*).
+    """
+    try:
+        if os.path.samefile(src, dst):
+            return LINK_SAME
+    except OSError:
+        pass
+    tmp_path = dst + LINK_SUFFIX
+    attempts = [(LINK_HARD, os.link), (LINK_REFLINK, _reflink)]
+    if allow_copy:
+        attempts.append((LINK_COPY, shutil.copy2))
+    error = None
+    for method, action in attempts:
+        try:
+            action(src, tmp_path)
+            os.replace(tmp_path, dst)
+            return method
+        except OSError as e:
+            error = e
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    raise error
+
+
+def _intact(entry):
+    """
+    Файл хранилища на месте и не менялся с тех пор, как его хешировали:
+    размер и mtime те же. Записи без отметок (старый индекс) не доверяем.
+    """
+    try:
+        st = os.stat(entry["blob"])
+    except OSError:
+        return False
+    return (st.st_size, st.st_mtime_ns) == (entry.get("size"), entry.get("mtime"))
+
+
+class ContentStore:
+    """
+    Файлы в root/objects/<2 символа>/<sha256>.<расширение>, индекс
+    «ключ медиа + профиль формата -> файлы» — в root/index.json (пишется
+    атомарно). В хранилище файл попадает только ссылкой: если папка
+    загрузки на другом диске, он не копируется. Потокобезопасно.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self._index = {}              # «ключ\tпрофиль» -> [{digest, name, blob, stored, size, mtime}]
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def _record(key, profile):
+        return f"{key}\t{profile}"
+
+    def _load(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == STORE_INDEX_VERSION:
+                self._index = data["entries"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning("Индекс хранилища не прочитан (%s), начинаем с пустого", e)
+
+    def _save(self):
+        data = {"version": STORE_INDEX_VERSION, "entries": self._index}
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(self, keys, profile):
+        """
+        Файлы медиа в этом профиле: [(путь в хранилище, имя файла)] или
+        None, если их нет (или какой-то уже удалён либо изменён).
+        """
+        with self._lock:
+            for key in keys:
+                record = self._record(key, profile)
+                files = self._index.get(record)
+                if not files:
+                    continue
+                if all(_intact(f) for f in files):
+                    return [(f["blob"], f["name"]) for f in files]
+                self._drop(record, files)
+        return None
+
+    def _drop(self, record, files):
+        """
+        Убирает запись, чьи файлы удалены или изменены. Файл в хранилище —
+        жёсткая ссылка на файл пользователя: если тот поменяли на месте
+        (например, теги), содержимое уже не то, что в имени, и раздавать
+        его нельзя. Удаляется только имя в хранилище, файл пользователя цел.
+        """
+        del self._index[record]
+        for f in files:
+            if os.path.exists(f["blob"]) and not _intact(f):
+                logger.info("Файл в хранилище изменён после загрузки, убран: %s", f["blob"])
+                try:
+                    os.remove(f["blob"])
+                except OSError:
+                    pass
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning("Не удалось записать индекс хранилища: %s", e)
+
+    def add(self, keys, profile, paths):
+        """
+        Кладёт готовые файлы в хранилище и записывает их под всеми ключами.
+        Если хоть один файл положить нельзя (другой диск, ошибка), не
+        записывается ничего, а созданное этим вызовом удаляется: запись с
+        частью файлов отдала бы неполный результат. Долгая операция (чтение
+        файлов целиком) — вызывать не из служебного потока очереди.
+        """
+        files = []
+        created = []                  # файлы хранилища, появившиеся в этом вызове
+        stamps = {}                   # файл хранилища -> (размер, mtime) после ссылки
+        objects = os.path.join(self.root, "objects")
+        for path in paths:
+            try:
+                if os.stat(path).st_dev != os.stat(objects).st_dev:
+                    # Ссылка между дисками невозможна, а копию не делаем —
+                    # и файл незачем читать ради хеша
+                    raise OSError("другой диск")
+                digest = file_digest(path)
+                ext = os.path.splitext(path)[1]
+                blob = os.path.join(objects, digest[:2], digest + ext)
+                existed = os.path.exists(blob)
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                # И существующий заменяется только что прочитанным файлом:
+                # прежний могли изменить на месте через ссылку пользователя
+                link_file(path, blob, allow_copy=False)
+                if not existed:
+                    created.append(blob)
+                st = os.stat(blob)
+                stamps[blob] = (st.st_size, st.st_mtime_ns)
+            except OSError as e:
+                logger.info("Файлы не помещены в хранилище (%s): %s", e, path)
+                for blob in created:
+                    stamps.pop(blob, None)
+                    try:
+                        os.remove(blob)
+                    except OSError:
+                        pass
+                files = []
+                break
+            files.append({"digest": digest, "name": os.path.basename(path), "blob": blob,
+                          "stored": time.time(), "size": st.st_size,
+                          "mtime": st.st_mtime_ns})
+        with self._lock:
+            # Прежние записи с теми же файлами хранилища — на новые отметки
+            for entries in self._index.values():
+                for f in entries:
+                    if f["blob"] in stamps:
+                        f["size"], f["mtime"] = stamps[f["blob"]]
+            if not stamps:
+                return
+            if files:
+                for key in keys:
+                    if key:
+                        self._index[self._record(key, profile)] = files
+                self._prune()
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning("Не удалось записать индекс хранилища: %s", e)
+
+    def _prune(self):
+        """
+        Удаляет файлы, которые остались только в хранилище (пользователь
+        свои копии удалил) дольше STORE_ORPHAN_TTL, и записи без файлов.
+        """
+        now = time.time()
+        removed = set()
+        for record, files in list(self._index.items()):
+            for f in files:
+                blob = f["blob"]
+                if blob in removed:
+                    continue
+                try:
+                    orphan = os.stat(blob).st_nlink <= 1
+                except OSError:
+                    removed.add(blob)
+                    continue
+                if orphan and now - f["stored"] > STORE_ORPHAN_TTL:
+                    try:
+                        os.remove(blob)
+                    except OSError:
+                        continue
+                    removed.add(blob)
+            if any(f["blob"] in removed for f in files):
+                del self._index[record]
+
+
+class LinkTask:
+    """
+    Раскладывает уже готовые файлы (другой задачи или из хранилища) в папку
+    задачи в отдельном потоке: ссылка мгновенна, а копия на другой диск —
+    нет. on_finished(job_id, success, message) вызывается из рабочего потока;
+    после работы files — пути в папке, methods — способы (LINK_*).
+    """
+
+    def __init__(self, sources, output_dir, job_id=0, on_finished=None):
+        self.sources = sources        # [(путь к готовому файлу, имя в папке)]
+        self.output_dir = output_dir
+        self.job_id = job_id
+        self.on_finished = on_finished
+        self.files = []
+        self.methods = []
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name=f"link-{self.job_id}")
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            for src, name in self.sources:
+                dst = os.path.join(self.output_dir, name)
+                self.methods.append(link_file(src, dst))
+                self.files.append(dst)
+        except OSError as e:
+            self.on_finished(self.job_id, False, f"Не удалось получить готовый файл: {e}")
+            return
+        self.on_finished(self.job_id, True, "Готовый файл получен без загрузки")
@@ -0,0 +1,659 @@
+"""Выполнение задач: одна загрузка или получение списка элементов плейлиста."""
+
+import glob
+import os
+import subprocess
+import threading
+import time
+
+from .engine import EngineError, EngineProcess
+from .formats import resolve_format
+from .archive import media_key
+from .metrics import (JobMetrics, PHASE_DOWNLOAD, PHASE_EXTRACT, PHASE_FALLBACK,
+                      PHASE_SPAWN)
+from .playlist import PLAYLIST_ENTRY_TEMPLATE, parse_playlist_entry
+from .postprocess import (POSTPROCESS_FILE_PREFIX, POSTPROCESS_FILE_TEMPLATE,
+                          POSTPROCESS_OUTPUT_TEMPLATE, PostProcessJob)
+from .preview import format_size_estimate
+from .progress import PROGRESS_TEMPLATE, JobProgress, parse_progress_line
+from .retry import ERROR_FORMAT, ERROR_TEXT, ErrorClassifier
+from .staging import move_to_destination, remove_job_dir
+from .tools import tool_problem
+from .util import job_logger, process_group_kwargs, terminate_process_tree
+
+LOG_BATCH_SIZE = 500          # досрочный сброс буфера при таком числе строк
+DESTINATION_PREFIX = "[download] Destination: "
+# Слияние и конвертация силами самого yt-dlp (без отдельного пула)
+YT_DLP_POSTPROCESS_PREFIXES = ("[Merger]", "[ExtractAudio]", "[VideoRemuxer]")
+
+
+class _ThroughputMeter:
+    """
+    Средняя скорость фрагментированной загрузки по событиям прогресса.
+    Видео и аудио качаются по очереди, и счётчик байт у второго потока
+    начинается заново — поэтому считаются приращения, а не последнее значение.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.first = self.last = None
+        self._downloaded = 0
+
+    def add(self, event):
+        if not event.fragment_count or event.downloaded is None:
+            return
+        now = time.monotonic()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        if event.downloaded >= self._downloaded:
+            self.bytes += event.downloaded - self._downloaded
+        else:
+            self.bytes += event.downloaded
+        self._downloaded = event.downloaded
+
+    def throughput(self):
+        if self.first is None or self.last - self.first < 1:
+            return None
+        return self.bytes / (self.last - self.first)
+
+
+def failure_message(message, error):
+    """Сообщение об ошибке с её классом, если он известен."""
+    return f"{message}: {ERROR_TEXT[error]}" if error else message
+
+
+def post_kind(format_choice, format_spec=None):
+    """Вид постобработки для прогресса: "audio", "merge" или None."""
+    if format_choice == "audio":
+        return "audio"
+    if format_spec is None:
+        return "merge" if format_choice == "video+audio" else None
+    return "merge" if "+" in format_spec else None
+
+
+class DownloadTask:
+    """
+    Выполняет одну задачу в отдельном потоке. Вывод yt-dlp и прогресс
+    накапливаются в буфере, который очередь забирает через take_output().
+
+    on_output_ready(job_id) вызывается, когда буфер лога заполнен и его
+    пора забрать; on_finished(job_id, success, message) — по завершении.
+    Оба вызываются из рабочего потока.
+    """
+
+    CANCELLED_MESSAGE = "Загрузка отменена"
+
+    def __init__(self, url, output_dir, format_choice, quality, audio_format,
+                 video_format, yt_dlp_path, ffmpeg_path, job_id=0,
+                 format_cache=None, engine_pool=None, on_output_ready=None,
+                 on_finished=None, concurrent_fragments=1, rate_limit=None,
+                 postprocess=False, metrics=None, format_spec=None, staging_dir=None,
+                 progress=None):
+        self.job_id = job_id
+        self.metrics = metrics or JobMetrics()  # фазы, объём, повторы
+        self.progress = progress or JobProgress()  # сводный процент по потокам и фазам
+        self.on_output_ready = on_output_ready
+        self.on_finished = on_finished
+        self.format_cache = format_cache
+        self.engine_pool = engine_pool
+        self.media_key = None         # «экстрактор:ID» из метаданных, если получены
+        self.concurrent_fragments = concurrent_fragments  # yt-dlp -N
+        self.fragment_throughput = None  # байт/с по фрагментированной загрузке
+        self.rate_limit = rate_limit  # yt-dlp --limit-rate, байт/с (None — без лимита)
+        # Отдельная постобработка: yt-dlp только скачивает потоки, а
+        # конвертацию и слияние выполняет пул постобработки очереди
+        self.postprocess = postprocess
+        self.postprocess_job = None
+        self.output_files = []
+        self.partial_files = []       # куда yt-dlp пишет (.part рядом) — из строк Destination
+        # Подобранный формат; заданный заранее (из журнала) не подбирается
+        # заново — иначе загрузка не продолжится с недокачанного .part
+        self.format_spec = format_spec
+        # Промежуточный каталог задачи: всё пишется туда, а в output_dir
+        # готовые файлы переносятся в конце (None — сразу в output_dir)
+        self.staging_dir = staging_dir
+        self.error_class = None       # класс ошибки последней попытки (retry.ERROR_*)
+        self._discard = False
+        self._duration = None
+        self._codecs = None           # (vcodec, acodec) выбранных форматов
+        self._restart = False
+        self._downloading = False     # идёт сама загрузка, а не получение форматов
+        self.url = url
+        self.output_dir = output_dir
+        self.format_choice = format_choice
+        self.quality = quality
+        self.audio_format = audio_format
+        self.video_format = video_format  # 'any', 'mp4', 'webm', 'mkv'
+        self.yt_dlp_path = yt_dlp_path
+        self.ffmpeg_path = ffmpeg_path
+        self.process = None
+        self._cancelled = False
+        self._output_lock = threading.Lock()
+        self._log_buffer = []
+        self._progress = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name=f"job-{self.job_id}")
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _output_ready(self):
+        if self.on_output_ready is not None:
+            self.on_output_ready(self.job_id)
+
+    def cancel(self, discard=False):
+        """
+        Прерывает загрузку: останавливает текущий процесс yt-dlp вместе с
+        его потомками. discard — удалить недокачанные файлы (отмена
+        пользователем); при выходе из программы они нужны для продолжения.
+        """
+        self._discard = discard
+        self._cancelled = True
+        process = self.process
+        if process is not None and process.poll() is None:
+            terminate_process_tree(process)
+
+    def set_rate_limit(self, rate):
+        """
+        Меняет лимит скорости. yt-dlp не умеет менять его на ходу, поэтому
+        идущий процесс останавливается и запускается заново — загрузка
+        продолжается с недокачанного .part.
+        """
+        self.rate_limit = rate
+        process = self.process
+        if (self._downloading and process is not None and process.poll() is None
+                and not self._cancelled):
+            self._restart = True
+            terminate_process_tree(process)
+
+    def _log(self, message):
+        if job_logger.handlers:
+            job_logger.info("[#%d] %s", self.job_id, message)
+        with self._output_lock:
+            self._log_buffer.append(message)
+            full = len(self._log_buffer) == LOG_BATCH_SIZE
+        if full:
+            self._output_ready()
+
+    def _set_progress(self, event):
+        with self._output_lock:
+            self._progress = event
+
+    def take_output(self):
+        """
+        Возвращает накопленные строки лога и последнее событие прогресса
+        (ProgressEvent или None), очищая буфер.
+        """
+        with self._output_lock:
+            lines, self._log_buffer = self._log_buffer, []
+            return lines, self._progress
+
+    def _finish(self, success, message):
+        if message == self.CANCELLED_MESSAGE:
+            if self._discard:
+                self._remove_partial()
+        elif self.staging_dir and success and self.postprocess_job is None:
+            try:
+                self._move_output()
+            except OSError as e:
+                success, message = False, f"Не удалось перенести файл в {self.output_dir}: {e}"
+        # После ошибки промежуточный каталог остаётся: очередь может повторить
+        # задачу с недокачанного и удалит его сама, если повтора не будет
+        if self.on_finished is not None:
+            self.on_finished(self.job_id, success, message)
+
+    def _remove_partial(self):
+        """
+        Удаляет недокачанное: .part, фрагменты, служебные .ytdl и уже
+        скачанные потоки, ждавшие постобработки.
+        """
+        if self.process is not None:
+            self.process.wait()
+        leftovers = list(self.output_files)
+        for path in self.partial_files:
+            leftovers += [path + ".part", path + ".ytdl"]
+            leftovers += glob.glob(glob.escape(path) + ".part-Frag*")
+        for path in leftovers:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        remove_job_dir(self.staging_dir)
+
+    def _move_output(self):
+        """
+        Переносит готовые файлы из промежуточного каталога в каталог
+        назначения. Если yt-dlp не напечатал пути — всё, что там лежит.
+        """
+        files = [path for path in self.output_files if os.path.exists(path)]
+        if not files:
+            files = [os.path.join(self.staging_dir, name)
+                     for name in os.listdir(self.staging_dir)
+                     if not name.endswith((".part", ".ytdl"))]
+        self.output_files = [move_to_destination(path, self.output_dir) for path in files]
+        self._log(f"Перенесено в {self.output_dir}: "
+                  + ", ".join(os.path.basename(path) for path in self.output_files))
+        remove_job_dir(self.staging_dir)
+
+    def _open(self, cmd, merge_stderr=True):
+        """
+        Запускает команду yt-dlp во встроенном движке, если он включён,
+        иначе — отдельным процессом.
+        """
+        if self.engine_pool is not None:
+            try:
+                return EngineProcess(self.engine_pool, cmd[1:], merge_stderr)
+            except EngineError as e:
+                self._log(f"Встроенный движок недоступен ({e}), запускаем yt-dlp")
+                self.engine_pool = None
+        return subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+            **process_group_kwargs()
+        )
+
+    def _run_command(self, build, title="Команда", phase=PHASE_DOWNLOAD):
+        """
+        Строит команду через build() и выполняет её; при смене лимита
+        скорости (set_rate_limit) перезапускает с новым значением.
+        """
+        while True:
+            cmd = build()
+            self._log(f"{title}: {' '.join(cmd)}")
+            self._downloading = True
+            try:
+                returncode, error = self._run_process(cmd, phase)
+            finally:
+                self._downloading = False
+            if not self._restart or returncode == 0 or self._cancelled:
+                self._restart = False
+                return returncode, error
+            self._restart = False
+            self.metrics.retries += 1
+            self._log("Лимит скорости изменён, продолжаем загрузку с новым лимитом")
+
+    def _run_process(self, cmd, phase=PHASE_DOWNLOAD):
+        """
+        Запускает yt-dlp, транслирует вывод в лог и прогресс.
+        Возвращает код выхода и класс ошибки (retry.ERROR_*) или None.
+        Если по выводу видно, что сам yt-dlp повторяет впустую (сайт
+        ограничивает запросы, ссылки истекли), процесс останавливается сразу.
+        """
+        self.metrics.start_phase(PHASE_SPAWN)
+        self.process = self._open(cmd)
+        if self._cancelled:
+            terminate_process_tree(self.process)
+
+        # Чтение вывода с парсингом прогресса
+        classifier = ErrorClassifier()
+        stopped = False
+        meter = _ThroughputMeter()
+        spawned = False
+        for line in self.process.stdout:
+            if not spawned:
+                spawned = True
+                self.metrics.start_phase(phase)
+            line = line.strip()
+            # Строки прогресса идут только в канал прогресса, не в лог
+            event = parse_progress_line(line)
+            if event is not None:
+                self.progress.add(event)
+                self._set_progress(event)
+                meter.add(event)
+                self.metrics.add_progress(event)
+                continue
+            if line.startswith(POSTPROCESS_FILE_PREFIX):
+                path = line[len(POSTPROCESS_FILE_PREFIX):]
+                if path not in self.output_files:
+                    self.output_files.append(path)
+                continue
+            if line.startswith(DESTINATION_PREFIX):
+                path = line[len(DESTINATION_PREFIX):]
+                if path not in self.partial_files:
+                    self.partial_files.append(path)
+                    self.progress.next_stream()
+            elif line.startswith(YT_DLP_POSTPROCESS_PREFIXES):
+                self.progress.post_begin()
+            self._log(line)
+            kind = classifier.feed(line)
+            if kind is not None and kind == classifier.stop_reason and not stopped:
+                stopped = True
+                self._log(f"Останавливаем yt-dlp: {ERROR_TEXT[kind]}, "
+                          "его собственные повторы не помогут")
+                terminate_process_tree(self.process)
+
+        self.process.wait()
+        self.metrics.exit_code = self.process.returncode
+        if self.process.returncode == 0:
+            self.fragment_throughput = meter.throughput()
+            self.progress.post_finish(True)
+            return 0, None
+        return self.process.returncode, classifier.verdict()
+
+    def run(self):
+        try:
+            problem = (tool_problem(self.yt_dlp_path, "yt-dlp")
+                       or tool_problem(self.ffmpeg_path, "ffmpeg"))
+            if problem:
+                self._finish(False, problem)
+                return
+
+            # Форматы выбираются заранее по кешированному списку, поэтому
+            # повторный запуск yt-dlp нужен только в исключительных случаях
+            probe = self._probe_formats()
+            if self._cancelled:
+                self._finish(False, self.CANCELLED_MESSAGE)
+                return
+            if probe is not None:
+                format_spec, info_path = probe
+                self._log(f"Выбран формат: {format_spec}")
+                returncode, error = self._run_command(
+                    lambda: self._build_command(format_spec, info_path))
+            else:
+                returncode, error = self._run_command(self._build_command)
+
+            if self._cancelled:
+                self._finish(False, self.CANCELLED_MESSAGE)
+                return
+
+            if returncode != 0 and probe is not None and self.format_cache is not None:
+                # Ссылки в сохранённом info JSON могли истечь
+                self.format_cache.invalidate(self.url)
+
+            # Формат недоступен — сразу запасной селектор; остальные ошибки
+            # повторяет очередь, после паузы
+            if returncode != 0 and error == ERROR_FORMAT:
+                self._log("Запрошенный формат недоступен, пробуем лучший доступный...")
+                returncode, error = self._run_fallback()
+                if self._cancelled:
+                    self._finish(False, self.CANCELLED_MESSAGE)
+                elif returncode == 0:
+                    self._finish(True, "Загрузка завершена (fallback)!")
+                else:
+                    self.error_class = error
+                    self._finish(False, failure_message(
+                        "Ошибка загрузки даже в fallback режиме", error))
+                return
+
+            if returncode == 0 and probe is not None and self._separate_postprocess(probe[0]):
+                self.postprocess_job = PostProcessJob.for_files(
+                    self.output_files, self.format_choice, self.audio_format,
+                    self.video_format, self._duration, self._codecs,
+                    destination=self.output_dir if self.staging_dir else None)
+                if self.postprocess_job is not None:
+                    self._finish(True, "Загружено, ожидает обработки")
+                    return
+                # yt-dlp не сливал потоки сам: без задания они так и
+                # останутся отдельными файлами, это не успех
+                expected = 1 if self.format_choice == "audio" else 2
+                self._log("Скачанные потоки: " + (", ".join(
+                    os.path.basename(path) for path in self.output_files) or "нет"))
+                self._finish(False, "Не удалось подготовить обработку: получено файлов "
+                                    f"{len(self.output_files)} из {expected}")
+                return
+
+            if returncode == 0:
+                self._finish(True, "Загрузка завершена!")
+            else:
+                self.error_class = error
+                self._finish(False, failure_message("Ошибка загрузки", error))
+
+        except Exception as e:
+            self._finish(False, f"Исключение: {str(e)}")
+
+    def _probe_formats(self):
+        """
+        Получает список форматов (из кеша или через `yt-dlp -J`) и подбирает
+        конкретные ID. Возвращает (format_spec, путь к info JSON) или None,
+        если нужно действовать по-старому, через селектор формата.
+        """
+        if self.format_cache is None:
+            return None
+        entry = self.format_cache.get(self.url)
+        if entry is not None:
+            self._log("Список форматов взят из кеша")
+            self.metrics.info_cached = True
+        else:
+            self._log("Получение списка форматов...")
+            self.metrics.start_phase(PHASE_EXTRACT)
+            self.process = self._open(
+                [self.yt_dlp_path, "-J", "--no-warnings", "--no-playlist", self.url],
+                merge_stderr=False
+            )
+            if self._cancelled:
+                terminate_process_tree(self.process)
+            out, err = self.process.communicate()
+            if self.process.returncode != 0 or self._cancelled:
+                for line in err.splitlines():
+                    self._log(line)
+                return None
+            try:
+                entry = self.format_cache.put(self.url, out)
+            except (OSError, ValueError) as e:
+                self._log(f"Не удалось сохранить список форматов: {e}")
+                return None
+
+        info, info_path = entry
+        self._duration = info.get("duration")
+        if info.get("extractor_key") and info.get("id"):
+            self.media_key = media_key(info["extractor_key"], info["id"])
+        # Плейлисты скачиваются целиком по селектору формата
+        if info.get("_type", "video") != "video":
+            return None
+        by_id = {f.get("format_id"): f for f in info.get("formats") or ()}
+        format_spec = self.format_spec
+        if format_spec and all(i in by_id for i in format_spec.split("+")):
+            self._log(f"Формат прежней загрузки: {format_spec}")
+        else:
+            format_spec = resolve_format(info, self.format_choice, self.quality,
+                                         self.video_format, self.audio_format)
+        if format_spec is None:
+            return None
+        self.format_spec = format_spec
+        self._codecs = [(by_id[i].get("vcodec"), by_id[i].get("acodec"))
+                        for i in format_spec.split("+") if i in by_id]
+        self.progress.plan(
+            [format_size_estimate(by_id[i], self._duration) if i in by_id else None
+             for i in format_spec.split("+")],
+            post_kind(self.format_choice, format_spec))
+        return format_spec, info_path
+
+    def _build_command(self, format_spec=None, info_path=None):
+        """
+        Строит команду yt-dlp на основе параметров. Если формат уже подобран
+        (format_spec) — метаданные берутся из info_path без повторного извлечения.
+        """
+        # Задача — одно видео: ссылка «watch?v=…&list=…» из открытого в
+        # плейлисте видео не должна скачивать весь плейлист (или микс)
+        cmd = [self.yt_dlp_path, "--no-playlist"]
+
+        if format_spec is not None and self._separate_postprocess(format_spec):
+            # Потоки скачиваются по отдельности, без слияния; пути файлов
+            # yt-dlp печатает после загрузки
+            cmd.extend(["--load-info-json", info_path, "-f", format_spec.replace("+", ",")])
+            # ffmpeg всё равно нужен yt-dlp: исправления (FixupM4a, FixupM3u8) и часть HLS
+            cmd.extend(["--ffmpeg-location", self.ffmpeg_path])
+            cmd.extend(self._fragment_args())
+            cmd.extend(self._rate_args())
+            cmd.extend(self._progress_args())
+            cmd.extend(["--print", POSTPROCESS_FILE_TEMPLATE, "--no-quiet"])
+            cmd.extend(["-o", os.path.join(self._write_dir(), POSTPROCESS_OUTPUT_TEMPLATE)])
+            return cmd
+
+        if format_spec is not None:
+            cmd.extend(["--load-info-json", info_path, "-f", format_spec])
+            if self.format_choice == "audio":
+                cmd.extend(["-x", "--audio-format", self.audio_format])
+            elif "+" in format_spec and self.video_format != "any":
+                cmd.extend(["--merge-output-format", self.video_format])
+            cmd.extend(["--ffmpeg-location", self.ffmpeg_path])
+            cmd.extend(self._fragment_args())
+            cmd.extend(self._rate_args())
+            cmd.extend(self._progress_args())
+            cmd.extend(self._output_args())
+            return cmd
+
+        if self.format_choice == "audio":
+            cmd.extend(["-x", "--audio-format", self.audio_format, "-f", "bestaudio"])
+        else:
+            if self.quality == "best":
+                if self.format_choice == "video+audio":
+                    cmd.extend(["-f", "bestvideo+bestaudio"])
+                else:  # video only
+                    cmd.extend(["-f", "bestvideo"])
+            else:
+                height = self.quality.replace("p", "")
+                if self.format_choice == "video+audio":
+                    cmd.extend(["-f", f"bestvideo[height<={height}]+bestaudio"])
+                else:  # video only
+                    cmd.extend(["-f", f"bestvideo[height<={height}]"])
+
+            if self.video_format != "any":
+                cmd.extend(["-S", f"ext:{self.video_format}"])
+                try:
+                    f_index = cmd.index("-f") + 1
+                    if f_index < len(cmd) and "+" in cmd[f_index]:
+                        cmd.extend(["--merge-output-format", self.video_format])
+                except ValueError:
+                    pass
+
+        cmd.extend(["--ffmpeg-location", self.ffmpeg_path])
+        cmd.extend(self._fragment_args())
+        cmd.extend(self._rate_args())
+        cmd.extend(self._progress_args())
+        cmd.extend(self._output_args())
+        cmd.append(self.url)
+        return cmd
+
+    def _separate_postprocess(self, format_spec):
+        """Нужна ли постобработка и выполняется ли она отдельно от загрузки."""
+        return self.postprocess and (self.format_choice == "audio" or "+" in format_spec)
+
+    def _rate_args(self):
+        if self.rate_limit:
+            return ["--limit-rate", str(int(self.rate_limit))]
+        return []
+
+    def _fragment_args(self):
+        """Параллельная загрузка фрагментов DASH/HLS (на цельные файлы не влияет)."""
+        if self.concurrent_fragments > 1:
+            return ["-N", str(self.concurrent_fragments)]
+        return []
+
+    def _write_dir(self):
+        return self.staging_dir or self.output_dir
+
+    def _output_args(self):
+        """
+        Шаблон имени результата. yt-dlp печатает путь готового файла: его
+        переносят из промежуточного каталога и отдают задачам-дубликатам.
+        """
+        return ["-o", os.path.join(self._write_dir(), "%(title)s.%(ext)s"),
+                "--print", POSTPROCESS_FILE_TEMPLATE, "--no-quiet"]
+
+    @staticmethod
+    def _progress_args():
+        """Просит yt-dlp печатать прогресс отдельными строками по шаблону."""
+        return ["--newline", "--progress-template", PROGRESS_TEMPLATE]
+
+    def _build_fallback_command(self):
+        """Строит fallback команду (без ограничений качества)."""
+        cmd = [self.yt_dlp_path, "--no-playlist"]
+        if self.format_choice == "audio":
+            cmd.extend(["-x", "--audio-format", self.audio_format, "-f", "bestaudio"])
+        elif self.format_choice == "video+audio":
+            cmd.extend(["-f", "best"])
+        else:  # video only
+            cmd.extend(["-f", "bestvideo"])
+
+        if self.video_format != "any" and self.format_choice != "audio":
+            cmd.extend(["-S", f"ext:{self.video_format}"])
+            if self.format_choice == "video+audio":
+                cmd.extend(["--merge-output-format", self.video_format])
+
+        cmd.extend(["--ffmpeg-location", self.ffmpeg_path])
+        cmd.extend(self._fragment_args())
+        cmd.extend(self._rate_args())
+        cmd.extend(self._progress_args())
+        cmd.extend(self._output_args())
+        cmd.append(self.url)
+        return cmd
+
+    def _run_fallback(self):
+        """Запускает fallback команду; возвращает код выхода и класс ошибки."""
+        self.metrics.retries += 1
+        # Запасная команда качает один файл («best»), звук конвертирует yt-dlp
+        self.progress.restart(post_kind="audio" if self.format_choice == "audio" else None)
+        return self._run_command(self._build_fallback_command,
+                                 "Fallback команда", PHASE_FALLBACK)
+
+class PlaylistTask(DownloadTask):
+    """
+    Получает список элементов плейлиста или канала (--flat-playlist) и
+    отдаёт их по мере поступления, не дожидаясь конца списка. Очередь
+    забирает элементы через take_entries() и ставит каждый отдельной задачей.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._entries = []
+
+    def take_entries(self):
+        with self._output_lock:
+            entries, self._entries = self._entries, []
+            return entries
+
+    def run(self):
+        try:
+            problem = tool_problem(self.yt_dlp_path, "yt-dlp")
+            if problem:
+                self._finish(False, problem)
+                return
+
+            cmd = [self.yt_dlp_path, "--flat-playlist", "--lazy-playlist",
+                   "--newline", "--print", PLAYLIST_ENTRY_TEMPLATE, self.url]
+            self._log(f"Получение списка: {' '.join(cmd)}")
+            self.metrics.start_phase(PHASE_EXTRACT)
+            self.process = self._open(cmd)
+            if self._cancelled:
+                terminate_process_tree(self.process)
+
+            count = 0
+            for line in self.process.stdout:
+                entry = parse_playlist_entry(line.rstrip("\n"))
+                if entry is None:
+                    self._log(line.strip())
+                    continue
+                count += 1
+                with self._output_lock:
+                    self._entries.append(entry)
+                    full = len(self._entries) == LOG_BATCH_SIZE
+                if full:
+                    self._output_ready()
+            self.process.wait()
+            self.metrics.exit_code = self.process.returncode
+
+            if self._cancelled:
+                self._finish(False, self.CANCELLED_MESSAGE)
+            elif count:
+                self._log(f"Элементов в списке: {count}")
+                self._finish(True, f"Найдено элементов: {count}")
+            else:
+                self._finish(False, "Не удалось получить список элементов")
+
+        except Exception as e:
+            self._finish(False, f"Исключение: {str(e)}")
@@ -0,0 +1,308 @@
+"""
+Внешние программы: yt-dlp, ffmpeg и ffprobe. Реестр находит их один раз
+(папка программы, затем PATH) и проверяет в фоне, что они запускаются:
+версия, для ffmpeg — нужные кодировщики. Итог проверки хранится на диске
+по mtime и размеру файла, так что при следующем запуске программы
+проверка не повторяется, пока программу не заменят.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+from .util import base_dir
+
+TOOL_NAMES = ("yt-dlp", "ffmpeg", "ffprobe")
+REQUIRED_TOOLS = ("yt-dlp", "ffmpeg")       # без ffprobe кодеки берутся из info JSON
+TOOL_PROBE_TIMEOUT = 30          # с на запуск: yt-dlp из zip распаковывается небыстро
+TOOL_CACHE_VERSION = 1
+YT_DLP_MAX_AGE_DAYS = 90         # старше — сайты, скорее всего, уже изменились
+
+# Версия из вывода: первая строка `yt-dlp --version`, `ffmpeg -version`
+TOOL_VERSION_ARGS = {
+    "yt-dlp": ["--version"],
+    "ffmpeg": ["-hide_banner", "-version"],
+    "ffprobe": ["-hide_banner", "-version"],
+}
+
+# Путь -> (mtime_ns, размер, ошибка) для проверок перед каждой задачей;
+# заполняется реестром, читается из рабочих потоков
+_verdicts = {}
+_verdicts_lock = threading.Lock()
+
+
+def _stamp(path):
+    """(mtime_ns, размер) файла или None, если его нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def tool_problem(path, name):
+    """
+    Почему программу не запустить (текст) или None. Если реестр уже
+    проверил её и она работает, ответ без обращения к диску; сломанная
+    программа перепроверяется по mtime — её могли заменить.
+    """
+    with _verdicts_lock:
+        verdict = _verdicts.get(path)
+    if verdict is not None:
+        stamp, error = verdict[:2], verdict[2]
+        if error is None:
+            return None
+        if _stamp(path) == stamp:
+            return f"{name} не запускается: {error}"
+    if not os.path.exists(path):
+        return f"{name} не найден: {path}"
+    return None
+
+
+class ToolInfo:
+    """Найденная программа и итог её проверки."""
+
+    def __init__(self, name, path=None, stamp=None, version=None, error=None,
+                 missing_encoders=()):
+        self.name = name
+        self.path = path              # None — не найдена
+        self.stamp = stamp            # (mtime_ns, размер), по нему кеш
+        self.version = version        # None — ещё не проверена или не запустилась
+        self.error = error
+        self.missing_encoders = list(missing_encoders)
+
+    @property
+    def probed(self):
+        return self.version is not None or self.error is not None
+
+    def to_dict(self):
+        return {"stamp": list(self.stamp), "version": self.version, "error": self.error,
+                "missing_encoders": self.missing_encoders}
+
+    def warnings(self):
+        """Замечания, не мешающие загрузке (устаревший yt-dlp, нет кодировщика)."""
+        notes = []
+        if self.missing_encoders:
+            notes.append(f"в {self.name} нет кодировщиков: "
+                         + ", ".join(sorted(self.missing_encoders)))
+        if self.name == "yt-dlp" and self.version:
+            try:
+                released = datetime.datetime.strptime(self.version[:10], "%Y.%m.%d")
+            except ValueError:
+                released = None
+            if released and (datetime.datetime.now() - released).days > YT_DLP_MAX_AGE_DAYS:
+                notes.append(f"yt-dlp {self.version} устарел, обновите его "
+                             "(make update-yt-dlp)")
+        return notes
+
+
+class ToolRegistry:
+    """
+    Реестр внешних программ. discover() быстрый (только stat и PATH) и
+    вызывается при старте; probe() запускает программы и потому идёт в
+    фоне через start(), по окончании вызывается on_ready(реестр).
+    """
+
+    def __init__(self, cache_path=None, overrides=None, on_ready=None, encoders=()):
+        self.cache_path = cache_path
+        self.encoders = set(encoders)   # кодировщики ffmpeg, наличие которых проверить
+        self.overrides = {name: path for name, path in (overrides or {}).items() if path}
+        self.on_ready = on_ready
+        self.tools = {}               # имя -> ToolInfo
+        self._lock = threading.Lock()
+        self._thread = None
+        self.discover()
+
+    def bundled_path(self, name):
+        """Где программа лежит в комплекте: yt-dlp в корне, ffmpeg в ffmpeg_tools."""
+        exe = name + (".exe" if sys.platform.startswith('win') else "")
+        if name == "yt-dlp":
+            return os.path.join(base_dir(), exe)
+        return os.path.join(base_dir(), "ffmpeg_tools", exe)
+
+    def _find(self, name):
+        if name in self.overrides:
+            return self.overrides[name]
+        if name == "ffprobe" and self.tools.get("ffmpeg") and self.tools["ffmpeg"].path:
+            # ffprobe из той же сборки, что и ffmpeg, где бы тот ни был
+            folder, exe = os.path.split(self.tools["ffmpeg"].path)
+            sibling = os.path.join(folder, exe.replace("ffmpeg", "ffprobe", 1))
+            if os.path.exists(sibling):
+                return sibling
+        bundled = self.bundled_path(name)
+        if os.path.exists(bundled):
+            return bundled
+        return shutil.which(name)
+
+    def discover(self):
+        """Ищет программы заново; возвращает имена ненайденных обязательных."""
+        with self._lock:
+            for name in TOOL_NAMES:
+                path = self._find(name)
+                stamp = _stamp(path) if path else None
+                old = self.tools.get(name)
+                if old is not None and old.path == path and old.stamp == stamp:
+                    continue
+                self.tools[name] = ToolInfo(name, path if stamp else None, stamp)
+        return self.missing()
+
+    def path(self, name):
+        """Путь к программе; если её нет — путь в комплекте (для сообщений)."""
+        info = self.tools.get(name)
+        if info and info.path:
+            return info.path
+        return self.overrides.get(name) or self.bundled_path(name)
+
+    def missing(self):
+        return [name for name in REQUIRED_TOOLS if not self.tools[name].path]
+
+    def broken(self):
+        """Найденные, но не запустившиеся программы: [(имя, ошибка)]."""
+        return [(info.name, info.error) for info in self.tools.values()
+                if info.path and info.error]
+
+    def warnings(self):
+        notes = []
+        for info in self.tools.values():
+            notes.extend(info.warnings())
+        return notes
+
+    def versions(self):
+        """Кратко для лога: «yt-dlp 2024.08.06, ffmpeg 6.1.1»."""
+        return ", ".join(f"{info.name} {info.version}" for info in self.tools.values()
+                         if info.version)
+
+    def start(self):
+        """Проверяет программы в фоновом потоке."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.probe, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Ждёт окончания фоновой проверки."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def probe(self):
+        """
+        Проверяет найденные программы: из кеша, если файл не менялся, иначе
+        запуском. Неисправную копию из комплекта заменяет рабочей из PATH.
+        """
+        cache = self._load_cache()
+        changed = False
+        with self._lock:
+            tools = list(self.tools.values())
+        for info in tools:
+            if not info.path or info.probed:
+                continue
+            changed |= self._check(info, cache)
+            if not info.error or info.name in self.overrides:
+                continue
+            other = shutil.which(info.name)
+            stamp = _stamp(other) if other else None
+            if not stamp or os.path.realpath(other) == os.path.realpath(info.path):
+                continue
+            replacement = ToolInfo(info.name, other, stamp)
+            changed |= self._check(replacement, cache)
+            with self._lock:
+                # discover() мог тем временем найти другую — её не трогаем
+                if not replacement.error and self.tools.get(info.name) is info:
+                    self.tools[info.name] = replacement
+        if changed:
+            self._save_cache(cache)
+        if self.on_ready:
+            self.on_ready(self)
+
+    def _check(self, info, cache):
+        """Проверяет одну программу; True, если кеш пополнился."""
+        entry = cache.get(info.path)
+        fresh = not (entry and tuple(entry.get("stamp") or ()) == info.stamp)
+        if fresh:
+            self._run_probe(info)
+            cache[info.path] = info.to_dict()
+        else:
+            info.version = entry.get("version")
+            info.error = entry.get("error")
+            info.missing_encoders = entry.get("missing_encoders") or []
+        with _verdicts_lock:
+            _verdicts[info.path] = info.stamp + (info.error,)
+        return fresh
+
+    def _run_probe(self, info):
+        try:
+            result = subprocess.run(
+                [info.path] + TOOL_VERSION_ARGS[info.name], capture_output=True,
+                text=True, encoding="utf-8", errors="replace",
+                timeout=TOOL_PROBE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            info.error = f"не ответил за {TOOL_PROBE_TIMEOUT} с"
+            return
+        except OSError as e:
+            info.error = e.strerror or str(e)
+            return
+        lines = (result.stdout or "").strip().splitlines()
+        if result.returncode != 0 or not lines:
+            tail = (result.stderr or "").strip().splitlines()
+            if tail:
+                info.error = tail[-1]
+            elif result.returncode:
+                info.error = f"код выхода {result.returncode}"
+            else:
+                info.error = "не сообщил версию"
+            return
+        words = lines[0].split()
+        if info.name == "yt-dlp":
+            info.version = words[0]
+        else:
+            # «ffmpeg version 6.1.1-3ubuntu5 Copyright ...»
+            info.version = words[2] if len(words) > 2 and words[1] == "version" else lines[0]
+        if info.name == "ffmpeg":
+            info.missing_encoders = sorted(self.encoders - self._encoders(info.path))
+
+    def _encoders(self, ffmpeg_path):
+        """Имена кодировщиков из `ffmpeg -encoders`."""
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, "-hide_banner", "-encoders"], capture_output=True,
+                text=True, encoding="utf-8", errors="replace",
+                timeout=TOOL_PROBE_TIMEOUT)
+        except (OSError, subprocess.SubprocessError):
+            return self.encoders              # не узнали — не предупреждаем
+        encoders = set()
+        # « A....D libmp3lame  libmp3lame MP3 ...» — флаги, затем имя
+        for line in result.stdout.splitlines():
+            parts = line.split()
+            if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+                encoders.add(parts[1])
+        return encoders
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != TOOL_CACHE_VERSION:
+            return {}
+        return data.get("tools") or {}
+
+    def _save_cache(self, cache):
+        if not self.cache_path:
+            return
+        # Записи о программах, которых больше нет, не копим
+        cache = {path: entry for path, entry in cache.items() if os.path.exists(path)}
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": TOOL_CACHE_VERSION, "tools": cache}, f,
+                          ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
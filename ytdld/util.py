@@ -0,0 +1,120 @@
+"""Общие вспомогательные функции: служебный каталог, лог в файл, форматирование."""
+
+import logging
+import logging.handlers
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+PROCESS_KILL_TIMEOUT = 5.0    # секунд на мягкое завершение, потом SIGKILL
+
+# Полный лог всех задач (пишется из рабочих потоков, если включён)
+job_logger = logging.getLogger("yt-dld.jobs")
+job_logger.propagate = False
+job_logger.setLevel(logging.INFO)
+
+
+def app_data_dir():
+    """Каталог для служебных файлов программы (логи, кеши)."""
+    if sys.platform.startswith('win'):
+        root = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        root = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    path = os.path.join(root, "yt-dld")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def set_log_file(path):
+    """
+    Включает запись полного лога задач в файл с ротацией
+    (path=None — выключает).
+    """
+    for handler in list(job_logger.handlers):
+        job_logger.removeHandler(handler)
+        handler.close()
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS,
+        encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    job_logger.addHandler(handler)
+
+
+def format_size(num_bytes):
+    """Размер в человекочитаемом виде: 1.5 МБ."""
+    if num_bytes is None:
+        return ""
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if num_bytes < 1024 or unit == "ГБ":
+            return f"{num_bytes:.0f} {unit}" if unit == "Б" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def base_dir():
+    """Каталог программы: рядом лежат yt-dlp и ffmpeg_tools."""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def process_group_kwargs():
+    """
+    Параметры Popen: процесс в своей группе, чтобы при отмене завершать
+    его вместе с потомками (yt-dlp запускает ffmpeg для HLS и слияния).
+    """
+    if sys.platform.startswith('win'):
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def terminate_process_tree(process, timeout=PROCESS_KILL_TIMEOUT):
+    """
+    Завершает процесс, запущенный с process_group_kwargs(), вместе с
+    потомками: сначала SIGTERM группе, через timeout секунд — SIGKILL
+    оставшимся. Не блокирует: добивание идёт по таймеру.
+    """
+    if not isinstance(process, subprocess.Popen):
+        process.terminate()           # процесс встроенного движка: он сам снимает свою группу
+        return
+    terminate_process_group(process.pid, timeout)
+
+
+def terminate_process_group(pid, timeout=PROCESS_KILL_TIMEOUT):
+    """
+    Завершает группу процесса pid — лидера своей сессии — как
+    terminate_process_tree(): SIGTERM, через timeout — SIGKILL.
+    """
+    if sys.platform.startswith('win'):
+        # taskkill /T снимает и дочерние процессы
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(pid)],
+                       capture_output=True,
+                       creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        return
+    _signal_group(pid, signal.SIGTERM)
+    timer = threading.Timer(timeout, _signal_group, (pid, signal.SIGKILL))
+    timer.daemon = True
+    timer.start()
+
+
+def _signal_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except OSError:
+        pass                          # группа уже завершилась